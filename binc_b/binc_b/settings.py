@@ -197,3 +197,54 @@ CORS_ALLOW_HEADERS = [
     'x-csrftoken',
     'x-requested-with',
 ]
+
+# User behavior ingestion (recommendations.ingestion)
+BEHAVIOR_INGESTION = {
+    'ASYNC': True,
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 1.0,
+    'MAX_QUEUE_SIZE': 10000,
+    'ENQUEUE_TIMEOUT': 0.05,
+    'RETRIES': 3,
+    'RETRY_BACKOFF': 0.05,
+}
+
+# Sharded view/like counters (core.counters)
+COUNTERS = {
+    'ASYNC': True,
+    'SHARDS': 16,
+    'FLUSH_INTERVAL': 2.0,
+}
+
+# Snapshot of the specification bitmap index written by
+# `manage.py build_spec_index --output`; loaded instead of reading the whole
+# ProductSpecification table while it is current
+SPEC_INDEX_PATH = os.getenv('SPEC_INDEX_PATH') or None
+
+# Seconds between checks for a newly published recommendation model version
+RECOMMENDER_REFRESH_INTERVAL = 30
+
+# Seconds a folded-in vector of a user missing from the trained model is cached
+RECOMMENDER_FOLD_IN_TTL = 300
+
+# Seconds a user's recommendation response is cached (it is dropped earlier
+# when the user records new behavior)
+RECOMMENDER_RESPONSE_TTL = 600
+
+# Seconds the `new` and `popular` lists shared by all users are cached
+RECOMMENDER_SHARED_LISTS_TTL = 60
+
+# Most similar products kept per product for content-based recommendations
+RECOMMENDER_CONTENT_NEIGHBORS = 50
+
+# Load the recommendation service at startup rather than on the first
+# recommendation request
+RECOMMENDER_WARMUP = os.getenv('RECOMMENDER_WARMUP', '') == '1'
+
+# Approximate nearest-neighbor search over the ALS item factors (recommendations.ann)
+RECOMMENDER_ANN = {
+    'ENABLED': True,
+    'MIN_ITEMS': 20000,
+    'LISTS': None,
+    'PROBES': 8,
+}
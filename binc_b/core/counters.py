@@ -0,0 +1,195 @@
+"""
+Contention-free popularity counters.
+
+Increments of Product.views/likes/dislikes/neutrals and Brand.likes/dislikes
+never touch the database on the request path. They accumulate as deltas in
+a set of independently locked shards (threads are assigned shards in
+turn, so concurrent requests rarely wait on each other) and a background thread
+periodically folds all pending deltas into the database with one
+`F(field) + CASE ...` UPDATE per model. Because the UPDATE is relative, no
+increment is lost to a read-modify-write race. Reads that need fresh
+numbers add the deltas still pending in this process to the stored values.
+"""
+import atexit
+import itertools
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Case, F, IntegerField, Value, When
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ASYNC': True,          # False: no flusher thread, call flush() explicitly
+    'SHARDS': 16,
+    'FLUSH_INTERVAL': 2.0,  # seconds between flushes
+}
+
+# model label -> fields that may be counted
+COUNTER_FIELDS = {
+    'core.product': ('views', 'likes', 'dislikes', 'neutrals'),
+    'core.brand': ('likes', 'dislikes'),
+}
+
+
+def counter_setting(name):
+    return getattr(settings, 'COUNTERS', {}).get(name, DEFAULTS[name])
+
+
+def fold_deltas(model, deltas):
+    """
+    Apply {(pk, field): delta} to `model` in a single UPDATE statement.
+    """
+    by_field = defaultdict(list)
+    pks = set()
+    for (pk, field), delta in deltas.items():
+        by_field[field].append(When(pk=pk, then=Value(delta)))
+        pks.add(pk)
+    return model.objects.filter(pk__in=list(pks)).update(**{
+        field: F(field) + Case(*whens, default=Value(0), output_field=IntegerField())
+        for field, whens in by_field.items()
+    })
+
+
+class _Shard:
+    __slots__ = ('lock', 'deltas')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.deltas = defaultdict(int)   # (model label, pk, field) -> delta
+
+
+class ShardedCounters:
+
+    def __init__(self, shards=None):
+        self._shards = [_Shard() for _ in range(shards or counter_setting('SHARDS'))]
+        self._models = {}
+        self._local = threading.local()
+        self._next_shard = itertools.count()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stopping = threading.Event()
+        self._exit_hook = False
+        self._closed = False
+
+    def _label(self, model):
+        label = model._meta.label_lower
+        if label not in COUNTER_FIELDS:
+            raise ValueError(f"{model.__name__} has no counters")
+        self._models[label] = model
+        return label
+
+    def _shard(self):
+        # Thread idents are aligned addresses, so `ident % shards` would put
+        # every thread on the same shard; hand them out round-robin instead.
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = self._shards[next(self._next_shard) % len(self._shards)]
+        return shard
+
+    def incr(self, model, pk, field, amount=1):
+        """Add `amount` to `model.field` of the row `pk`."""
+        label = self._label(model)
+        if field not in COUNTER_FIELDS[label]:
+            raise ValueError(f"{field} is not a counter of {model.__name__}")
+        shard = self._shard()
+        with shard.lock:
+            shard.deltas[(label, pk, field)] += amount
+        if counter_setting('ASYNC'):
+            self.start()
+
+    def pending(self, model, pk):
+        """Deltas not yet written for one row, as {field: delta}."""
+        label = self._label(model)
+        result = {}
+        for shard in self._shards:
+            with shard.lock:
+                for field in COUNTER_FIELDS[label]:
+                    delta = shard.deltas.get((label, pk, field))
+                    if delta:
+                        result[field] = result.get(field, 0) + delta
+        return result
+
+    def apply_pending(self, instances):
+        """Add pending deltas to the counter attributes of model instances."""
+        for instance in instances:
+            for field, delta in self.pending(type(instance), instance.pk).items():
+                setattr(instance, field, getattr(instance, field) + delta)
+        return instances
+
+    def value(self, instance, field):
+        """Stored value of a counter plus the deltas pending in this process."""
+        return getattr(instance, field) + self.pending(type(instance), instance.pk).get(field, 0)
+
+    def _drain(self):
+        merged = defaultdict(int)
+        for shard in self._shards:
+            with shard.lock:
+                deltas, shard.deltas = shard.deltas, defaultdict(int)
+            for key, delta in deltas.items():
+                merged[key] += delta
+        return merged
+
+    def _restore(self, deltas):
+        shard = self._shard()
+        with shard.lock:
+            for key, delta in deltas.items():
+                shard.deltas[key] += delta
+
+    def flush(self):
+        """Fold every pending delta into the database. Returns rows updated."""
+        updated = 0
+        with self._flush_lock:
+            by_model = defaultdict(dict)
+            for (label, pk, field), delta in self._drain().items():
+                if delta:
+                    by_model[label][(pk, field)] = delta
+            for label, deltas in by_model.items():
+                try:
+                    updated += fold_deltas(self._models[label], deltas)
+                except Exception as e:
+                    # Keep the deltas for the next flush rather than losing them
+                    logger.error(f"Error flushing {label} counters: {e}")
+                    self._restore({(label, pk, field): delta for (pk, field), delta in deltas.items()})
+        return updated
+
+    # ------------------------------------------------------------------
+    #   Background flusher
+    # ------------------------------------------------------------------
+    def start(self):
+        if self._closed or (self._thread is not None and self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='counter-flusher', daemon=True)
+            self._thread.start()
+            if not self._exit_hook:
+                atexit.register(self.stop)
+                self._exit_hook = True
+
+    def _run(self):
+        interval = counter_setting('FLUSH_INTERVAL')
+        while not self._stopping.wait(interval):
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+    def stop(self, timeout=5.0):
+        """Stop the flusher for good and write the remaining deltas."""
+        self._closed = True
+        self._stopping.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        self._thread = None
+        self.flush()
+
+
+counters = ShardedCounters()
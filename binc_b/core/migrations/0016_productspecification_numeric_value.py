@@ -0,0 +1,41 @@
+from django.db import migrations, models
+
+
+def parse_existing_values(apps, schema_editor):
+    from core.spec_units import parse_specification_value
+
+    ProductSpecification = apps.get_model('core', 'ProductSpecification')
+    batch = []
+    for spec in ProductSpecification.objects.only('id', 'specification_value').iterator(chunk_size=1000):
+        spec.numeric_value, spec.unit = parse_specification_value(spec.specification_value)
+        batch.append(spec)
+        if len(batch) >= 1000:
+            ProductSpecification.objects.bulk_update(batch, ['numeric_value', 'unit'])
+            batch = []
+    if batch:
+        ProductSpecification.objects.bulk_update(batch, ['numeric_value', 'unit'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_product_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productspecification',
+            name='numeric_value',
+            field=models.FloatField(blank=True, editable=False, help_text='القيمة الرقمية للمواصفة بالوحدة الأساسية', null=True),
+        ),
+        migrations.AddField(
+            model_name='productspecification',
+            name='unit',
+            field=models.CharField(blank=True, default='', editable=False, help_text='الوحدة الأساسية للقيمة الرقمية', max_length=16),
+        ),
+        migrations.AddIndex(
+            model_name='productspecification',
+            index=models.Index(fields=['specification', 'numeric_value'], name='productspec_numeric_idx'),
+        ),
+        migrations.RunPython(parse_existing_values, migrations.RunPython.noop),
+    ]
@@ -4,7 +4,7 @@ import uuid
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from decimal import Decimal
-from django.apps import apps  # Use apps.get_model to resolve circular imports
+from .spec_units import parse_specification_value
 
 #----------------------------------------------------------------
 #           User model
@@ -308,12 +308,19 @@ class Product(models.Model):
         verbose_name="Created At"
     )
 
+    class Meta:
+        indexes = [
+            # Keyset pagination over (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='product_created_id_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name} ({self.brand.name})"
 
     def log_behavior(self, user, action):
-        UserBehaviorLog = apps.get_model('recommendations', 'UserBehaviorLog')  # Dynamically get the model
-        UserBehaviorLog.objects.create(user=user, product=self, action=action)
+        """Record a UserBehaviorLog row in the background; never blocks on the database."""
+        from recommendations.ingestion import behavior_ingestor  # Imported here to avoid a circular import
+        behavior_ingestor.submit(user.pk, self.pk, action, log_only=True)
 
     @property
     def discount_percentage(self):
@@ -387,15 +394,43 @@ class ProductSpecification(models.Model):
         max_length=255,
         help_text="قيمة المواصفة للمنتج"
     )
+    numeric_value = models.FloatField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="القيمة الرقمية للمواصفة بالوحدة الأساسية"
+    )
+    unit = models.CharField(
+        max_length=16,
+        blank=True,
+        default='',
+        editable=False,
+        help_text="الوحدة الأساسية للقيمة الرقمية"
+    )
 
     class Meta:
         unique_together = ('product', 'specification')
         verbose_name = "Product Specification"
         verbose_name_plural = "Product Specification"
+        indexes = [
+            # Range filters and sorting on numeric specifications
+            models.Index(fields=['specification', 'numeric_value'], name='productspec_numeric_idx'),
+        ]
 
     def __str__(self):
         return f"{self.product.name} - {self.specification.specification_name}: {self.specification_value}"
 
+    def parse_value(self):
+        """Fill numeric_value and unit from specification_value."""
+        self.numeric_value, self.unit = parse_specification_value(self.specification_value)
+
+    def save(self, *args, **kwargs):
+        self.parse_value()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'specification_value' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'numeric_value', 'unit'}
+        super().save(*args, **kwargs)
+
 #----------------------------------------------------------------
 #                       Seller Rating model
 #----------------------------------------------------------------
@@ -0,0 +1,94 @@
+"""
+Parsing of free-text specification values into a number and a unit.
+
+Values such as "5,000 mAh", "6.7 inch", "190 غرام" or "١٢ جيجابايت" are
+split into a float normalized to the base unit of its dimension and that
+base unit, so numeric specifications can be range-filtered and sorted in
+SQL. Values whose unit is not recognised are left unparsed.
+"""
+import re
+
+# unit alias -> (base unit, factor to base unit)
+UNITS = {
+    # mass -> grams
+    'mg': ('g', 0.001), 'g': ('g', 1.0), 'gr': ('g', 1.0), 'gram': ('g', 1.0), 'grams': ('g', 1.0),
+    'kg': ('g', 1000.0), 'lb': ('g', 453.592), 'lbs': ('g', 453.592), 'oz': ('g', 28.3495),
+    'جرام': ('g', 1.0), 'غرام': ('g', 1.0), 'جم': ('g', 1.0), 'غ': ('g', 1.0),
+    'كجم': ('g', 1000.0), 'كغ': ('g', 1000.0), 'كيلوجرام': ('g', 1000.0), 'كيلوغرام': ('g', 1000.0),
+    # length -> millimetres
+    'mm': ('mm', 1.0), 'cm': ('mm', 10.0), 'm': ('mm', 1000.0),
+    'in': ('mm', 25.4), 'inch': ('mm', 25.4), 'inches': ('mm', 25.4), '"': ('mm', 25.4),
+    'مم': ('mm', 1.0), 'ملم': ('mm', 1.0), 'سم': ('mm', 10.0),
+    'بوصة': ('mm', 25.4), 'بوصه': ('mm', 25.4), 'انش': ('mm', 25.4), 'إنش': ('mm', 25.4),
+    # storage and memory -> gigabytes
+    'kb': ('gb', 1.0 / 1024 ** 2), 'mb': ('gb', 1.0 / 1024), 'gb': ('gb', 1.0), 'tb': ('gb', 1024.0),
+    'ميجابايت': ('gb', 1.0 / 1024), 'ميغابايت': ('gb', 1.0 / 1024),
+    'جيجابايت': ('gb', 1.0), 'جيجا': ('gb', 1.0), 'غيغابايت': ('gb', 1.0),
+    'تيرابايت': ('gb', 1024.0), 'تيرا': ('gb', 1024.0),
+    # battery capacity
+    'mah': ('mah', 1.0), 'ah': ('mah', 1000.0), 'مللي أمبير': ('mah', 1.0), 'ملي أمبير': ('mah', 1.0),
+    'wh': ('wh', 1.0),
+    # frequency -> hertz
+    'hz': ('hz', 1.0), 'khz': ('hz', 1e3), 'mhz': ('hz', 1e6), 'ghz': ('hz', 1e9),
+    'هرتز': ('hz', 1.0), 'ميجاهرتز': ('hz', 1e6), 'جيجاهرتز': ('hz', 1e9),
+    # power -> watts
+    'w': ('w', 1.0), 'kw': ('w', 1000.0), 'واط': ('w', 1.0),
+    # camera resolution
+    'mp': ('mp', 1.0), 'ميجابكسل': ('mp', 1.0),
+    # time -> hours
+    'h': ('h', 1.0), 'hr': ('h', 1.0), 'hours': ('h', 1.0), 'min': ('h', 1.0 / 60),
+    'ساعة': ('h', 1.0), 'ساعه': ('h', 1.0), 'ساعات': ('h', 1.0), 'دقيقة': ('h', 1.0 / 60),
+}
+
+DIGITS = str.maketrans('٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹٫٬', '01234567890123456789.,')
+VALUE_RE = re.compile(r'^\s*([-+]?\d+(?:[.,]\d+)*)\s*(.*?)\s*$')
+THOUSANDS_RE = re.compile(r'^[-+]?\d{1,3}(,\d{3})+$')
+
+
+def _parse_number(text):
+    if THOUSANDS_RE.match(text):
+        return float(text.replace(',', ''))
+    if text.count(',') == 1 and '.' not in text:
+        # Decimal comma, e.g. "6,7"
+        return float(text.replace(',', '.'))
+    return float(text.replace(',', ''))
+
+
+def normalize_unit(unit):
+    """Return (base unit, factor) for a unit alias, or None if unknown."""
+    unit = unit.strip().lower().lstrip('-').rstrip('.')
+    if not unit:
+        return '', 1.0
+    if unit in UNITS:
+        return UNITS[unit]
+    # "16 GB RAM", "6.7 inch AMOLED": the unit is the first word
+    return UNITS.get(unit.split()[0])
+
+
+def parse_specification_value(raw):
+    """
+    Return (number in base unit, base unit) for a specification value, or
+    (None, '') when it is not a number with a recognised unit.
+    """
+    if not raw:
+        return None, ''
+    match = VALUE_RE.match(str(raw).translate(DIGITS))
+    if not match:
+        return None, ''
+    try:
+        number = _parse_number(match.group(1))
+    except ValueError:
+        return None, ''
+    unit = normalize_unit(match.group(2))
+    if unit is None:
+        return None, ''
+    base, factor = unit
+    return number * factor, base
+
+
+def to_base_unit(number, unit):
+    """Convert a user-supplied bound such as (6.5, 'inch') to the base unit."""
+    normalized = normalize_unit(unit or '')
+    if normalized is None:
+        raise ValueError(f'Unknown unit: {unit}')
+    return float(number) * normalized[1]
@@ -48,4 +48,112 @@ class AuthenticationTest(APITestCase):
         token = response.data['access']
         self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
         product_response = self.client.get('/core/api/products/')
-        self.assertEqual(product_response.status_code, status.HTTP_200_OK)
\ No newline at end of file
+        self.assertEqual(product_response.status_code, status.HTTP_200_OK)
+
+class SpecificationValueParsingTest(TestCase):
+    def test_parses_numbers_with_units(self):
+        from core.spec_units import parse_specification_value as parse
+        self.assertEqual(parse('5,000 mAh'), (5000.0, 'mah'))
+        self.assertEqual(parse('6,7 inch'), (6.7 * 25.4, 'mm'))
+        self.assertEqual(parse('1.2 kg'), (1200.0, 'g'))
+        self.assertEqual(parse('190 غرام'), (190.0, 'g'))
+        self.assertEqual(parse('١٢ جيجابايت'), (12.0, 'gb'))
+        self.assertEqual(parse('16 GB RAM'), (16.0, 'gb'))
+        self.assertEqual(parse('120'), (120.0, ''))
+
+    def test_leaves_non_numeric_values_unparsed(self):
+        from core.spec_units import parse_specification_value as parse
+        self.assertEqual(parse('AMOLED'), (None, ''))
+        self.assertEqual(parse('1920x1080'), (None, ''))
+        self.assertEqual(parse(''), (None, ''))
+
+
+class ShardedCountersTest(TestCase):
+    def setUp(self):
+        from decimal import Decimal
+        from core.models import Owner, Shop, Brand
+        user = User.objects.create_user(username='owner', password='pass', user_type='owner')
+        owner = Owner.objects.create(user=user, email='owner@example.com', password='pass')
+        shop = Shop.objects.create(name='Shop', owner=owner, address='Riyadh',
+                                   logo='shop_logos/logo.png', url='https://example.com')
+        category = Category.objects.create(name='Phones')
+        self.brand = Brand.objects.create(name='Acme', popularity=Decimal('1'), rating=Decimal('4'))
+        self.products = [
+            Product.objects.create(name=f'Phone {i}', price=100, rating=0, shop=shop,
+                                   category=category, brand=self.brand)
+            for i in range(3)
+        ]
+
+    def test_concurrent_increments_are_not_lost(self):
+        import threading
+        from core.counters import ShardedCounters
+        counters = ShardedCounters(shards=4)
+        product = self.products[0]
+
+        def hit():
+            for _ in range(250):
+                counters.incr(Product, product.pk, 'views')
+
+        with self.settings(COUNTERS={'ASYNC': False}):
+            threads = [threading.Thread(target=hit) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(counters.pending(Product, product.pk), {'views': 2000})
+            counters.flush()
+
+        product.refresh_from_db()
+        self.assertEqual(product.views, 2000)
+        self.assertEqual(counters.pending(Product, product.pk), {})
+
+    def test_threads_are_spread_over_shards(self):
+        import threading
+        from core.counters import ShardedCounters
+        counters = ShardedCounters(shards=4)
+        barrier = threading.Barrier(4)
+
+        def hit():
+            barrier.wait()  # keep the threads alive together so none reuses an ident
+            counters.incr(Product, self.products[0].pk, 'views')
+
+        with self.settings(COUNTERS={'ASYNC': False}):
+            threads = [threading.Thread(target=hit) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual([len(shard.deltas) for shard in counters._shards], [1, 1, 1, 1])
+            counters.flush()
+
+    def test_flush_is_one_update_per_model_and_reads_merge_pending(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from core.counters import ShardedCounters
+        from core.models import Brand
+        counters = ShardedCounters(shards=2)
+
+        with self.settings(COUNTERS={'ASYNC': False}):
+            for i, product in enumerate(self.products):
+                counters.incr(Product, product.pk, 'views', i + 1)
+                counters.incr(Product, product.pk, 'likes')
+            counters.incr(Product, self.products[0].pk, 'neutrals')
+            counters.incr(Brand, self.brand.pk, 'dislikes', 2)
+
+            stale = Product.objects.get(pk=self.products[2].pk)
+            self.assertEqual(counters.value(stale, 'views'), 3)
+            counters.apply_pending([stale])
+            self.assertEqual((stale.views, stale.likes), (3, 1))
+
+            with CaptureQueriesContext(connection) as queries:
+                counters.flush()
+            self.assertEqual(len(queries), 2)
+
+        self.assertEqual(
+            list(Product.objects.order_by('name').values_list('views', 'likes', 'neutrals')),
+            [(1, 1, 1), (2, 1, 0), (3, 1, 0)]
+        )
+        self.brand.refresh_from_db()
+        self.assertEqual(self.brand.dislikes, 2)
+        with self.assertRaises(ValueError):
+            counters.incr(Brand, self.brand.pk, 'views')
@@ -0,0 +1,227 @@
+"""
+In-process autocomplete index for product, brand and category names.
+
+Every name is stored under the normalized text starting at each of its
+words, so "s24" finds "Galaxy S24". Short prefixes (the first keystrokes,
+which match the most names) are answered from a cached top list per
+prefix; longer prefixes bisect into a sorted array of keys, where the
+matching range is small. Lookups never touch the database, apart from the
+version check below. The index is
+built lazily on first use and then kept up to date by the product, brand
+and category signals.
+
+Those signals only run in the process that made a change, so every change
+also bumps a CacheVersion row shared by all workers. The index remembers
+the version it reflects, reads the row at most once every
+VERSION_CHECK_INTERVAL seconds, and is rebuilt when the row moved on.
+"""
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import namedtuple
+
+from .search import tokenize
+
+MAX_SUGGESTIONS = 10
+# Prefixes up to this length keep a precomputed top list
+CACHED_PREFIX_LENGTH = 3
+# Seconds between two reads of the shared index version
+VERSION_CHECK_INTERVAL = 1.0
+
+Suggestion = namedtuple('Suggestion', ['kind', 'id', 'text', 'weight'])
+
+
+def suggestion_keys(text):
+    """Normalized keys for `text`: one per word, running to the end of the name."""
+    tokens = tokenize(text)
+    return {' '.join(tokens[i:]) for i in range(len(tokens))}
+
+
+def key_prefixes(key):
+    return {key[:n] for n in range(1, min(len(key), CACHED_PREFIX_LENGTH) + 1)}
+
+
+class AutocompleteIndex:
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._suggestions = {}
+        self._keys = []
+        self._members = {}
+        self._top = {}
+        self._built = False
+        self.version = None         # CacheVersion the index reflects, None if unknown
+        self.checked_at = None      # time.monotonic() of the last version read
+
+    @property
+    def is_built(self):
+        return self._built
+
+    def _rank(self, idents, limit=MAX_SUGGESTIONS, suggestions=None):
+        suggestions = self._suggestions if suggestions is None else suggestions
+        return tuple(heapq.nsmallest(
+            limit, (ident for ident in idents if ident in suggestions),
+            key=lambda ident: (-suggestions[ident].weight, suggestions[ident].text)
+        ))
+
+    def build(self, suggestions):
+        """Replace the whole index with `suggestions`."""
+        with self._lock:
+            # Built aside and swapped in, so readers never see a partial index
+            entries = {}
+            keys = []
+            members = {}
+            for suggestion in suggestions:
+                ident = (suggestion.kind, suggestion.id)
+                entries[ident] = suggestion
+                for key in suggestion_keys(suggestion.text):
+                    keys.append((key, ident))
+                    for prefix in key_prefixes(key):
+                        members.setdefault(prefix, set()).add(ident)
+            keys.sort()
+            top = {prefix: self._rank(idents, suggestions=entries) for prefix, idents in members.items()}
+            self._suggestions, self._keys, self._members, self._top = entries, keys, members, top
+            self._built = True
+
+    def invalidate(self):
+        """Drop the index so it is rebuilt from the database on next use."""
+        with self._lock:
+            self._reset()
+
+    def advance(self, previous, version):
+        """
+        Record that `version` follows a local change applied on top of
+        `previous`. If the index did not reflect `previous`, another
+        process changed names in between and it stays outdated.
+        """
+        with self._lock:
+            if self.version is not None and self.version == previous:
+                self.version = version
+
+    def _unlink(self, ident):
+        """Remove `ident` from the key array and prefix sets; return touched prefixes."""
+        suggestion = self._suggestions.get(ident)
+        if suggestion is None:
+            return set()
+        prefixes = set()
+        for key in suggestion_keys(suggestion.text):
+            pos = bisect_left(self._keys, (key, ident))
+            if pos < len(self._keys) and self._keys[pos] == (key, ident):
+                del self._keys[pos]
+            for prefix in key_prefixes(key):
+                self._members.get(prefix, set()).discard(ident)
+                prefixes.add(prefix)
+        return prefixes
+
+    def upsert(self, suggestion):
+        ident = (suggestion.kind, suggestion.id)
+        with self._lock:
+            previous = self._suggestions.get(ident)
+            stale = self._unlink(ident)
+            self._suggestions[ident] = suggestion
+            fresh = set()
+            for key in suggestion_keys(suggestion.text):
+                insort(self._keys, (key, ident))
+                for prefix in key_prefixes(key):
+                    self._members.setdefault(prefix, set()).add(ident)
+                    fresh.add(prefix)
+
+            # Only this entry changed. If it was in a cached top list and may
+            # have dropped, rescan that prefix; otherwise the new top list is
+            # always within the old one plus this entry.
+            rose = previous is None or (
+                suggestion.weight >= previous.weight and suggestion.text == previous.text
+            )
+            for prefix in stale | fresh:
+                top = self._top.get(prefix, ())
+                if ident in top and not (prefix in fresh and rose):
+                    self._top[prefix] = self._rank(self._members.get(prefix, ()))
+                elif prefix in fresh:
+                    self._top[prefix] = self._rank(set(top) | {ident})
+
+    def remove(self, kind, ident):
+        with self._lock:
+            prefixes = self._unlink((kind, ident))
+            self._suggestions.pop((kind, ident), None)
+            for prefix in prefixes:
+                if (kind, ident) in self._top.get(prefix, ()):
+                    self._top[prefix] = self._rank(self._members.get(prefix, ()))
+
+    def get(self, kind, ident):
+        return self._suggestions.get((kind, ident))
+
+    def suggest(self, prefix, limit=MAX_SUGGESTIONS):
+        query = ' '.join(tokenize(prefix))
+        if not query:
+            return []
+        if len(query) <= CACHED_PREFIX_LENGTH:
+            idents = self._top.get(query, ())
+        else:
+            keys = self._keys
+            matches = set()
+            pos = bisect_left(keys, (query,))
+            while pos < len(keys) and keys[pos][0].startswith(query):
+                matches.add(keys[pos][1])
+                pos += 1
+            idents = self._rank(matches, limit)
+        suggestions = self._suggestions
+        return [suggestions[ident] for ident in idents if ident in suggestions][:limit]
+
+
+def load_suggestions():
+    """Read every suggestion from the database, weighted by product views."""
+    from core.models import Product, Brand, Category
+
+    brand_weights = {}
+    category_weights = {}
+    products = Product.objects.filter(is_active=True, is_banned=False).values_list(
+        'id', 'name', 'views', 'brand_id', 'category_id'
+    )
+    for pk, name, views, brand_id, category_id in products.iterator(chunk_size=2000):
+        yield Suggestion('product', pk, name, views)
+        if brand_id:
+            brand_weights[brand_id] = brand_weights.get(brand_id, 0) + views
+        category_weights[category_id] = category_weights.get(category_id, 0) + views
+
+    for pk, name in Brand.objects.values_list('id', 'name'):
+        yield Suggestion('brand', pk, name, brand_weights.get(pk, 0))
+    for pk, name in Category.objects.values_list('id', 'name'):
+        yield Suggestion('category', pk, name, category_weights.get(pk, 0))
+
+
+autocomplete_index = AutocompleteIndex()
+
+VERSION_KEY = 'products:autocomplete'
+
+
+def bump_index_version():
+    """Record a name change; returns (previous, new) version."""
+    from .models import CacheVersion
+
+    version = CacheVersion.bump(VERSION_KEY)
+    return version - 1, version
+
+
+def get_autocomplete_index():
+    """
+    Return the process-wide index, building it on first use and rebuilding
+    it when names changed in another process.
+    """
+    from .models import CacheVersion
+
+    now = time.monotonic()
+    checked_at = autocomplete_index.checked_at
+    if autocomplete_index.is_built and checked_at is not None and now - checked_at < VERSION_CHECK_INTERVAL:
+        return autocomplete_index
+
+    version = CacheVersion.current(VERSION_KEY)
+    with autocomplete_index._lock:
+        if not autocomplete_index.is_built or autocomplete_index.version != version:
+            autocomplete_index.build(load_suggestions())
+            autocomplete_index.version = version
+        autocomplete_index.checked_at = now
+    return autocomplete_index
@@ -0,0 +1,235 @@
+"""
+Facet filters and counts for product search.
+
+Filters are kept as named Q objects so that each facet can be counted
+against every filter except its own (selecting one brand still shows the
+counts of the other brands). Each facet is one grouped aggregate, so a
+faceted page costs a fixed handful of queries whatever the number of
+facet values.
+"""
+import uuid
+
+from django.db.models import Count, F, OuterRef, Q, Subquery
+
+from core.models import ProductSpecification
+from core.spec_units import to_base_unit
+from .spec_index import get_spec_index
+
+# Above this many matches, spec filters run as SQL subqueries instead
+MAX_INLINE_IDS = 900
+
+# (key, min, max) in USD; max is exclusive and None means unbounded
+PRICE_BUCKETS = (
+    ('0-100', 0, 100),
+    ('100-250', 100, 250),
+    ('250-500', 250, 500),
+    ('500-1000', 500, 1000),
+    ('1000-2500', 1000, 2500),
+    ('2500+', 2500, None),
+)
+
+
+def _bucket_q(low, high):
+    q = Q(price__gte=low)
+    if high is not None:
+        q &= Q(price__lt=high)
+    return q
+
+
+def _parse_bool(value):
+    return str(value).lower() in ('1', 'true', 'yes')
+
+
+def parse_spec_filters(values):
+    """Parse `spec=<specification_id>:<value>` parameters into {id: [values]}."""
+    specs = {}
+    for raw in values:
+        spec_id, sep, value = raw.partition(':')
+        if not (sep and value):
+            continue
+        try:
+            spec_id = str(uuid.UUID(spec_id))
+        except ValueError:
+            continue
+        specs.setdefault(spec_id, []).append(value)
+    return specs
+
+
+def build_filters(params):
+    """
+    Return ({facet name: Q}, {specification id: Q}) for the request params.
+    """
+    filters = {}
+
+    categories = params.getlist('category')
+    if categories:
+        filters['category'] = Q(category_id__in=categories)
+
+    brand_ids = params.getlist('brand_id')
+    brand_name = params.get('brand')
+    if brand_ids:
+        filters['brand'] = Q(brand_id__in=brand_ids)
+    elif brand_name:
+        filters['brand'] = Q(brand__name__icontains=brand_name)
+
+    price_q = Q()
+    buckets = {key: (low, high) for key, low, high in PRICE_BUCKETS}
+    for key in params.getlist('price'):
+        if key in buckets:
+            price_q |= _bucket_q(*buckets[key])
+    if params.get('min_price'):
+        price_q &= Q(price__gte=params['min_price'])
+    if params.get('max_price'):
+        price_q &= Q(price__lte=params['max_price'])
+    if price_q:
+        filters['price'] = price_q
+
+    if params.get('in_stock') is not None:
+        filters['in_stock'] = Q(in_stock=_parse_bool(params['in_stock']))
+
+    for spec_id, low, high in parse_spec_ranges(params.getlist('spec_range')):
+        bounds = {}
+        if low is not None:
+            bounds['numeric_value__gte'] = low
+        if high is not None:
+            bounds['numeric_value__lte'] = high
+        filters[f'spec_range:{spec_id}'] = Q(id__in=ProductSpecification.objects.filter(
+            specification_id=spec_id, **bounds
+        ).values('product_id'))
+
+    spec_filters = parse_spec_filters(params.getlist('spec'))
+    return filters, spec_filters
+
+
+def parse_spec_ranges(values):
+    """
+    Parse `spec_range=<specification_id>:<min>:<max>[:<unit>]` parameters.
+    Either bound may be empty; bounds are converted to the base unit.
+    """
+    ranges = []
+    for raw in values:
+        parts = raw.split(':')
+        if len(parts) not in (3, 4):
+            raise ValueError(f'Invalid spec_range: {raw}')
+        spec_id = str(uuid.UUID(parts[0]))
+        unit = parts[3] if len(parts) == 4 else ''
+        low = to_base_unit(parts[1], unit) if parts[1] else None
+        high = to_base_unit(parts[2], unit) if parts[2] else None
+        ranges.append((spec_id, low, high))
+    return ranges
+
+
+def order_by_spec(queryset, spec_id, descending=False):
+    """Order products by the numeric value of a specification, missing values last."""
+    value = ProductSpecification.objects.filter(
+        product_id=OuterRef('pk'), specification_id=spec_id
+    ).values('numeric_value')[:1]
+    queryset = queryset.annotate(spec_sort_value=Subquery(value))
+    if descending:
+        return queryset.order_by(F('spec_sort_value').desc(nulls_last=True), 'id')
+    return queryset.order_by(F('spec_sort_value').asc(nulls_last=True), 'id')
+
+
+def spec_condition(spec_filters):
+    """
+    Q matching products that satisfy every {specification id: [values]}
+    filter. The conjunction is resolved on the bitmap index; when too many
+    products match to inline their ids, it falls back to one subquery per
+    specification.
+    """
+    if not spec_filters:
+        return Q()
+    index = get_spec_index()
+    bitmap = index.match({uuid.UUID(k): v for k, v in spec_filters.items()})
+    if bitmap.bit_count() <= MAX_INLINE_IDS:
+        return Q(id__in=index.product_ids(bitmap))
+
+    q = Q()
+    for spec_id, values in spec_filters.items():
+        q &= Q(id__in=ProductSpecification.objects.filter(
+            specification_id=spec_id, specification_value__in=values
+        ).values('product_id'))
+    return q
+
+
+def apply_filters(queryset, filters, spec_filters, exclude=None, exclude_spec=None):
+    for name, q in filters.items():
+        if name != exclude:
+            queryset = queryset.filter(q)
+    specs = {spec_id: values for spec_id, values in spec_filters.items() if spec_id != exclude_spec}
+    if specs:
+        queryset = queryset.filter(spec_condition(specs))
+    return queryset
+
+
+def compute_facets(base, filters, spec_filters):
+    """Count products per category, brand, price bucket, stock and spec value."""
+    def narrowed(exclude=None, exclude_spec=None):
+        return apply_filters(base, filters, spec_filters, exclude, exclude_spec)
+
+    categories = (narrowed('category')
+                  .values('category_id', 'category__name')
+                  .annotate(count=Count('id'))
+                  .order_by('-count', 'category__name'))
+
+    brands = (narrowed('brand')
+              .exclude(brand__isnull=True)
+              .values('brand_id', 'brand__name')
+              .annotate(count=Count('id'))
+              .order_by('-count', 'brand__name'))
+
+    price_counts = narrowed('price').aggregate(**{
+        key: Count('id', filter=_bucket_q(low, high)) for key, low, high in PRICE_BUCKETS
+    })
+
+    stock_counts = dict(narrowed('in_stock')
+                        .values_list('in_stock')
+                        .annotate(count=Count('id'))
+                        .order_by())
+
+    return {
+        'categories': [
+            {'id': str(row['category_id']), 'name': row['category__name'], 'count': row['count']}
+            for row in categories
+        ],
+        'brands': [
+            {'id': str(row['brand_id']), 'name': row['brand__name'], 'count': row['count']}
+            for row in brands
+        ],
+        'price': [
+            {'key': key, 'min': low, 'max': high, 'count': price_counts[key]}
+            for key, low, high in PRICE_BUCKETS
+        ],
+        'in_stock': {
+            'true': stock_counts.get(True, 0),
+            'false': stock_counts.get(False, 0),
+        },
+        'specifications': specification_facets(narrowed, spec_filters),
+    }
+
+
+def specification_facets(narrowed, spec_filters):
+    # One grouped query for every specification, plus one per specification
+    # the user is filtering on, so its other values keep their counts.
+    def grouped(products, **extra):
+        return (ProductSpecification.objects
+                .filter(product__in=products.values('id'), **extra)
+                .values('specification_id', 'specification__specification_name', 'specification_value')
+                .annotate(count=Count('product_id'))
+                .order_by('specification__specification_name', '-count', 'specification_value'))
+
+    rows = [row for row in grouped(narrowed())
+            if str(row['specification_id']) not in spec_filters]
+    for spec_id in spec_filters:
+        rows.extend(grouped(narrowed(exclude_spec=spec_id), specification_id=spec_id))
+
+    facets = {}
+    for row in rows:
+        spec_id = str(row['specification_id'])
+        facet = facets.setdefault(spec_id, {
+            'id': spec_id,
+            'name': row['specification__specification_name'],
+            'values': [],
+        })
+        facet['values'].append({'value': row['specification_value'], 'count': row['count']})
+    return sorted(facets.values(), key=lambda facet: facet['name'])
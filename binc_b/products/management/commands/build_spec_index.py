@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.models import CacheVersion
+from products.spec_index import VERSION_KEY, SpecificationBitmapIndex, load_rows
+
+
+class Command(BaseCommand):
+    help = 'Builds the specification bitmap index and optionally saves it to a file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Path to write the index snapshot to (see SPEC_INDEX_PATH)')
+
+    def handle(self, *args, **options):
+        index = SpecificationBitmapIndex()
+        started = time.perf_counter()
+        # Read before the rows: a change made meanwhile makes the snapshot
+        # look outdated rather than current
+        version = CacheVersion.current(VERSION_KEY)
+        index.build(load_rows())
+        index.version = version
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f'Indexed {len(index._product_ids)} products and {len(index._bitmaps)} '
+            f'specification values in {elapsed:.2f}s.'
+        )
+        if options['output']:
+            index.save(options['output'])
+            self.stdout.write(self.style.SUCCESS(f"Saved index to {options['output']}."))
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def fill_search_index(apps, schema_editor):
+    # 0001 only creates the index tables; without this every search on an
+    # existing catalog would come back empty until rebuild_search_index runs.
+    from products.search import backend_for_vendor
+
+    backend = backend_for_vendor(schema_editor.connection.vendor)
+    if backend is not None:
+        backend.rebuild(apps.get_model('core', 'Product'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_productspecification_numeric_value'),
+        ('products', '0002_cacheversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_search_index, migrations.RunPython.noop),
+    ]
@@ -3,3 +3,35 @@ from core.models import Product  # Import the Product model from core.models
 
 # Use the Product model from core.models
 # If additional models are needed, define them here or import as required.
+
+
+class CacheVersion(models.Model):
+    """
+    Version counter of a process-local cache or index. The row lives in the
+    database, so a bump made by one worker is seen by every other worker on
+    its next read.
+    """
+    key = models.CharField(max_length=100, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.key}: {self.version}"
+
+    @classmethod
+    def current(cls, key):
+        return cls.objects.filter(key=key).values_list('version', flat=True).first() or 0
+
+    @classmethod
+    def bump(cls, key):
+        """Increment the version of `key` and return the new value."""
+        if not cls.objects.filter(key=key).update(version=models.F('version') + 1):
+            cls.objects.get_or_create(key=key)
+            cls.objects.filter(key=key).update(version=models.F('version') + 1)
+        return cls.current(key)
+
+    @classmethod
+    def bump_many(cls, keys):
+        """Increment the versions of several keys in two queries."""
+        keys = set(keys)
+        cls.objects.bulk_create([cls(key=key) for key in keys], ignore_conflicts=True)
+        cls.objects.filter(key__in=keys).update(version=models.F('version') + 1)
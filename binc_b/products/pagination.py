@@ -0,0 +1,155 @@
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+#----------------------------------------------------------------
+#                 Keyset Cursor Pagination
+#----------------------------------------------------------------
+class KeysetCursorPagination(BasePagination):
+    """
+    Keyset pagination over (created_at, id).
+
+    Each page is fetched with a `WHERE (created_at, id) < cursor` predicate
+    instead of an OFFSET, so the cost of a page does not grow with its
+    position in the catalog. The mode is opt-in: it only kicks in when the
+    client sends `cursor` or `page_size`, so existing clients keep getting
+    plain lists.
+    """
+    page_size = 20
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+    results_key = 'results'
+
+    def is_requested(self, request):
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None, descending=True):
+        """Return one page of `queryset`, or None when pagination was not requested."""
+        if not self.is_requested(request):
+            return None
+
+        self.request = request
+        self.descending = descending
+        self.page_size_value = self.get_page_size(request)
+
+        if descending:
+            queryset = queryset.order_by('-created_at', '-id')
+        else:
+            queryset = queryset.order_by('created_at', 'id')
+
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded:
+            created_at, pk = self.decode_cursor(encoded)
+            if descending:
+                queryset = queryset.filter(
+                    Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+                )
+
+        # Fetch one extra row to know whether there is a next page.
+        rows = list(queryset[:self.page_size_value + 1])
+        self.has_next = len(rows) > self.page_size_value
+        self.page = rows[:self.page_size_value]
+        self.next_cursor = None
+        if self.has_next and self.page:
+            last = self.page[-1]
+            self.next_cursor = self.encode_cursor(last.created_at, last.id)
+        return self.page
+
+    def paginate_ordered(self, queryset, request, view=None):
+        """
+        Return one page of `queryset` in its own order (search ranking,
+        specification sort), or None when pagination was not requested.
+
+        The cursor is the position in that order, so only use this on
+        bounded results such as the capped search ranking: the cost of a
+        page grows with its offset.
+        """
+        if not self.is_requested(request):
+            return None
+
+        self.request = request
+        self.page_size_value = self.get_page_size(request)
+
+        offset = 0
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded:
+            offset = self.decode_offset(encoded)
+
+        rows = list(queryset[offset:offset + self.page_size_value + 1])
+        self.has_next = len(rows) > self.page_size_value
+        self.page = rows[:self.page_size_value]
+        self.next_cursor = None
+        if self.has_next and self.page:
+            self.next_cursor = self.encode_offset(offset + len(self.page))
+        return self.page
+
+    def encode_cursor(self, created_at, pk):
+        payload = json.dumps({'c': created_at.isoformat(), 'i': str(pk)})
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, encoded):
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            created_at = parse_datetime(payload['c'])
+            pk = payload['i']
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return created_at, pk
+
+    def encode_offset(self, offset):
+        payload = json.dumps({'o': offset})
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+    def decode_offset(self, encoded):
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            offset = payload['o']
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(offset, int) or offset < 0:
+            raise NotFound(self.invalid_cursor_message)
+        return offset
+
+    def get_next_link(self):
+        if not self.next_cursor:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            self.results_key: data,
+            'page_size': self.page_size_value,
+            'next_cursor': self.next_cursor,
+            'next': self.get_next_link(),
+        })
+
+
+class ProductCursorPagination(KeysetCursorPagination):
+    """Cursor pagination for product listings."""
+    page_size = 24
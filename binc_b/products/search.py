@@ -0,0 +1,253 @@
+"""
+Full-text search index for products.
+
+Products are indexed on name, brand, category, specification values and
+description. SQLite uses an FTS5 virtual table; PostgreSQL uses a tsvector
+table with a GIN index. Both backends share the same interface, so views
+only ever talk to `get_search_backend()`.
+"""
+import re
+import uuid
+
+from django.db import connection
+
+# Arabic short vowels, shadda, sukun, superscript alef and tatweel
+ARABIC_DIACRITICS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u0640]')
+ARABIC_LETTER_MAP = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ة': 'ه', 'ؤ': 'و', 'ئ': 'ي',
+})
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+SEARCH_RESULT_LIMIT = 1000
+
+
+def normalize_text(text):
+    """Fold case and Arabic spelling variants so index and query agree."""
+    if not text:
+        return ''
+    text = ARABIC_DIACRITICS.sub('', str(text))
+    return text.translate(ARABIC_LETTER_MAP).lower()
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(normalize_text(text))
+
+
+def product_document(product):
+    """Collect the searchable text fields of a product."""
+    from core.models import ProductSpecification
+
+    values = ProductSpecification.objects.filter(
+        product_id=product.pk
+    ).values_list('specification_value', flat=True)
+    return {
+        'name': normalize_text(product.name),
+        'brand': normalize_text(product.brand.name if product.brand_id else ''),
+        'category': normalize_text(product.category.name if product.category_id else ''),
+        'specifications': normalize_text(' '.join(values)),
+        'description': normalize_text(product.description),
+    }
+
+
+#----------------------------------------------------------------
+#                   Search Backends
+#----------------------------------------------------------------
+class SearchBackend:
+    """Interface shared by the full-text search backends."""
+
+    def create_schema(self, cursor):
+        raise NotImplementedError
+
+    def drop_schema(self, cursor):
+        raise NotImplementedError
+
+    def index_product(self, product):
+        raise NotImplementedError
+
+    def remove_product(self, product_id):
+        raise NotImplementedError
+
+    def search(self, query, limit=SEARCH_RESULT_LIMIT):
+        """Return product ids matching `query`, best match first."""
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def rebuild(self, product_model=None):
+        """
+        Reindex every product. Migrations pass their historical Product
+        model, which matches the schema at that point.
+        """
+        if product_model is None:
+            from core.models import Product as product_model
+
+        self.clear()
+        products = product_model.objects.select_related('brand', 'category')
+        count = 0
+        for product in products.iterator(chunk_size=500):
+            self.index_product(product)
+            count += 1
+        return count
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """
+    FTS5 index. Product UUIDs are mapped to integer rowids through a side
+    table so updates and deletes hit the FTS rowid directly.
+    """
+    table = 'products_search'
+    map_table = 'products_search_map'
+    # bm25 weights, in column order: name, brand, category, specifications, description
+    weights = (10.0, 5.0, 3.0, 2.0, 1.0)
+
+    def create_schema(self, cursor):
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.map_table} ("
+            "rowid INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "product_id CHAR(32) NOT NULL UNIQUE)"
+        )
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+            "name, brand, category, specifications, description, "
+            "tokenize = 'unicode61 remove_diacritics 2', "
+            "prefix = '2 3')"
+        )
+
+    def drop_schema(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {self.table}")
+        cursor.execute(f"DROP TABLE IF EXISTS {self.map_table}")
+
+    def _rowid(self, cursor, product_id):
+        cursor.execute(
+            f"SELECT rowid FROM {self.map_table} WHERE product_id = %s", [product_id.hex]
+        )
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def index_product(self, product):
+        doc = product_document(product)
+        with connection.cursor() as cursor:
+            rowid = self._rowid(cursor, product.pk)
+            if rowid is None:
+                cursor.execute(
+                    f"INSERT INTO {self.map_table} (product_id) VALUES (%s)", [product.pk.hex]
+                )
+                rowid = cursor.lastrowid
+            else:
+                cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [rowid])
+            cursor.execute(
+                f"INSERT INTO {self.table} "
+                "(rowid, name, brand, category, specifications, description) "
+                "VALUES (%s, %s, %s, %s, %s, %s)",
+                [rowid, doc['name'], doc['brand'], doc['category'],
+                 doc['specifications'], doc['description']]
+            )
+
+    def remove_product(self, product_id):
+        with connection.cursor() as cursor:
+            rowid = self._rowid(cursor, product_id)
+            if rowid is None:
+                return
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [rowid])
+            cursor.execute(f"DELETE FROM {self.map_table} WHERE rowid = %s", [rowid])
+
+    def build_match(self, query):
+        # Quote every token so user input can never form FTS5 syntax; the
+        # trailing * turns each token into a prefix match.
+        tokens = tokenize(query)
+        return ' AND '.join('"%s"*' % token.replace('"', '""') for token in tokens)
+
+    def search(self, query, limit=SEARCH_RESULT_LIMIT):
+        match = self.build_match(query)
+        if not match:
+            return []
+        weights = ', '.join(str(w) for w in self.weights)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT m.product_id FROM {self.table} "
+                f"JOIN {self.map_table} m ON m.rowid = {self.table}.rowid "
+                f"WHERE {self.table} MATCH %s "
+                f"ORDER BY bm25({self.table}, {weights}) LIMIT %s",
+                [match, limit]
+            )
+            return [uuid.UUID(row[0]) for row in cursor.fetchall()]
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            cursor.execute(f"DELETE FROM {self.map_table}")
+
+
+class PostgresSearchBackend(SearchBackend):
+    """tsvector index with per-field weights and a GIN index."""
+    table = 'products_search_document'
+    # The 'simple' config does no stemming, which is the safe choice for
+    # mixed Arabic and English text that has already been normalized.
+    config = 'simple'
+
+    def create_schema(self, cursor):
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            "product_id uuid PRIMARY KEY, "
+            "document tsvector NOT NULL)"
+        )
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {self.table}_gin ON {self.table} USING GIN (document)"
+        )
+
+    def drop_schema(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {self.table}")
+
+    def index_product(self, product):
+        doc = product_document(product)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {self.table} (product_id, document) VALUES (%s, "
+                "setweight(to_tsvector(%s, %s), 'A') || "
+                "setweight(to_tsvector(%s, %s || ' ' || %s), 'B') || "
+                "setweight(to_tsvector(%s, %s), 'C') || "
+                "setweight(to_tsvector(%s, %s), 'D')) "
+                "ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document",
+                [product.pk,
+                 self.config, doc['name'],
+                 self.config, doc['brand'], doc['category'],
+                 self.config, doc['specifications'],
+                 self.config, doc['description']]
+            )
+
+    def remove_product(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE product_id = %s", [product_id])
+
+    def search(self, query, limit=SEARCH_RESULT_LIMIT):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        tsquery = ' & '.join(f'{token}:*' for token in tokens)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT product_id FROM {self.table} "
+                "WHERE document @@ to_tsquery(%s, %s) "
+                "ORDER BY ts_rank_cd(document, to_tsquery(%s, %s)) DESC LIMIT %s",
+                [self.config, tsquery, self.config, tsquery, limit]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {self.table}")
+
+
+def backend_for_vendor(vendor):
+    if vendor == 'sqlite':
+        return SQLiteFTSBackend()
+    if vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return None
+
+
+def get_search_backend():
+    """Return the search backend for the default database, or None."""
+    return backend_for_vendor(connection.vendor)
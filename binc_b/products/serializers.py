@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db.models import Count, QuerySet, prefetch_related_objects
 from reviews.serializers import ReviewSerializer
 from core.models import Category, Product, Shop, Customer, Brand, SpecificationCategory, Specification, ProductSpecification
 
@@ -17,8 +18,57 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'description', 'product_count')
 
     def get_product_count(self, obj):
+        # Counts batched by an enclosing list serializer or passed by the
+        # view take precedence
+        counts = self.batched_product_counts()
+        if counts is None:
+            counts = self.context.get('category_product_counts')
+        if counts is not None:
+            return counts.get(obj.pk, 0)
         return obj.products.filter(is_active=True).count()
 
+    def batched_product_counts(self):
+        parent = self.parent
+        while parent is not None:
+            counts = getattr(parent, 'category_product_counts', None)
+            if counts is not None:
+                return counts
+            parent = parent.parent
+        return None
+
+
+def category_product_counts(category_ids):
+    """Return {category_id: active product count} in one grouped query."""
+    rows = (Product.objects
+            .filter(is_active=True, category_id__in=category_ids)
+            .values('category_id')
+            .annotate(total=Count('id'))
+            .values_list('category_id', 'total'))
+    return dict(rows)
+
+#----------------------------------------------------------------
+#                   ProductList List Serializer
+#----------------------------------------------------------------
+class ProductListListSerializer(serializers.ListSerializer):
+    """
+    Loads the categories of a product page in one join and their product
+    counts in one grouped aggregate, instead of two queries per row.
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if hasattr(data, 'all') else data
+        if isinstance(iterable, QuerySet):
+            iterable = iterable.select_related('category')
+        products = list(iterable)
+        # No-op for rows already loaded through select_related
+        prefetch_related_objects(products, 'category')
+
+        # Kept on this serializer rather than in the context, which is
+        # shared by the whole serializer tree
+        category_ids = {product.category_id for product in products}
+        self.category_product_counts = category_product_counts(category_ids)
+        return super().to_representation(products)
+
 #----------------------------------------------------------------
 #                   ProductList Serializer
 #----------------------------------------------------------------
@@ -33,6 +83,7 @@ class ProductListSerializer(serializers.ModelSerializer):
         model = Product
         fields = ('id', 'name', 'price', 'original_price', 'discount',
                   'category', 'image_url', 'rating', 'in_stock', 'is_active')
+        list_serializer_class = ProductListListSerializer
 
     def get_discount(self, obj):
         return obj.discount_percentage
@@ -185,5 +236,5 @@ class ProductSpecificationSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ProductSpecification
-        fields = ('id', 'specification', 'specification_id', 'specification_value')
-        read_only_fields = ('id',)
\ No newline at end of file
+        fields = ('id', 'specification', 'specification_id', 'specification_value', 'numeric_value', 'unit')
+        read_only_fields = ('id', 'numeric_value', 'unit')
\ No newline at end of file
@@ -0,0 +1,160 @@
+import threading
+from contextlib import contextmanager
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from core.models import (
+    Product, Brand, Category, ProductSpecification, Specification, SpecificationCategory
+)
+from .search import get_search_backend
+from .autocomplete import autocomplete_index, Suggestion, bump_index_version as bump_autocomplete_version
+from .spec_index import spec_index, bump_index_version as bump_spec_index_version
+from .spec_catalog import bump_catalog_version
+
+_state = threading.local()
+
+
+@contextmanager
+def specification_signals_suspended():
+    """
+    Skip the per-row ProductSpecification handlers inside the block. Bulk
+    writers use this and call refresh_product_indexes() once at the end.
+    """
+    previous = getattr(_state, 'suspended', False)
+    _state.suspended = True
+    try:
+        yield
+    finally:
+        _state.suspended = previous
+
+
+def _specification_signals_suspended():
+    return getattr(_state, 'suspended', False)
+
+
+def refresh_product_indexes(product, specs):
+    """Reindex one product after its specifications were replaced with `specs`."""
+    backend = get_search_backend()
+    if backend is not None:
+        backend.index_product(product)
+    if spec_index.is_built:
+        spec_index.replace_product(product.pk, specs)
+    spec_index.advance(*bump_spec_index_version())
+
+
+#----------------------------------------------------------------
+#               Search index synchronisation
+#----------------------------------------------------------------
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    backend = get_search_backend()
+    if backend is not None and not raw:
+        backend.index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    backend = get_search_backend()
+    if backend is not None:
+        backend.remove_product(instance.pk)
+
+
+@receiver(post_save, sender=ProductSpecification)
+@receiver(post_delete, sender=ProductSpecification)
+def reindex_specification_product(sender, instance, raw=False, **kwargs):
+    backend = get_search_backend()
+    if backend is None or raw or _specification_signals_suspended():
+        return
+    product = Product.objects.select_related('brand', 'category').filter(pk=instance.product_id).first()
+    if product is not None:
+        backend.index_product(product)
+
+
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+def reindex_related_products(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    # New brands and categories have no products yet; renames must be
+    # propagated to every product that carries the old name.
+    backend = get_search_backend()
+    if backend is None or raw or created:
+        return
+    if update_fields is not None and 'name' not in update_fields:
+        return
+    for product in instance.products.select_related('brand', 'category').iterator(chunk_size=500):
+        backend.index_product(product)
+
+
+#----------------------------------------------------------------
+#               Autocomplete index synchronisation
+#----------------------------------------------------------------
+# Only an index that has already been built needs patching; an unbuilt one
+# reads the current rows when it is first used. Every change bumps the
+# shared index version so that other processes rebuild their copy.
+@receiver(post_save, sender=Product)
+def update_product_suggestion(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if autocomplete_index.is_built:
+        if instance.is_active and not instance.is_banned:
+            autocomplete_index.upsert(Suggestion('product', instance.pk, instance.name, instance.views))
+        else:
+            autocomplete_index.remove('product', instance.pk)
+    autocomplete_index.advance(*bump_autocomplete_version())
+
+
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+def update_name_suggestion(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if autocomplete_index.is_built:
+        kind = 'brand' if sender is Brand else 'category'
+        current = autocomplete_index.get(kind, instance.pk)
+        weight = current.weight if current else 0
+        autocomplete_index.upsert(Suggestion(kind, instance.pk, instance.name, weight))
+    autocomplete_index.advance(*bump_autocomplete_version())
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Brand)
+@receiver(post_delete, sender=Category)
+def remove_suggestion(sender, instance, **kwargs):
+    if autocomplete_index.is_built:
+        kind = {Product: 'product', Brand: 'brand', Category: 'category'}[sender]
+        autocomplete_index.remove(kind, instance.pk)
+    autocomplete_index.advance(*bump_autocomplete_version())
+
+
+#----------------------------------------------------------------
+#           Specification bitmap index synchronisation
+#----------------------------------------------------------------
+# Every change bumps the shared index version so that other processes
+# rebuild their copy; this process patches its own and keeps it current.
+@receiver(post_save, sender=ProductSpecification)
+def update_spec_bitmap(sender, instance, raw=False, **kwargs):
+    if raw or _specification_signals_suspended():
+        return
+    if spec_index.is_built:
+        spec_index.set_value(instance.product_id, instance.specification_id, instance.specification_value)
+    spec_index.advance(*bump_spec_index_version())
+
+
+@receiver(post_delete, sender=ProductSpecification)
+def clear_spec_bitmap(sender, instance, **kwargs):
+    if _specification_signals_suspended():
+        return
+    if spec_index.is_built:
+        spec_index.unset_value(instance.product_id, instance.specification_id)
+    spec_index.advance(*bump_spec_index_version())
+
+
+#----------------------------------------------------------------
+#               Specification catalog cache
+#----------------------------------------------------------------
+@receiver(post_save, sender=Specification)
+@receiver(post_delete, sender=Specification)
+@receiver(post_save, sender=SpecificationCategory)
+@receiver(post_delete, sender=SpecificationCategory)
+def invalidate_spec_catalog(sender, **kwargs):
+    bump_catalog_version()
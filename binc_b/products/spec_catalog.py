@@ -0,0 +1,74 @@
+"""
+Cached specification catalog for the dashboard's spec editor.
+
+The catalog (every specification category with its specifications) is read
+in one joined query and stored in the cache as a single blob under a
+version number. Any change to a specification or specification category
+bumps the version, so stale blobs are never served and simply expire. The
+blob carries an ETag derived from its content for conditional requests.
+
+The version is a CacheVersion row rather than a cache entry: with a
+per-process cache, a version kept in the cache would only be bumped in the
+worker that handled the change. Sharing the blobs themselves between
+workers needs a shared cache backend (Redis, Memcached); with the default
+local-memory cache every worker builds its own copy once per version.
+"""
+import hashlib
+import json
+
+from django.core.cache import cache
+
+from .models import CacheVersion
+
+VERSION_KEY = 'products:spec_catalog'
+CATALOG_KEY = 'products:spec_catalog:{version}'
+CATALOG_TIMEOUT = 60 * 60 * 24
+
+
+def catalog_version():
+    return CacheVersion.current(VERSION_KEY)
+
+
+def bump_catalog_version():
+    """Invalidate the cached catalog in every process."""
+    CacheVersion.bump(VERSION_KEY)
+
+
+def build_catalog():
+    """Read the catalog from the database in a single LEFT JOIN query."""
+    from core.models import SpecificationCategory
+
+    rows = (SpecificationCategory.objects
+            .values_list('id', 'category_name', 'specification__id', 'specification__specification_name')
+            .order_by('category_name', 'specification__specification_name'))
+
+    categories = {}
+    for category_id, category_name, spec_id, spec_name in rows:
+        category = categories.get(category_id)
+        if category is None:
+            category = categories[category_id] = {
+                'id': str(category_id),
+                'category_name': category_name,
+                'specifications': [],
+            }
+        if spec_id is not None:
+            category['specifications'].append({
+                'id': str(spec_id),
+                'specification_name': spec_name,
+            })
+    return list(categories.values())
+
+
+def get_catalog():
+    """Return (etag, catalog), building and caching the catalog on a miss."""
+    key = CATALOG_KEY.format(version=catalog_version())
+    blob = cache.get(key)
+    if blob is None:
+        catalog = build_catalog()
+        payload = json.dumps(catalog, ensure_ascii=False, sort_keys=True)
+        blob = {
+            'etag': '"%s"' % hashlib.sha1(payload.encode('utf-8')).hexdigest(),
+            'catalog': catalog,
+        }
+        cache.set(key, blob, CATALOG_TIMEOUT)
+    return blob['etag'], blob['catalog']
@@ -0,0 +1,274 @@
+"""
+Bitmap index over product specification values.
+
+Each product gets a dense ordinal, and every (specification_id, value)
+pair maps to a bitmap of the products that have it. Python integers serve
+as the bitmaps, so OR across values and AND across specifications run in C
+over machine words. The index is built from the ProductSpecification
+table on first use, patched incrementally when specifications change, and
+can be saved to and loaded from disk.
+
+Every change to a product specification also bumps a CacheVersion row, which
+all workers share. The index remembers the version it reflects, reads the
+row at most once every VERSION_CHECK_INTERVAL seconds, and is rebuilt when
+the row moved on, i.e. when another process changed specifications this
+process never saw.
+
+A snapshot written by `manage.py build_spec_index --output` records the
+version it was built at. When SPEC_INDEX_PATH points to one, a process
+that needs the index loads it instead of reading the whole table, as long
+as it still matches the shared version.
+"""
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 2
+# Seconds between two reads of the shared index version
+VERSION_CHECK_INTERVAL = 1.0
+
+
+def iter_bits(bitmap):
+    """Yield the positions of the set bits in `bitmap`, lowest first."""
+    # One pass over the binary string, lowest bit first
+    bits = bin(bitmap)[:1:-1]
+    pos = bits.find('1')
+    while pos != -1:
+        yield pos
+        pos = bits.find('1', pos + 1)
+
+
+class SpecificationBitmapIndex:
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._product_ids = []      # ordinal -> product id
+        self._ordinals = {}         # product id -> ordinal
+        self._bitmaps = {}          # (specification id, value) -> bitmap
+        self._product_specs = {}    # ordinal -> {specification id: value}
+        self._built = False
+        self.version = None         # CacheVersion the index reflects, None if unknown
+        self.checked_at = None      # time.monotonic() of the last version read
+
+    @property
+    def is_built(self):
+        return self._built
+
+    def _ordinal(self, product_id):
+        ordinal = self._ordinals.get(product_id)
+        if ordinal is None:
+            ordinal = len(self._product_ids)
+            self._product_ids.append(product_id)
+            self._ordinals[product_id] = ordinal
+        return ordinal
+
+    def _set(self, ordinal, spec_id, value):
+        specs = self._product_specs.setdefault(ordinal, {})
+        old = specs.get(spec_id)
+        if old is not None:
+            self._clear(ordinal, spec_id, old)
+        specs[spec_id] = value
+        key = (spec_id, value)
+        self._bitmaps[key] = self._bitmaps.get(key, 0) | (1 << ordinal)
+
+    def _clear(self, ordinal, spec_id, value):
+        key = (spec_id, value)
+        bitmap = self._bitmaps.get(key, 0) & ~(1 << ordinal)
+        if bitmap:
+            self._bitmaps[key] = bitmap
+        else:
+            self._bitmaps.pop(key, None)
+
+    def build(self, rows):
+        """Rebuild from (product_id, specification_id, value) rows."""
+        with self._lock:
+            self._reset()
+            for product_id, spec_id, value in rows:
+                ordinal = self._ordinal(product_id)
+                self._product_specs.setdefault(ordinal, {})[spec_id] = value
+            self._finish_build()
+
+    def _finish_build(self):
+        # Each bitmap is assembled once from a byte buffer; OR-ing bits in
+        # one at a time would copy the growing integer on every row.
+        ordinals = {}
+        for ordinal, specs in self._product_specs.items():
+            for key in specs.items():
+                ordinals.setdefault(key, []).append(ordinal)
+        size = (len(self._product_ids) >> 3) + 1
+        for key, positions in ordinals.items():
+            buffer = bytearray(size)
+            for ordinal in positions:
+                buffer[ordinal >> 3] |= 1 << (ordinal & 7)
+            self._bitmaps[key] = int.from_bytes(buffer, 'little')
+        self._built = True
+
+    def invalidate(self):
+        """Drop the index so it is rebuilt from the database on next use."""
+        with self._lock:
+            self._reset()
+
+    def advance(self, previous, version):
+        """
+        Record that `version` follows a local change applied on top of
+        `previous`. If the index did not reflect `previous`, another
+        process changed specifications in between and it stays outdated.
+        """
+        with self._lock:
+            if self.version is not None and self.version == previous:
+                self.version = version
+
+    def set_value(self, product_id, spec_id, value):
+        with self._lock:
+            self._set(self._ordinal(product_id), spec_id, value)
+
+    def unset_value(self, product_id, spec_id):
+        with self._lock:
+            ordinal = self._ordinals.get(product_id)
+            if ordinal is None:
+                return
+            value = self._product_specs.get(ordinal, {}).pop(spec_id, None)
+            if value is not None:
+                self._clear(ordinal, spec_id, value)
+
+    def replace_product(self, product_id, specs):
+        """Replace every specification of a product with `specs` ({spec id: value})."""
+        with self._lock:
+            ordinal = self._ordinal(product_id)
+            for spec_id, value in self._product_specs.pop(ordinal, {}).items():
+                self._clear(ordinal, spec_id, value)
+            for spec_id, value in specs.items():
+                self._set(ordinal, spec_id, value)
+
+    def remove_product(self, product_id):
+        self.replace_product(product_id, {})
+
+    def bitmap(self, spec_id, values):
+        """Bitmap of the products whose `spec_id` is any of `values`."""
+        result = 0
+        for value in values:
+            result |= self._bitmaps.get((spec_id, value), 0)
+        return result
+
+    def match(self, filters):
+        """
+        Bitmap of the products matching every {spec id: [values]} filter.
+        Returns None for an empty filter set (no constraint).
+        """
+        result = None
+        # Most selective specification first, so the AND can stop early
+        bitmaps = sorted((self.bitmap(spec_id, values) for spec_id, values in filters.items()),
+                         key=int.bit_count)
+        for bitmap in bitmaps:
+            result = bitmap if result is None else result & bitmap
+            if not result:
+                break
+        return result
+
+    def product_ids(self, bitmap):
+        ids = self._product_ids
+        return [ids[ordinal] for ordinal in iter_bits(bitmap)]
+
+    # ------------------------------------------------------------------
+    #   Persistence
+    # ------------------------------------------------------------------
+    def dumps(self):
+        with self._lock:
+            return pickle.dumps({
+                'version': FORMAT_VERSION,
+                'index_version': self.version,
+                'product_ids': self._product_ids,
+                'product_specs': self._product_specs,
+            }, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, data):
+        # Bitmaps are rebuilt from the per-product specs, which keeps the
+        # file format independent of the ordinal layout in memory.
+        state = pickle.loads(data)
+        if state.get('version') != FORMAT_VERSION:
+            raise ValueError('Unsupported specification index format')
+        with self._lock:
+            self._reset()
+            for ordinal, product_id in enumerate(state['product_ids']):
+                self._product_ids.append(product_id)
+                self._ordinals[product_id] = ordinal
+            self._product_specs = state['product_specs']
+            self._finish_build()
+            self.version = state['index_version']
+
+    def save(self, path):
+        """Write the index to `path` atomically."""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self.dumps())
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        with open(path, 'rb') as f:
+            self.loads(f.read())
+
+
+def load_rows():
+    from core.models import ProductSpecification
+
+    rows = ProductSpecification.objects.values_list('product_id', 'specification_id', 'specification_value')
+    return rows.iterator(chunk_size=5000)
+
+
+spec_index = SpecificationBitmapIndex()
+
+VERSION_KEY = 'products:spec_index'
+
+
+def bump_index_version():
+    """Record a specification change; returns (previous, new) version."""
+    from .models import CacheVersion
+
+    version = CacheVersion.bump(VERSION_KEY)
+    return version - 1, version
+
+
+def load_snapshot(version):
+    """Load the SPEC_INDEX_PATH snapshot into the index if it reflects `version`."""
+    path = getattr(settings, 'SPEC_INDEX_PATH', None)
+    if not path or not os.path.exists(path):
+        return False
+    try:
+        spec_index.load(path)
+    except (OSError, ValueError, KeyError, pickle.UnpicklingError) as e:
+        logger.warning(f"Could not load the specification index snapshot {path}: {e}")
+        return False
+    return spec_index.version == version
+
+
+def get_spec_index():
+    """
+    Return the process-wide index, building it on first use and rebuilding
+    it when specifications changed in another process.
+    """
+    from .models import CacheVersion
+
+    now = time.monotonic()
+    checked_at = spec_index.checked_at
+    if spec_index.is_built and checked_at is not None and now - checked_at < VERSION_CHECK_INTERVAL:
+        return spec_index
+
+    version = CacheVersion.current(VERSION_KEY)
+    with spec_index._lock:
+        if not spec_index.is_built or spec_index.version != version:
+            if not load_snapshot(version):
+                spec_index.build(load_rows())
+                spec_index.version = version
+        spec_index.checked_at = now
+    return spec_index
@@ -1,3 +1,756 @@
-from django.test import TestCase
+import uuid
+from datetime import timedelta
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import User, Owner, Shop, Category, Brand, Product
+
+
+def create_shop(username='owner'):
+    user = User.objects.create_user(username=username, password='pass', user_type='owner')
+    owner = Owner.objects.create(user=user, email=f'{username}@example.com', password='pass')
+    shop = Shop.objects.create(
+        name=f'{username} shop', owner=owner, address='Riyadh',
+        logo='shop_logos/logo.png', url='https://example.com'
+    )
+    return user, shop
+
+
+def create_product(shop, category, name, brand=None, **kwargs):
+    kwargs.setdefault('price', 100)
+    kwargs.setdefault('rating', 0)
+    return Product.objects.create(name=name, shop=shop, category=category, brand=brand, **kwargs)
+
+
+class ProductCursorPaginationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user, self.shop = create_shop()
+        self.category = Category.objects.create(name='Phones')
+        base = timezone.now()
+        for i in range(7):
+            product = create_product(self.shop, self.category, f'Phone {i}')
+            # Two products share each timestamp to exercise the id tie-breaker
+            Product.objects.filter(pk=product.pk).update(created_at=base - timedelta(minutes=i // 2))
+
+    def walk(self, url, params):
+        cursor = None
+        while True:
+            query = dict(params)
+            if cursor:
+                query['cursor'] = cursor
+            response = self.client.get(url, query)
+            self.assertEqual(response.status_code, 200)
+            yield response
+            cursor = response.data['next_cursor']
+            if not cursor:
+                break
+
+    def test_list_without_pagination_params_returns_plain_list(self):
+        response = self.client.get('/api/products/')
+        self.assertIsInstance(response.data, list)
+        self.assertEqual(len(response.data), 7)
+
+    def test_cursor_walk_visits_every_product_once_in_order(self):
+        pages = list(self.walk('/api/products/', {'page_size': 3}))
+        self.assertEqual([len(p.data['results']) for p in pages], [3, 3, 1])
+
+        ids = [item['id'] for page in pages for item in page.data['results']]
+        expected = Product.objects.order_by('-created_at', '-id').values_list('id', flat=True)
+        self.assertEqual(ids, [str(pk) for pk in expected])
+
+    def test_search_uses_products_key(self):
+        response = self.client.get('/api/products/search/', {'query': 'Phone', 'page_size': 5})
+        self.assertEqual(len(response.data['products']), 5)
+        self.assertIsNotNone(response.data['next_cursor'])
+
+    def test_search_pages_keep_the_search_order(self):
+        unpaginated = self.client.get('/api/products/search/', {'query': 'Phone'})
+        expected = [item['id'] for item in unpaginated.data['products']]
+
+        pages = list(self.walk('/api/products/search/', {'query': 'Phone', 'page_size': 3}))
+        self.assertEqual([len(p.data['products']) for p in pages], [3, 3, 1])
+        self.assertEqual([item['id'] for page in pages for item in page.data['products']], expected)
+
+    def test_search_sort_spec_without_query_rejects_cursor(self):
+        response = self.client.get('/api/products/search/', {'sort_spec': str(uuid.uuid4()), 'page_size': 3})
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/products/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_owner_products_ascending(self):
+        self.client.force_authenticate(user=self.user)
+        pages = list(self.walk('/api/dashboard/products/', {'page_size': 4, 'sort_order': 'asc'}))
+        ids = [item['id'] for page in pages for item in page.data['results']]
+        expected = Product.objects.order_by('created_at', 'id').values_list('id', flat=True)
+        self.assertEqual(ids, [str(pk) for pk in expected])
+
+
+class ProductListQueryBudgetTest(TestCase):
+    # One query for the products joined to their categories, one for the
+    # grouped category counts. Anything above this is an N+1 regression.
+    LIST_PAGE_QUERY_BUDGET = 2
+
+    def setUp(self):
+        self.client = APIClient()
+        _, shop = create_shop()
+        categories = [Category.objects.create(name=f'Category {i}') for i in range(3)]
+        for i in range(30):
+            create_product(shop, categories[i % 3], f'Product {i}')
+
+    def test_product_list_query_budget(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/products/')
+        self.assertEqual(len(response.data), 30)
+        self.assertLessEqual(len(queries), self.LIST_PAGE_QUERY_BUDGET)
+
+    def test_paginated_page_query_budget(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/products/', {'page_size': 12})
+        self.assertEqual(len(response.data['results']), 12)
+        self.assertLessEqual(len(queries), self.LIST_PAGE_QUERY_BUDGET)
+
+    def test_batched_counts_match_per_row_counts(self):
+        response = self.client.get('/api/products/')
+        for item in response.data:
+            category = Category.objects.get(pk=item['category']['id'])
+            expected = category.products.filter(is_active=True).count()
+            self.assertEqual(item['category']['product_count'], expected)
+
+    def test_batched_counts_do_not_leak_into_the_context(self):
+        from products.serializers import ProductListSerializer
+        context = {}
+        data = ProductListSerializer(Product.objects.all(), many=True, context=context).data
+        self.assertEqual(len(data), 30)
+        self.assertEqual(context, {})
+
+
+class ProductFullTextSearchTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        _, self.shop = create_shop()
+        self.phones = Category.objects.create(name='Phones')
+        self.laptops = Category.objects.create(name='Laptops')
+        self.brand = Brand.objects.create(name='Samsung', popularity=50, rating=4)
+        self.galaxy = create_product(self.shop, self.phones, 'Galaxy S24', brand=self.brand,
+                                     description='Flagship phone with a great camera')
+        self.book = create_product(self.shop, self.laptops, 'Galaxy Book',
+                                   description='Thin laptop')
+        self.arabic = create_product(self.shop, self.phones, 'هاتف ذكي بشاشة كبيرة')
+
+    def search(self, query):
+        response = self.client.get('/api/products/search/', {'query': query})
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.data['products']]
+
+    def test_prefix_match(self):
+        self.assertEqual(set(self.search('gal')), {'Galaxy S24', 'Galaxy Book'})
+
+    def test_name_ranks_above_description(self):
+        laptop = create_product(self.shop, self.laptops, 'Laptop Stand')
+        self.assertEqual(self.search('laptop')[0], laptop.name)
+
+    def test_migration_fills_the_index(self):
+        import importlib
+        from types import SimpleNamespace
+        from django.apps import apps
+        from products.search import get_search_backend
+
+        get_search_backend().clear()
+        self.assertEqual(self.search('galaxy'), [])
+        migration = importlib.import_module('products.migrations.0003_fill_search_index')
+        migration.fill_search_index(apps, SimpleNamespace(connection=connection))
+        self.assertEqual(set(self.search('galaxy')), {'Galaxy S24', 'Galaxy Book'})
+
+    def test_ranking_survives_page_size(self):
+        laptop = create_product(self.shop, self.laptops, 'Laptop Stand')
+        response = self.client.get('/api/products/search/', {'query': 'laptop', 'page_size': 1})
+        self.assertEqual([item['name'] for item in response.data['products']], [laptop.name])
+
+        response = self.client.get('/api/products/search/', {
+            'query': 'laptop', 'page_size': 1, 'cursor': response.data['next_cursor'],
+        })
+        self.assertEqual([item['name'] for item in response.data['products']], [self.book.name])
+        self.assertIsNone(response.data['next_cursor'])
+
+    def test_matches_brand_category_and_specs(self):
+        self.assertEqual(self.search('samsung'), ['Galaxy S24'])
+        self.assertIn('Galaxy Book', self.search('laptops'))
+
+        from core.models import Specification, SpecificationCategory, ProductSpecification
+        spec_category = SpecificationCategory.objects.create(category_name='Display')
+        spec = Specification.objects.create(category=spec_category, specification_name='Panel')
+        ProductSpecification.objects.create(product=self.book, specification=spec, specification_value='OLED')
+        self.assertEqual(self.search('oled'), ['Galaxy Book'])
+
+    def test_arabic_normalization(self):
+        # Diacritics and alef/ta-marbuta variants match the plain spelling
+        self.assertEqual(self.search('هَاتِف'), [self.arabic.name])
+        self.assertEqual(self.search('كبيره'), [self.arabic.name])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.galaxy.name = 'Pixel 9'
+        self.galaxy.save()
+        self.assertEqual(self.search('pixel'), ['Pixel 9'])
+        self.assertEqual(self.search('galaxy'), ['Galaxy Book'])
+
+        self.book.delete()
+        self.assertEqual(self.search('galaxy'), [])
+
+    def test_query_syntax_is_escaped(self):
+        self.assertEqual(set(self.search('galaxy" * (')), {'Galaxy S24', 'Galaxy Book'})
+
+
+class AutocompleteIndexTest(TestCase):
+    def setUp(self):
+        from products.autocomplete import AutocompleteIndex, Suggestion
+        self.Suggestion = Suggestion
+        self.index = AutocompleteIndex()
+        self.index.build([
+            Suggestion('product', 1, 'Galaxy S24', 50),
+            Suggestion('product', 2, 'Galaxy Book', 80),
+            Suggestion('brand', 3, 'Google', 10),
+            Suggestion('product', 4, 'Pixel 9', 5),
+        ])
+
+    def texts(self, prefix, **kwargs):
+        return [s.text for s in self.index.suggest(prefix, **kwargs)]
+
+    def test_prefix_ordered_by_weight(self):
+        self.assertEqual(self.texts('g'), ['Galaxy Book', 'Galaxy S24', 'Google'])
+        self.assertEqual(self.texts('ga', limit=1), ['Galaxy Book'])
+
+    def test_matches_inner_words(self):
+        self.assertEqual(self.texts('s2'), ['Galaxy S24'])
+        self.assertEqual(self.texts('galaxy s'), ['Galaxy S24'])
+
+    def test_incremental_updates(self):
+        self.index.upsert(self.Suggestion('product', 1, 'Galaxy S24', 100))
+        self.assertEqual(self.texts('g')[0], 'Galaxy S24')
+
+        self.index.upsert(self.Suggestion('product', 4, 'Pixel 9 Pro', 500))
+        self.assertEqual(self.texts('pro'), ['Pixel 9 Pro'])
+
+        self.index.remove('product', 2)
+        self.assertEqual(self.texts('gal'), ['Galaxy S24'])
+
+
+class ProductSuggestionsViewTest(TestCase):
+    def setUp(self):
+        from products.autocomplete import autocomplete_index
+        autocomplete_index.invalidate()
+        self.addCleanup(autocomplete_index.invalidate)
+
+        self.client = APIClient()
+        _, self.shop = create_shop()
+        self.category = Category.objects.create(name='Phones')
+        create_product(self.shop, self.category, 'Phone Case', views=3)
+        self.phone = create_product(self.shop, self.category, 'Phone X', views=40)
+
+    def suggest(self, query):
+        response = self.client.get('/api/products/suggestions/', {'query': query})
+        self.assertEqual(response.status_code, 200)
+        return [s['text'] for s in response.data['suggestions']]
+
+    def test_suggestions_follow_database_changes(self):
+        # The category is weighted by the views of its products
+        self.assertEqual(self.suggest('pho'), ['Phones', 'Phone X', 'Phone Case'])
+
+        self.phone.views = 100
+        self.phone.save(update_fields=['views'])
+        self.assertEqual(self.suggest('pho')[0], 'Phone X')
+
+        self.phone.delete()
+        self.assertEqual(self.suggest('phone x'), [])
+
+    def test_lookup_does_not_touch_database(self):
+        self.suggest('pho')
+        with self.assertNumQueries(0):
+            self.suggest('phone c')
+
+    def test_index_is_rebuilt_after_changes_in_another_process(self):
+        from unittest import mock
+        from products import autocomplete
+        from products.models import CacheVersion
+
+        with mock.patch.object(autocomplete, 'VERSION_CHECK_INTERVAL', 0):
+            self.assertEqual(self.suggest('phone x'), ['Phone X'])
+            # Changes made in this process keep the index current
+            self.phone.name = 'Phone Y'
+            self.phone.save()
+            self.assertEqual(autocomplete.autocomplete_index.version,
+                             CacheVersion.current(autocomplete.VERSION_KEY))
+
+            # Another worker renames the product: only the version row tells
+            Product.objects.filter(pk=self.phone.pk).update(name='Phone Z')
+            CacheVersion.bump(autocomplete.VERSION_KEY)
+            self.assertEqual(self.suggest('phone z'), ['Phone Z'])
+            self.assertEqual(self.suggest('phone y'), [])
+
+
+class ProductFacetedSearchTest(TestCase):
+    def setUp(self):
+        from core.models import SpecificationCategory, Specification, ProductSpecification
+        from products.spec_index import spec_index
+        spec_index.invalidate()
+        self.addCleanup(spec_index.invalidate)
+
+        self.client = APIClient()
+        _, shop = create_shop()
+        self.phones = Category.objects.create(name='Phones')
+        self.tablets = Category.objects.create(name='Tablets')
+        self.samsung = Brand.objects.create(name='Samsung', popularity=50, rating=4)
+        self.apple = Brand.objects.create(name='Apple', popularity=50, rating=4)
+        memory = SpecificationCategory.objects.create(category_name='Memory')
+        self.ram = Specification.objects.create(category=memory, specification_name='RAM')
+
+        rows = [
+            ('Galaxy S24', self.phones, self.samsung, 900, True, '8GB'),
+            ('Galaxy A15', self.phones, self.samsung, 200, True, '4GB'),
+            ('iPhone 15', self.phones, self.apple, 1100, False, '8GB'),
+            ('Galaxy Tab', self.tablets, self.samsung, 450, True, '8GB'),
+        ]
+        for name, category, brand, price, in_stock, ram in rows:
+            product = create_product(shop, category, name, brand=brand, price=price, in_stock=in_stock)
+            ProductSpecification.objects.create(product=product, specification=self.ram, specification_value=ram)
+
+    def facets(self, **params):
+        response = self.client.get('/api/products/search/', {'facets': 'true', **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_counts_without_filters(self):
+        data = self.facets()
+        facets = data['facets']
+        self.assertEqual(len(data['products']), 4)
+        self.assertEqual({c['name']: c['count'] for c in facets['categories']}, {'Phones': 3, 'Tablets': 1})
+        self.assertEqual({b['name']: b['count'] for b in facets['brands']}, {'Samsung': 3, 'Apple': 1})
+        self.assertEqual({p['key']: p['count'] for p in facets['price'] if p['count']},
+                         {'100-250': 1, '250-500': 1, '500-1000': 1, '1000-2500': 1})
+        self.assertEqual(facets['in_stock'], {'true': 3, 'false': 1})
+        self.assertEqual(facets['specifications'][0]['values'],
+                         [{'value': '8GB', 'count': 3}, {'value': '4GB', 'count': 1}])
+
+    def test_facet_ignores_its_own_filter(self):
+        data = self.facets(brand_id=str(self.apple.id), category=str(self.phones.id))
+        self.assertEqual([p['name'] for p in data['products']], ['iPhone 15'])
+        facets = data['facets']
+        # Brand counts are narrowed by category only, category counts by brand only
+        self.assertEqual({b['name']: b['count'] for b in facets['brands']}, {'Samsung': 2, 'Apple': 1})
+        self.assertEqual({c['name']: c['count'] for c in facets['categories']}, {'Phones': 1})
+
+    def test_spec_filter(self):
+        data = self.facets(spec=f'{self.ram.id}:4GB')
+        self.assertEqual([p['name'] for p in data['products']], ['Galaxy A15'])
+        values = data['facets']['specifications'][0]['values']
+        self.assertEqual({v['value']: v['count'] for v in values}, {'8GB': 3, '4GB': 1})
+
+    def test_price_and_stock_filters(self):
+        data = self.facets(price=['250-500', '500-1000'], in_stock='true')
+        self.assertEqual({p['name'] for p in data['products']}, {'Galaxy S24', 'Galaxy Tab'})
+
+    def test_query_count_is_fixed(self):
+        from products.spec_index import get_spec_index
+        get_spec_index()  # built once per process
+        with CaptureQueriesContext(connection) as queries:
+            self.facets(query='galaxy', spec=f'{self.ram.id}:8GB')
+        # search, products, category counts, 4 facets, spec facets (+1 per spec filter)
+        self.assertLessEqual(len(queries), 9)
+
+
+class SpecificationBitmapIndexTest(TestCase):
+    def setUp(self):
+        from products.spec_index import SpecificationBitmapIndex
+        self.index = SpecificationBitmapIndex()
+        self.index.build([
+            ('p1', 'ram', '8GB'), ('p1', 'screen', '6.7'),
+            ('p2', 'ram', '8GB'), ('p2', 'screen', '6.1'),
+            ('p3', 'ram', '16GB'), ('p3', 'screen', '6.7'),
+        ])
+
+    def match(self, filters):
+        return sorted(self.index.product_ids(self.index.match(filters)))
+
+    def test_conjunction_and_disjunction(self):
+        self.assertEqual(self.match({'ram': ['8GB']}), ['p1', 'p2'])
+        self.assertEqual(self.match({'ram': ['8GB'], 'screen': ['6.7']}), ['p1'])
+        self.assertEqual(self.match({'ram': ['8GB', '16GB'], 'screen': ['6.7']}), ['p1', 'p3'])
+        self.assertEqual(self.match({'ram': ['32GB']}), [])
+
+    def test_incremental_updates(self):
+        self.index.replace_product('p1', {'ram': '16GB'})
+        self.assertEqual(self.match({'ram': ['16GB']}), ['p1', 'p3'])
+        self.assertEqual(self.match({'screen': ['6.7']}), ['p3'])
+
+        self.index.set_value('p4', 'ram', '8GB')
+        self.index.remove_product('p2')
+        self.assertEqual(self.match({'ram': ['8GB']}), ['p4'])
+
+    def test_persistence_round_trip(self):
+        import os
+        import tempfile
+        from products.spec_index import SpecificationBitmapIndex
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'specs.idx')
+            self.index.save(path)
+            loaded = SpecificationBitmapIndex()
+            loaded.load(path)
+        self.assertEqual(loaded.product_ids(loaded.match({'screen': ['6.7']})), ['p1', 'p3'])
+
+    def test_index_follows_product_specifications(self):
+        from core.models import SpecificationCategory, Specification, ProductSpecification
+        from products.spec_index import get_spec_index, spec_index
+        spec_index.invalidate()
+        self.addCleanup(spec_index.invalidate)
+
+        _, shop = create_shop()
+        category = Category.objects.create(name='Phones')
+        product = create_product(shop, category, 'Phone')
+        spec = Specification.objects.create(
+            category=SpecificationCategory.objects.create(category_name='Memory'),
+            specification_name='RAM'
+        )
+        row = ProductSpecification.objects.create(product=product, specification=spec, specification_value='8GB')
+
+        index = get_spec_index()
+        self.assertEqual(index.product_ids(index.match({spec.id: ['8GB']})), [product.id])
+        row.specification_value = '12GB'
+        row.save()
+        self.assertEqual(index.product_ids(index.match({spec.id: ['8GB']})), [])
+        row.delete()
+        self.assertEqual(index.product_ids(index.match({spec.id: ['12GB']})), [])
+
+    def test_current_snapshot_is_loaded_instead_of_the_table(self):
+        import io
+        import os
+        import tempfile
+        from unittest import mock
+        from django.core.management import call_command
+        from core.models import SpecificationCategory, Specification, ProductSpecification
+        from products import spec_index as spec_index_module
+        from products.spec_index import get_spec_index, spec_index
+        spec_index.invalidate()
+        self.addCleanup(spec_index.invalidate)
+
+        _, shop = create_shop()
+        product = create_product(shop, Category.objects.create(name='Phones'), 'Phone')
+        spec = Specification.objects.create(
+            category=SpecificationCategory.objects.create(category_name='Memory'),
+            specification_name='RAM'
+        )
+        ProductSpecification.objects.create(product=product, specification=spec, specification_value='8GB')
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'specs.idx')
+            call_command('build_spec_index', output=path, stdout=io.StringIO())
+            with self.settings(SPEC_INDEX_PATH=path):
+                with mock.patch.object(spec_index_module, 'load_rows', side_effect=AssertionError):
+                    index = get_spec_index()
+                self.assertEqual(index.product_ids(index.match({spec.id: ['8GB']})), [product.id])
+
+                # A change after the snapshot makes it outdated: read the table instead
+                ProductSpecification.objects.create(
+                    product=create_product(shop, product.category, 'Tablet'),
+                    specification=spec, specification_value='8GB'
+                )
+                spec_index.invalidate()
+                index = get_spec_index()
+                self.assertEqual(len(index.product_ids(index.match({spec.id: ['8GB']}))), 2)
+
+    def test_index_is_rebuilt_after_changes_in_another_process(self):
+        from unittest import mock
+        from core.models import SpecificationCategory, Specification, ProductSpecification
+        from products import spec_index as spec_index_module
+        from products.models import CacheVersion
+        from products.spec_index import VERSION_KEY, get_spec_index, spec_index
+        spec_index.invalidate()
+        self.addCleanup(spec_index.invalidate)
+
+        _, shop = create_shop()
+        product = create_product(shop, Category.objects.create(name='Phones'), 'Phone')
+        spec = Specification.objects.create(
+            category=SpecificationCategory.objects.create(category_name='Memory'),
+            specification_name='RAM'
+        )
+        row = ProductSpecification.objects.create(product=product, specification=spec, specification_value='8GB')
+
+        with mock.patch.object(spec_index_module, 'VERSION_CHECK_INTERVAL', 0):
+            get_spec_index()
+            # Changes made in this process keep the index current
+            row.specification_value = '12GB'
+            row.save()
+            self.assertEqual(spec_index.version, CacheVersion.current(VERSION_KEY))
+
+            # Another worker changes the value: only the version row tells
+            ProductSpecification.objects.filter(pk=row.pk).update(specification_value='16GB')
+            CacheVersion.bump(VERSION_KEY)
+            index = get_spec_index()
+            self.assertEqual(index.product_ids(index.match({spec.id: ['16GB']})), [product.id])
+            self.assertEqual(index.product_ids(index.match({spec.id: ['12GB']})), [])
+
+
+class NumericSpecificationFilterTest(TestCase):
+    def setUp(self):
+        from core.models import SpecificationCategory, Specification, ProductSpecification
+
+        self.client = APIClient()
+        _, shop = create_shop()
+        category = Category.objects.create(name='Phones')
+        display = SpecificationCategory.objects.create(category_name='Display')
+        self.screen = Specification.objects.create(category=display, specification_name='Screen size')
+        for name, size in [('Mini', '5.4 inch'), ('Regular', '6.1"'), ('Max', '170 mm'), ('Unknown', 'large')]:
+            product = create_product(shop, category, name)
+            ProductSpecification.objects.create(product=product, specification=self.screen, specification_value=size)
+
+    def names(self, **params):
+        response = self.client.get('/api/products/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return [p['name'] for p in response.data['products']]
+
+    def test_values_are_stored_in_base_unit(self):
+        from core.models import ProductSpecification
+        spec = ProductSpecification.objects.get(product__name='Mini')
+        self.assertEqual(spec.unit, 'mm')
+        self.assertAlmostEqual(spec.numeric_value, 137.16)
+
+        spec.specification_value = '5.8 inch'
+        spec.save(update_fields=['specification_value'])
+        spec.refresh_from_db()
+        self.assertAlmostEqual(spec.numeric_value, 147.32)
+
+    def test_range_filter_converts_units(self):
+        self.assertEqual(set(self.names(spec_range=f'{self.screen.id}:6:7:inch')), {'Regular', 'Max'})
+        self.assertEqual(self.names(spec_range=f'{self.screen.id}::150'), ['Mini'])
+
+    def test_sort_by_numeric_spec(self):
+        self.assertEqual(self.names(sort_spec=str(self.screen.id), sort_order='desc'),
+                         ['Max', 'Regular', 'Mini', 'Unknown'])
+
+    def test_invalid_range(self):
+        response = self.client.get('/api/products/search/', {'spec_range': f'{self.screen.id}:1:2:furlong'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ProductSpecificationsBulkSaveTest(TestCase):
+    def setUp(self):
+        from core.models import SpecificationCategory, Specification
+        from products.spec_index import spec_index
+        spec_index.invalidate()
+        self.addCleanup(spec_index.invalidate)
+
+        self.client = APIClient()
+        self.user, shop = create_shop()
+        self.client.force_authenticate(user=self.user)
+        self.product = create_product(shop, Category.objects.create(name='Phones'), 'Phone')
+        group = SpecificationCategory.objects.create(category_name='General')
+        self.specs = [
+            Specification.objects.create(category=group, specification_name=f'Spec {i}')
+            for i in range(60)
+        ]
+        self.url = f'/api/dashboard/products/{self.product.id}/specifications/'
+
+    def save(self, values):
+        payload = {'specifications': [
+            {'specification_id': str(spec.id), 'value': value} for spec, value in values
+        ]}
+        return self.client.post(self.url, payload, format='json')
+
+    def stored(self):
+        from core.models import ProductSpecification
+        return dict(ProductSpecification.objects.filter(product=self.product)
+                    .values_list('specification__specification_name', 'specification_value'))
+
+    def test_upsert_creates_updates_and_deletes(self):
+        self.save([(self.specs[0], '8 GB'), (self.specs[1], '128 GB'), (self.specs[2], 'OLED')])
+        response = self.save([(self.specs[0], '12 GB'), (self.specs[1], '128 GB'), (self.specs[3], '5000 mAh')])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(self.stored(), {'Spec 0': '12 GB', 'Spec 1': '128 GB', 'Spec 3': '5000 mAh'})
+
+        from core.models import ProductSpecification
+        self.assertEqual(ProductSpecification.objects.get(specification=self.specs[0]).numeric_value, 12.0)
+
+    def test_unknown_specifications_are_skipped(self):
+        import uuid
+        payload = {'specifications': [
+            {'specification_id': str(uuid.uuid4()), 'value': 'x'},
+            {'specification_id': 'not-a-uuid', 'value': 'x'},
+            {'specification_id': str(self.specs[0].id), 'value': 'ok'},
+        ]}
+        response = self.client.post(self.url, payload, format='json')
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(self.stored(), {'Spec 0': 'ok'})
+
+    def test_query_count_does_not_grow_with_spec_count(self):
+        from products.spec_index import get_spec_index
+        get_spec_index()
+
+        with CaptureQueriesContext(connection) as few:
+            self.save([(spec, 'a') for spec in self.specs[:5]])
+        self.save([])
+        with CaptureQueriesContext(connection) as many:
+            self.save([(spec, 'a') for spec in self.specs])
+        self.assertEqual(len(few), len(many))
+
+        # Changed values go through a single bulk update
+        with CaptureQueriesContext(connection) as replace:
+            self.save([(spec, 'b') for spec in self.specs[1:]] + [(self.specs[0], 'a')])
+        self.assertLessEqual(len(replace), len(many) + 1)
+
+    def test_bitmap_and_search_indexes_follow_bulk_save(self):
+        from products.spec_index import get_spec_index
+        index = get_spec_index()
+        self.save([(self.specs[0], 'Snapdragon')])
+        self.assertEqual(index.product_ids(index.match({self.specs[0].id: ['Snapdragon']})), [self.product.id])
+
+        response = self.client.get('/api/products/search/', {'query': 'snapdragon'})
+        self.assertEqual([p['name'] for p in response.data['products']], ['Phone'])
+
+
+class SpecificationCatalogTest(TestCase):
+    url = '/api/dashboard/specifications/categories/'
+
+    def setUp(self):
+        from django.core.cache import cache
+        from core.models import SpecificationCategory, Specification
+        cache.clear()
+        self.client = APIClient()
+        self.user, _ = create_shop()
+        self.client.force_authenticate(user=self.user)
+        display = SpecificationCategory.objects.create(category_name='Display')
+        Specification.objects.create(category=display, specification_name='Screen Size')
+        Specification.objects.create(category=display, specification_name='Refresh Rate')
+        SpecificationCategory.objects.create(category_name='Audio')
+
+    def test_catalog_is_one_query_and_cached(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(len([q for q in queries if 'core_specification' in q['sql']]), 1)
+        self.assertEqual(response.data, [
+            {'id': response.data[0]['id'], 'category_name': 'Audio', 'specifications': []},
+            {'id': response.data[1]['id'], 'category_name': 'Display', 'specifications': [
+                {'id': response.data[1]['specifications'][0]['id'], 'specification_name': 'Refresh Rate'},
+                {'id': response.data[1]['specifications'][1]['id'], 'specification_name': 'Screen Size'},
+            ]},
+        ])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        self.assertFalse([q for q in queries if 'core_specification' in q['sql']])
+
+    def test_etag_and_invalidation(self):
+        from core.models import SpecificationCategory, Specification
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        Specification.objects.create(
+            category=SpecificationCategory.objects.get(category_name='Audio'),
+            specification_name='Speakers'
+        )
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data[0]['specifications'][0]['specification_name'], 'Speakers')
+
+    def test_version_bumped_by_another_worker_invalidates(self):
+        from core.models import SpecificationCategory
+        from products.models import CacheVersion
+        from products.spec_catalog import VERSION_KEY
+        etag = self.client.get(self.url)['ETag']
+
+        # Another worker renames the category: only the database version row
+        # is shared with this process, not its cache.
+        SpecificationCategory.objects.filter(category_name='Audio').update(category_name='Sound')
+        CacheVersion.bump(VERSION_KEY)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Sound', [category['category_name'] for category in response.data])
+
+
+class ProductSpecificationsBatchGetTest(TestCase):
+    def setUp(self):
+        from core.models import SpecificationCategory, Specification, ProductSpecification
+        self.client = APIClient()
+        self.user, shop = create_shop()
+        _, other_shop = create_shop('other')
+        self.client.force_authenticate(user=self.user)
+        category = Category.objects.create(name='Phones')
+        display = SpecificationCategory.objects.create(category_name='Display')
+        battery = SpecificationCategory.objects.create(category_name='Battery')
+        specs = [
+            Specification.objects.create(category=display, specification_name='Screen Size'),
+            Specification.objects.create(category=battery, specification_name='Capacity'),
+        ]
+        self.products = [create_product(shop, category, f'Phone {i}') for i in range(6)]
+        self.foreign = create_product(other_shop, category, 'Other Phone')
+        for product in self.products + [self.foreign]:
+            ProductSpecification.objects.create(product=product, specification=specs[0], specification_value='6.1 inch')
+            ProductSpecification.objects.create(product=product, specification=specs[1], specification_value='4000 mAh')
+
+    def test_single_product_is_one_query(self):
+        product = self.products[0]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/dashboard/products/{product.id}/specifications/')
+        spec_queries = [q for q in queries if 'core_productspecification' in q['sql']]
+        self.assertEqual(len(spec_queries), 1)
+        self.assertEqual([(row['category_name'], row['value']) for row in response.data],
+                         [('Battery', '4000 mAh'), ('Display', '6.1 inch')])
+        self.assertEqual(response.data[0]['numeric_value'], 4000.0)
+
+    def test_many_products_in_one_call(self):
+        ids = ','.join(str(p.id) for p in self.products[:2] + [self.foreign])
+        response = self.client.get('/api/dashboard/products/specifications/', {'ids': ids})
+        self.assertEqual(response.status_code, 200)
+        # Another shop's product is left out
+        self.assertEqual(list(response.data), [str(p.id) for p in self.products[:2]])
+        self.assertEqual(len(response.data[str(self.products[0].id)]), 2)
+
+        with CaptureQueriesContext(connection) as few:
+            self.client.get('/api/dashboard/products/specifications/', {'ids': ids})
+        with CaptureQueriesContext(connection) as many:
+            self.client.get('/api/dashboard/products/specifications/',
+                            {'ids': [str(p.id) for p in self.products]})
+        self.assertEqual(len(few), len(many))
+
+    def test_invalid_ids(self):
+        url = '/api/dashboard/products/specifications/'
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url, {'ids': 'nope'}).status_code, 400)
+
+
+class ProductDetailBehaviorLogTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        _, shop = create_shop()
+        self.product = create_product(shop, Category.objects.create(name='Phones'), 'Phone')
+        self.viewer = User.objects.create_user(username='viewer', password='pass')
+        self.client.force_authenticate(user=self.viewer)
+
+    @override_settings(BEHAVIOR_INGESTION={'ASYNC': True})
+    def test_view_is_logged_off_the_request_path(self):
+        from unittest import mock
+        from recommendations.ingestion import behavior_ingestor
+        from recommendations.models import UserBehaviorLog
+
+        with mock.patch.object(behavior_ingestor, 'start'), \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/products/{self.product.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in queries if 'recommendations_userbehaviorlog' in q['sql']])
+        self.assertEqual(behavior_ingestor.pending(), 1)
+
+        behavior_ingestor.flush()
+        log = UserBehaviorLog.objects.get()
+        self.assertEqual((log.user_id, log.product_id, log.action), (self.viewer.id, self.product.id, 'view'))
+        # Detail views are logged only; they do not count as tracked views
+        self.assertEqual(Product.objects.get(pk=self.product.pk).views, 0)
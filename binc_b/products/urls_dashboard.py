@@ -31,5 +31,6 @@ urlpatterns = [
 
     # Specifications management
     path('specifications/categories/', SpecificationCategoryListView.as_view(), name='owner-specification-categories'),
+    path('products/specifications/', ProductSpecificationsView.as_view(), name='owner-products-specifications'),
     path('products/<uuid:product_id>/specifications/', ProductSpecificationsView.as_view(), name='owner-product-specifications'),
 ]
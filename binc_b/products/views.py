@@ -1,13 +1,17 @@
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
+from django.db.models import Q, Case, When
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.views import View
 from django.http import JsonResponse
 
+from core.counters import counters
 from core.models import Product, Category
 from .serializers import ProductListSerializer, ProductDetailSerializer, CategorySerializer
+from .pagination import ProductCursorPagination
+from .search import get_search_backend
+from .facets import build_filters, apply_filters, compute_facets, order_by_spec
 
 
 class ProductListView(APIView):
@@ -26,6 +30,13 @@ class ProductListView(APIView):
             # للمستخدمين غير المسجلين، عرض المنتجات النشطة فقط
             products = Product.objects.filter(is_active=True)
 
+        products = products.select_related('category')
+        paginator = ProductCursorPagination()
+        page = paginator.paginate_queryset(products, request, view=self)
+        if page is not None:
+            serializer = ProductListSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
+
         serializer = ProductListSerializer(products, many=True)
         return Response(serializer.data)
 
@@ -38,6 +49,8 @@ class ProductDetailView(APIView):
         product = get_object_or_404(Product, pk=pk, is_active=True)
         if request.user.is_authenticated:
             product.log_behavior(request.user, 'view')
+        # Include view and like counts not yet flushed to the database
+        counters.apply_pending([product])
         serializer = ProductDetailSerializer(product)
         return Response(serializer.data)
 
@@ -91,7 +104,14 @@ class FeaturedProductsView(APIView):
     permission_classes = [permissions.AllowAny]
 
     def get(self, request):
-        products = Product.objects.filter(is_featured=True, is_active=True)
+        products = Product.objects.filter(is_featured=True, is_active=True).select_related('category')
+
+        paginator = ProductCursorPagination()
+        page = paginator.paginate_queryset(products, request, view=self)
+        if page is not None:
+            serializer = ProductListSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
+
         serializer = ProductListSerializer(products, many=True)
         return Response(serializer.data)
 
@@ -103,19 +123,58 @@ class ProductSearchView(APIView):
     def get(self, request, *args, **kwargs):
         try:
             query = request.GET.get('query', '')
-            category_id = request.GET.get('category', None)
-            brand = request.GET.get('brand', None)
+            with_facets = request.GET.get('facets', '').lower() in ('1', 'true')
 
-            products = Product.objects.filter(is_active=True)
+            products = Product.objects.filter(is_active=True).select_related('category')
+            ranked = False
             if query:
-                products = products.filter(name__icontains=query)
-            if category_id:
-                products = products.filter(category_id=category_id)
-            if brand:
-                products = products.filter(brand__name__icontains=brand)
-
-            serializer = ProductListSerializer(products, many=True)
-            return Response({"products": serializer.data}, status=status.HTTP_200_OK)
+                backend = get_search_backend()
+                if backend is not None:
+                    ranked = True
+                    # Ranked ids from the full-text index, best match first
+                    ranked_ids = backend.search(query)
+                    if ranked_ids:
+                        products = products.filter(id__in=ranked_ids).order_by(
+                            Case(*[When(id=pk, then=pos) for pos, pk in enumerate(ranked_ids)])
+                        )
+                    else:
+                        products = products.none()
+                else:
+                    products = products.filter(name__icontains=query)
+
+            # category, brand, price, in_stock and spec filters
+            filters, spec_filters = build_filters(request.GET)
+            base = products
+            products = apply_filters(base, filters, spec_filters)
+
+            sort_spec = request.GET.get('sort_spec')
+            if sort_spec:
+                descending = request.GET.get('sort_order', 'asc') == 'desc'
+                products = order_by_spec(products, sort_spec, descending)
+
+            paginator = ProductCursorPagination()
+            paginator.results_key = 'products'
+            if ranked:
+                # Keyset order would discard the ranking (and any spec sort);
+                # page by position within the capped ranked ids instead.
+                page = paginator.paginate_ordered(products, request, view=self)
+            elif sort_spec and paginator.is_requested(request):
+                return Response(
+                    {"error": "Cursor pagination does not support sort_spec without a search query."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            else:
+                page = paginator.paginate_queryset(products, request, view=self)
+            if page is not None:
+                serializer = ProductListSerializer(page, many=True)
+                response = paginator.get_paginated_response(serializer.data)
+            else:
+                serializer = ProductListSerializer(products, many=True)
+                response = Response({"products": serializer.data}, status=status.HTTP_200_OK)
+
+            if with_facets:
+                response.data['facets'] = compute_facets(base, filters, spec_filters)
+            return response
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -2,6 +2,7 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
+from core.counters import counters
 from core.models import Brand
 from .serializers import BrandSerializer
 
@@ -68,6 +69,7 @@ class BrandDetailView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
 
+        counters.apply_pending([brand])
         serializer = BrandSerializer(brand)
         return Response(serializer.data)
 
@@ -13,6 +13,7 @@ from .serializers import (
     ProductDetailSerializer,
     DashboardStatsSerializer
 )
+from .pagination import ProductCursorPagination
 
 class DashboardStatsView(APIView):
     """Get dashboard statistics for the authenticated owner."""
@@ -85,7 +86,7 @@ class OwnerProductsView(APIView):
             )
 
         # الحصول على منتجات المتجر
-        products = Product.objects.filter(shop=shop)
+        products = Product.objects.filter(shop=shop).select_related('category')
 
         # تطبيق التصفية إذا تم توفيرها
         category = request.query_params.get('category')
@@ -110,6 +111,20 @@ class OwnerProductsView(APIView):
         sort_by = request.query_params.get('sort_by', 'created_at')
         sort_order = request.query_params.get('sort_order', 'desc')
 
+        # التصفح بالمؤشر يعتمد على الترتيب حسب تاريخ الإنشاء فقط
+        paginator = ProductCursorPagination()
+        if paginator.is_requested(request):
+            if sort_by != 'created_at':
+                return Response(
+                    {"error": "Cursor pagination only supports sort_by=created_at."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            page = paginator.paginate_queryset(
+                products, request, view=self, descending=(sort_order == 'desc')
+            )
+            serializer = ProductListSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
+
         if sort_order == 'desc':
             sort_by = f'-{sort_by}'
 
@@ -3,7 +3,7 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny
 from core.models import Category
-from .serializers import CategorySerializer
+from .serializers import CategorySerializer, category_product_counts
 
 class PublicCategoriesView(APIView):
     """
@@ -16,8 +16,11 @@ class PublicCategoriesView(APIView):
         Get all categories.
         """
         try:
-            categories = Category.objects.all()
-            serializer = CategorySerializer(categories, many=True)
+            categories = list(Category.objects.all())
+            counts = category_product_counts([category.pk for category in categories])
+            serializer = CategorySerializer(
+                categories, many=True, context={'category_product_counts': counts}
+            )
             return Response(serializer.data)
         except Exception as e:
             return Response(
@@ -1,9 +1,15 @@
+import uuid
+
+from django.db import transaction
+from django.utils.http import parse_etags
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
-from core.models import SpecificationCategory, Specification, ProductSpecification, Product
+from core.models import Specification, ProductSpecification, Product
 from .serializers import SpecificationCategorySerializer, SpecificationSerializer, ProductSpecificationSerializer
+from .spec_catalog import get_catalog
+from .signals import refresh_product_indexes, specification_signals_suspended
 
 class SpecificationCategoryListView(APIView):
     """
@@ -20,42 +26,35 @@ class SpecificationCategoryListView(APIView):
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        categories = SpecificationCategory.objects.all()
-        result = []
-
-        for category in categories:
-            category_data = {
-                'id': str(category.id),
-                'category_name': category.category_name,
-                'specifications': []
-            }
-
-            specifications = Specification.objects.filter(category=category)
-            for spec in specifications:
-                category_data['specifications'].append({
-                    'id': str(spec.id),
-                    'specification_name': spec.specification_name
-                })
-
-            result.append(category_data)
-
-        return Response(result)
+        # El catálogo se sirve desde caché; el ETag evita reenviarlo si no cambió
+        etag, catalog = get_catalog()
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(catalog)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
 
 class ProductSpecificationsView(APIView):
     """
     API view for managing product specifications.
     """
     permission_classes = [IsAuthenticated]
+    # Límite de productos por petición con ?ids=
+    max_products = 50
 
     def get_product(self, product_id):
         """Get product object."""
         try:
-            return Product.objects.get(id=product_id)
+            return Product.objects.select_related(
+                'shop__owner__user', 'brand', 'category'
+            ).get(id=product_id)
         except Product.DoesNotExist:
             return None
 
-    def get(self, request, product_id):
-        """Get specifications for a product."""
+    def get(self, request, product_id=None):
+        """Get specifications for a product, or for several products with ?ids=."""
         # Verificar si el usuario es propietario o administrador
         if request.user.user_type not in ['owner', 'admin']:
             return Response(
@@ -63,6 +62,9 @@ class ProductSpecificationsView(APIView):
                 status=status.HTTP_403_FORBIDDEN
             )
 
+        if product_id is None:
+            return self.get_many(request)
+
         product = self.get_product(product_id)
         if not product:
             return Response(
@@ -77,22 +79,77 @@ class ProductSpecificationsView(APIView):
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        product_specs = ProductSpecification.objects.filter(product=product)
-        result = []
+        product_specs = self.spec_rows(ProductSpecification.objects.filter(product=product))
+        return Response([self.spec_data(spec) for spec in product_specs])
 
+    def get_many(self, request):
+        """Get the specifications of every product in ?ids= with a single query."""
+        raw_ids = []
+        for value in request.query_params.getlist('ids'):
+            raw_ids.extend(part for part in value.split(',') if part.strip())
+        try:
+            product_ids = list(dict.fromkeys(uuid.UUID(part.strip()) for part in raw_ids))
+        except ValueError:
+            return Response(
+                {"error": "Invalid product id."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not product_ids:
+            return Response(
+                {"error": "No product ids provided."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(product_ids) > self.max_products:
+            return Response(
+                {"error": f"At most {self.max_products} products can be requested at once."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        products = Product.objects.filter(id__in=product_ids)
+        # Un propietario solo puede ver sus propios productos
+        if request.user.user_type == 'owner':
+            products = products.filter(shop__owner__user=request.user)
+
+        # Los productos inexistentes o ajenos se omiten de la respuesta
+        result = {}
+        visible = set(products.values_list('id', flat=True))
+        for pk in product_ids:
+            if pk in visible:
+                result[str(pk)] = []
+
+        product_specs = self.spec_rows(
+            ProductSpecification.objects.filter(product_id__in=visible)
+        )
         for spec in product_specs:
-            result.append({
-                'specification_id': str(spec.specification.id),
-                'specification_name': spec.specification.specification_name,
-                'category_id': str(spec.specification.category.id),
-                'category_name': spec.specification.category.category_name,
-                'value': spec.specification_value
-            })
+            result[str(spec.product_id)].append(self.spec_data(spec))
 
         return Response(result)
 
-    def post(self, request, product_id):
+    @staticmethod
+    def spec_rows(queryset):
+        """Specifications with their specification and category joined in."""
+        return queryset.select_related('specification__category').order_by(
+            'specification__category__category_name', 'specification__specification_name'
+        )
+
+    @staticmethod
+    def spec_data(spec):
+        specification = spec.specification
+        return {
+            'specification_id': str(specification.id),
+            'specification_name': specification.specification_name,
+            'category_id': str(specification.category_id),
+            'category_name': specification.category.category_name,
+            'value': spec.specification_value,
+            'numeric_value': spec.numeric_value,
+            'unit': spec.unit
+        }
+
+    def post(self, request, product_id=None):
         """Save specifications for a product."""
+        if product_id is None:
+            return self.http_method_not_allowed(request)
+
         # Verificar si el usuario es propietario o administrador
         if request.user.user_type not in ['owner', 'admin']:
             return Response(
@@ -121,11 +178,8 @@ class ProductSpecificationsView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Eliminar especificaciones existentes
-        ProductSpecification.objects.filter(product=product).delete()
-
-        # Crear nuevas especificaciones
-        created_specs = []
+        # Resolver todas las especificaciones en una sola consulta
+        incoming = {}
         for spec_data in specifications:
             spec_id = spec_data.get('specification_id')
             value = spec_data.get('value')
@@ -134,20 +188,57 @@ class ProductSpecificationsView(APIView):
                 continue
 
             try:
-                specification = Specification.objects.get(id=spec_id)
-                product_spec = ProductSpecification.objects.create(
+                incoming[uuid.UUID(str(spec_id))] = str(value)
+            except ValueError:
+                pass
+
+        spec_objects = Specification.objects.select_related('category').in_bulk(list(incoming))
+        incoming = {spec_id: value for spec_id, value in incoming.items() if spec_id in spec_objects}
+
+        existing = {
+            product_spec.specification_id: product_spec
+            for product_spec in ProductSpecification.objects.filter(product=product)
+        }
+
+        to_create = []
+        to_update = []
+        for spec_id, value in incoming.items():
+            product_spec = existing.get(spec_id)
+            if product_spec is None:
+                product_spec = ProductSpecification(
                     product=product,
-                    specification=specification,
+                    specification=spec_objects[spec_id],
                     specification_value=value
                 )
-                created_specs.append({
-                    'specification_id': str(specification.id),
-                    'specification_name': specification.specification_name,
-                    'category_id': str(specification.category.id),
-                    'category_name': specification.category.category_name,
-                    'value': value
-                })
-            except Specification.DoesNotExist:
-                pass
+                product_spec.parse_value()
+                to_create.append(product_spec)
+            elif product_spec.specification_value != value:
+                product_spec.specification_value = value
+                product_spec.parse_value()
+                to_update.append(product_spec)
+        to_delete = [product_spec.pk for spec_id, product_spec in existing.items() if spec_id not in incoming]
+
+        # Las operaciones masivas no emiten señales, así que los índices se actualizan aquí
+        with transaction.atomic(), specification_signals_suspended():
+            if to_delete:
+                ProductSpecification.objects.filter(pk__in=to_delete).delete()
+            if to_create:
+                ProductSpecification.objects.bulk_create(to_create)
+            if to_update:
+                ProductSpecification.objects.bulk_update(
+                    to_update, ['specification_value', 'numeric_value', 'unit']
+                )
+            refresh_product_indexes(product, incoming)
+
+        created_specs = []
+        for spec_id, value in incoming.items():
+            specification = spec_objects[spec_id]
+            created_specs.append({
+                'specification_id': str(specification.id),
+                'specification_name': specification.specification_name,
+                'category_id': str(specification.category.id),
+                'category_name': specification.category.category_name,
+                'value': value
+            })
 
         return Response(created_specs, status=status.HTTP_201_CREATED)
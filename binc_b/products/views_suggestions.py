@@ -0,0 +1,29 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import AllowAny
+from .autocomplete import get_autocomplete_index, MAX_SUGGESTIONS
+
+class ProductSuggestionsView(APIView):
+    """
+    API view for search-as-you-type suggestions.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        """
+        Get product, brand and category names starting with the typed prefix.
+        """
+        query = request.query_params.get('query', '')
+        try:
+            limit = int(request.query_params.get('limit', MAX_SUGGESTIONS))
+        except ValueError:
+            limit = MAX_SUGGESTIONS
+        limit = max(1, min(limit, MAX_SUGGESTIONS))
+
+        suggestions = get_autocomplete_index().suggest(query, limit=limit)
+        return Response({
+            "suggestions": [
+                {"type": s.kind, "id": str(s.id), "text": s.text}
+                for s in suggestions
+            ]
+        })
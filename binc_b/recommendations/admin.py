@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import UserBehaviorLog
+from .models import UserBehaviorLog, UserBehaviorDaily, UserRecommendationSet
 
 # Register your models here.
 admin.site.register(UserBehaviorLog)
+admin.site.register(UserBehaviorDaily)
+admin.site.register(UserRecommendationSet)
@@ -2,49 +2,29 @@
 AI Services for Recommendations System
 This module provides advanced AI-based recommendation services.
 """
-import numpy as np
-import pandas as pd
+import hashlib
 import logging
-from django.conf import settings
 import os
-import pickle
-
-# Optional imports with fallbacks
-try:
-    from sklearn.feature_extraction.text import TfidfVectorizer
-    from sklearn.metrics.pairwise import cosine_similarity
-    from sklearn.preprocessing import MinMaxScaler
-    from scipy.sparse import csr_matrix, vstack
-    SKLEARN_AVAILABLE = True
-except ImportError:
-    logger.warning("scikit-learn not available. Some recommendation features will be limited.")
-    SKLEARN_AVAILABLE = False
-
-try:
-    from implicit.als import AlternatingLeastSquares
-    IMPLICIT_AVAILABLE = True
-except ImportError:
-    logger.warning("implicit library not available. Collaborative filtering will be limited.")
-    IMPLICIT_AVAILABLE = False
-
-try:
-    import nltk
-    from nltk.sentiment.vader import SentimentIntensityAnalyzer
-    NLTK_AVAILABLE = True
-    # Initialize NLTK resources
-    try:
-        nltk.data.find('vader_lexicon')
-    except LookupError:
-        try:
-            nltk.download('vader_lexicon')
-        except Exception as e:
-            logger.warning(f"Could not download NLTK resources: {e}")
-            NLTK_AVAILABLE = False
-except ImportError:
-    logger.warning("NLTK not available. Sentiment analysis will be disabled.")
-    NLTK_AVAILABLE = False
+import threading
+import time
+import uuid
+
+import numpy as np
+from django.conf import settings
+
+from . import ann, caching, model_store
+from .ann import ann_setting
+from .model_store import ModelState, product_key
+
+logger = logging.getLogger(__name__)
+
+# scikit-learn, scipy, implicit and NLTK are optional and heavy. They are
+# imported inside the methods that need them, so a worker that never serves
+# a recommendation never imports them at all.
 
 
+# Interactions (most recent first) used to fold in a user missing from the model
+FOLD_IN_MAX_INTERACTIONS = 500
 
 # Path for model persistence
 MODEL_DIR = os.path.join(settings.BASE_DIR, 'recommendations', 'models')
@@ -54,56 +34,91 @@ class AIRecommendationService:
     """
     Advanced AI-based recommendation service that combines collaborative filtering,
     content-based filtering, and sentiment analysis.
+
+    Models are trained offline (manage.py train_recommenders) and published
+    as versions under MODEL_DIR; the service only loads the published version.
+    The loaded arrays are memory maps, so every worker process on a host
+    shares one page-cached copy, and a newly published version is swapped
+    in by replacing `self.state` without restarting the worker.
     """
 
-    def __init__(self):
+    def __init__(self, model_dir=MODEL_DIR, autoload=True):
+        self.model_dir = model_dir
+        self.state = ModelState()
         self.als_model = None
-        self.tfidf_vectorizer = None
-
-        # Initialize sentiment analyzer if NLTK is available
-        if NLTK_AVAILABLE:
-            try:
-                self.sentiment_analyzer = SentimentIntensityAnalyzer()
-            except Exception as e:
-                logger.warning(f"Could not initialize SentimentIntensityAnalyzer: {e}")
-                self.sentiment_analyzer = None
-        else:
-            self.sentiment_analyzer = None
-
-        self.load_models()
+        self._pointer_mtime = None
+        self._checked_at = 0.0
+        self._reload_lock = threading.Lock()
+        self._sentiment_analyzer = None
+        self._sentiment_checked = False
+
+        if autoload:
+            self.load_models()
+
+    def __getattr__(self, name):
+        # Model arrays read through the current state (service.item_factors, ...)
+        if name in ModelState.FIELDS:
+            return getattr(self.state, name)
+        raise AttributeError(name)
+
+    @property
+    def sentiment_analyzer(self):
+        """VADER analyzer, created on first use; None if NLTK is unavailable."""
+        if not self._sentiment_checked:
+            self._sentiment_analyzer = load_sentiment_analyzer()
+            self._sentiment_checked = True
+        return self._sentiment_analyzer
+
+    @property
+    def version(self):
+        return self.state.version
+
+    @property
+    def is_ready(self):
+        """True once a published model has been loaded."""
+        return self.state.version is not None
 
     def load_models(self):
-        """Load pre-trained models if they exist."""
+        """Load the published models, if any. Returns True if a version was loaded."""
         try:
-            als_path = os.path.join(MODEL_DIR, 'als_model.pkl')
-            tfidf_path = os.path.join(MODEL_DIR, 'tfidf_vectorizer.pkl')
-
-            if os.path.exists(als_path):
-                with open(als_path, 'rb') as f:
-                    self.als_model = pickle.load(f)
-                logger.info("Loaded ALS model from disk")
-
-            if os.path.exists(tfidf_path):
-                with open(tfidf_path, 'rb') as f:
-                    self.tfidf_vectorizer = pickle.load(f)
-                logger.info("Loaded TF-IDF vectorizer from disk")
+            self._pointer_mtime = model_store.pointer_mtime(self.model_dir)
+            version = model_store.current_version(self.model_dir)
+            if version is None:
+                return False
+            if version == self.state.version:
+                return True
+            state = ModelState.load(model_store.version_path(self.model_dir, version), version)
+            # Swap in one assignment; requests holding the old state finish on it
+            self.state = state
+            logger.info(f"Loaded recommendation models version {version}")
+            return True
         except Exception as e:
             logger.error(f"Error loading models: {e}")
+            return False
 
-    def save_models(self):
-        """Save trained models to disk."""
+    def refresh(self):
+        """Reload if a new version was published since the last check."""
+        now = time.monotonic()
+        if now - self._checked_at < getattr(settings, 'RECOMMENDER_REFRESH_INTERVAL', 30):
+            return self.is_ready
+        # One thread per worker checks; the others keep serving the current state
+        if not self._reload_lock.acquire(blocking=False):
+            return self.is_ready
         try:
-            if self.als_model:
-                with open(os.path.join(MODEL_DIR, 'als_model.pkl'), 'wb') as f:
-                    pickle.dump(self.als_model, f)
-
-            if self.tfidf_vectorizer:
-                with open(os.path.join(MODEL_DIR, 'tfidf_vectorizer.pkl'), 'wb') as f:
-                    pickle.dump(self.tfidf_vectorizer, f)
-
-            logger.info("Models saved to disk")
-        except Exception as e:
-            logger.error(f"Error saving models: {e}")
+            self._checked_at = now
+            if model_store.pointer_mtime(self.model_dir) != self._pointer_mtime:
+                self.load_models()
+        finally:
+            self._reload_lock.release()
+        return self.is_ready
+
+    def save_models(self, directory):
+        """Write the complete model state into `directory` as a bundle."""
+        state = self.state
+        if state.has_collaborative:
+            state = state.replace(meta={**state.meta, 'factors': int(state.item_factors.shape[1])})
+        state.save(directory)
+        logger.info(f"Models saved to {directory}")
 
     def train_collaborative_filtering(self, user_item_interactions):
         """
@@ -113,51 +128,43 @@ class AIRecommendationService:
             user_item_interactions: DataFrame with columns [user_id, product_id, score]
         """
         # Check if implicit library is available
-        if not IMPLICIT_AVAILABLE:
+        try:
+            from implicit.als import AlternatingLeastSquares
+        except ImportError:
             logger.warning("Cannot train collaborative filtering model: implicit library not available")
             return False
 
         try:
             # Create user-item matrix
-            user_ids = user_item_interactions['user_id'].values
-            product_ids = user_item_interactions['product_id'].values
-            scores = user_item_interactions['score'].values
-
-            # Get unique IDs for mapping
-            unique_users = np.unique(user_ids)
-            unique_products = np.unique(product_ids)
-
-            # Create mappings
-            user_to_idx = {user: idx for idx, user in enumerate(unique_users)}
-            product_to_idx = {product: idx for idx, product in enumerate(unique_products)}
-
-            # Map IDs to indices
-            user_indices = np.array([user_to_idx[user] for user in user_ids])
-            product_indices = np.array([product_to_idx[product] for product in product_ids])
-
-            # Create sparse matrix
-            user_item_matrix = csr_matrix(
-                (scores, (user_indices, product_indices)),
-                shape=(len(unique_users), len(unique_products))
-            )
+            unique_users, unique_products, user_item_matrix = build_interaction_matrix(user_item_interactions)
 
             # Train ALS model
+            regularization = 0.01
             self.als_model = AlternatingLeastSquares(
                 factors=100,  # Increased from 50 for better representation
-                regularization=0.01,
+                regularization=regularization,
                 iterations=20,  # Increased from 15 for better convergence
                 calculate_training_loss=True
             )
-            self.als_model.fit(user_item_matrix)
-
-            # Save mappings as attributes
-            self.user_to_idx = user_to_idx
-            self.product_to_idx = product_to_idx
-            self.idx_to_product = {idx: product for product, idx in product_to_idx.items()}
-            self.user_item_matrix = user_item_matrix
-
-            # Save model
-            self.save_models()
+            self.als_model.fit(user_item_matrix, show_progress=False)
+
+            # Approximate search index over the item factors
+            item_factors = np.asarray(self.als_model.item_factors, dtype=np.float32)
+            centroids, offsets, items = ann.build_ivf(item_factors, n_lists=ann_setting('LISTS'))
+
+            # Keep the state needed to serve recommendations
+            self.state = self.state.replace(
+                user_ids=unique_users,
+                product_ids=unique_products,
+                user_factors=np.asarray(self.als_model.user_factors, dtype=np.float32),
+                item_factors=item_factors,
+                item_gramian=item_factors.T.astype(np.float64) @ item_factors,
+                user_item_matrix=user_item_matrix,
+                ann_centroids=centroids,
+                ann_offsets=offsets,
+                ann_items=items,
+                meta={**self.state.meta, 'regularization': regularization},
+            )
 
             logger.info("Collaborative filtering model trained successfully")
             return True
@@ -173,32 +180,47 @@ class AIRecommendationService:
             products_data: DataFrame with columns [id, name, description, category, brand, specifications]
         """
         # Check if scikit-learn is available
-        if not SKLEARN_AVAILABLE:
+        try:
+            from sklearn.feature_extraction.text import TfidfVectorizer
+            from . import similarity
+        except ImportError:
             logger.warning("Cannot train content-based filtering model: scikit-learn not available")
             return False
 
         try:
+            # Rows sorted by product id, so content_product_ids is a sorted lookup array
+            products_data = products_data.assign(
+                key=[product_key(p) for p in products_data['id'].values]
+            ).sort_values('key').reset_index(drop=True)
+
             # Prepare text data by combining relevant features
-            products_data['content'] = products_data.apply(
-                lambda row: f"{row['name']} {row['description']} {row['category']} {row['brand']} {row.get('specifications', '')}",
-                axis=1
-            )
+            products_data['content'] = product_content(products_data)
 
             # Create TF-IDF vectorizer
-            self.tfidf_vectorizer = TfidfVectorizer(
+            tfidf_vectorizer = TfidfVectorizer(
                 max_features=5000,
                 stop_words='english',
                 ngram_range=(1, 2)
             )
 
             # Fit and transform the data
-            self.content_features = self.tfidf_vectorizer.fit_transform(products_data['content'])
+            content_features = tfidf_vectorizer.fit_transform(products_data['content'])
 
-            # Save product IDs mapping
-            self.content_product_ids = products_data['id'].values
+            # Precompute every product's most similar products
+            neighbors, neighbor_scores = similarity.build_neighbors(
+                content_features,
+                k=getattr(settings, 'RECOMMENDER_CONTENT_NEIGHBORS', similarity.DEFAULT_NEIGHBORS)
+            )
 
-            # Save model
-            self.save_models()
+            # Save product IDs mapping
+            self.state = self.state.replace(
+                tfidf_vectorizer=tfidf_vectorizer,
+                content_features=content_features,
+                content_digests=content_digests(products_data['content']),
+                content_neighbors=neighbors,
+                content_neighbor_scores=neighbor_scores,
+                content_product_ids=np.array(products_data['key'].tolist(), dtype='U32'),
+            )
 
             logger.info("Content-based filtering model trained successfully")
             return True
@@ -206,6 +228,87 @@ class AIRecommendationService:
             logger.error(f"Error training content-based filtering model: {e}")
             return False
 
+    def update_content_based_filtering(self, products_data):
+        """
+        Bring the content-based model up to date with the catalog without
+        refitting the vectorizer: new and edited products are transformed
+        with the trained vocabulary and IDF weights, deleted ones dropped,
+        and only the neighbor rows they affect are recomputed. Words the
+        vocabulary does not know are ignored until the next full training.
+
+        Args:
+            products_data: DataFrame of the whole catalog, as for training
+
+        Returns:
+            Number of new, edited and deleted products, or None when there
+            is no trained content model to update
+        """
+        try:
+            from scipy.sparse import vstack
+            from . import similarity
+        except ImportError:
+            logger.warning("Cannot update content-based filtering model: scikit-learn not available")
+            return None
+
+        state = self.state
+        if not state.has_content or state.content_digests is None or state.content_neighbors is None:
+            return None
+
+        try:
+            products_data = products_data.assign(
+                key=[product_key(p) for p in products_data['id'].values]
+            ).sort_values('key').reset_index(drop=True)
+            keys = np.array(products_data['key'].tolist(), dtype='U32')
+            texts = product_content(products_data)
+            digests = content_digests(texts)
+
+            # Previous row of every current product, if it had one
+            old_ids = state.content_product_ids
+            old_rows = np.minimum(np.searchsorted(old_ids, keys), max(len(old_ids) - 1, 0))
+            existed = old_ids[old_rows] == keys if len(old_ids) else np.zeros(len(keys), dtype=bool)
+            unchanged = existed & (state.content_digests[old_rows] == digests)
+            changed = np.flatnonzero(~unchanged)
+            deleted = ~np.isin(old_ids, keys)
+            if not len(changed) and not deleted.any():
+                return 0
+
+            # Unchanged rows are reused as they are; the rest are transformed
+            stacked = vstack([
+                state.content_features[old_rows[unchanged]],
+                state.tfidf_vectorizer.transform(texts.iloc[changed]),
+            ]).tocsr()
+            position = np.empty(len(keys), dtype=np.int64)
+            position[unchanged] = np.arange(unchanged.sum())
+            position[changed] = unchanged.sum() + np.arange(len(changed))
+            features = stacked[position]
+
+            # Renumber the neighbor table to the new rows; a neighbor that was
+            # deleted leaves its row short, so that row is recomputed
+            new_row = np.full(len(old_ids) + 1, -1, dtype=np.int32)
+            new_row[old_rows[existed]] = np.flatnonzero(existed)
+            neighbors = np.full((len(keys), state.content_neighbors.shape[1]), -1, dtype=np.int32)
+            scores = np.zeros(neighbors.shape, dtype=np.float32)
+            neighbors[existed] = new_row[state.content_neighbors[old_rows[existed]]]
+            scores[existed] = state.content_neighbor_scores[old_rows[existed]]
+            lost = ((neighbors < 0) & (state.content_neighbors[old_rows] >= 0)).any(axis=1) & existed
+            neighbors, scores = similarity.update_neighbors(
+                features, neighbors, scores, changed, stale=np.flatnonzero(lost)
+            )
+
+            self.state = self.state.replace(
+                content_product_ids=keys,
+                content_features=features,
+                content_digests=digests,
+                content_neighbors=neighbors,
+                content_neighbor_scores=scores,
+            )
+            logger.info(f"Content-based model updated for {len(changed)} changed and "
+                        f"{int(deleted.sum())} deleted products")
+            return len(changed) + int(deleted.sum())
+        except Exception as e:
+            logger.error(f"Error updating content-based filtering model: {e}")
+            return None
+
     def analyze_sentiment(self, reviews_data):
         """
         Analyze sentiment in product reviews.
@@ -218,7 +321,7 @@ class AIRecommendationService:
         """
         try:
             # Check if sentiment analyzer is available
-            if not self.sentiment_analyzer or not NLTK_AVAILABLE:
+            if not self.sentiment_analyzer:
                 # Fallback: use rating as sentiment
                 reviews_data['sentiment_score'] = reviews_data['rating'].apply(lambda r: (r - 3) / 2)  # Scale to -1 to 1
                 reviews_data['sentiment'] = reviews_data['rating'].apply(
@@ -258,37 +361,85 @@ class AIRecommendationService:
             except:
                 return reviews_data
 
-    def get_collaborative_recommendations(self, user_id, n=10):
+    def get_collaborative_recommendations(self, user_id, n=10, exact=None):
         """
         Get collaborative filtering recommendations for a user.
 
         Args:
             user_id: The user ID
             n: Number of recommendations to return
+            exact: Score every product (True) or search the ANN index (False);
+                None picks by catalog size and the RECOMMENDER_ANN setting
 
         Returns:
             List of recommended product IDs
         """
         try:
-            if not self.als_model or user_id not in self.user_to_idx:
+            state = self.state
+            if not state.has_collaborative:
                 return []
 
-            user_idx = self.user_to_idx[user_id]
-            user_vector = self.user_item_matrix[user_idx]
+            # Products the user already has are never recommended
+            query, liked = self.user_vector(state, user_id)
+            if query is None:
+                return []
 
-            # Get recommendations
-            recommendations = self.als_model.recommend(
-                user_idx, user_vector, N=n, filter_already_liked_items=True
-            )
+            if exact is None:
+                exact = not (ann_setting('ENABLED') and len(state.product_ids) >= ann_setting('MIN_ITEMS'))
+            top = None
+            if not exact and state.has_ann:
+                top = ann.ivf_search(state.item_factors, state.ann_centroids, state.ann_offsets,
+                                     state.ann_items, query, n, ann_setting('PROBES'), exclude=liked)
+            if top is None or len(top) < n:
+                # Too few candidates in the probed lists
+                top = ann.exact_search(state.item_factors, query, n, exclude=liked)
 
             # Convert back to product IDs
-            recommended_products = [self.idx_to_product[idx] for idx, _ in recommendations]
-
-            return recommended_products
+            return [uuid.UUID(state.product_ids[idx]) for idx in top]
         except Exception as e:
             logger.error(f"Error getting collaborative recommendations: {e}")
             return []
 
+    def user_vector(self, state, user_id):
+        """
+        A user's latent vector and the rows of the products they interacted
+        with, or (None, None). Users the model was trained on read their
+        factors; anyone else (a new user, or one whose first interactions
+        came after training) is folded in against the fixed item factors.
+        """
+        user_idx = state.user_index(user_id)
+        if user_idx is not None:
+            matrix = state.user_item_matrix
+            return state.user_factors[user_idx], matrix.indices[matrix.indptr[user_idx]:matrix.indptr[user_idx + 1]]
+        if state.item_gramian is None:
+            return None, None
+
+        version = caching.user_version(user_id, state.version)
+        cached = caching.get_fold_in(user_id, version)
+        if cached is not None:
+            return cached
+
+        from .models import ProductRecommendation
+
+        interactions = ProductRecommendation.objects.filter(user_id=user_id).order_by('-created_at')
+        interactions = list(interactions.values_list('product_id', 'score')[:FOLD_IN_MAX_INTERACTIONS])
+        if not interactions:
+            return None, None
+        keys = np.array([product_key(product_id) for product_id, _ in interactions], dtype='U32')
+        scores = np.array([score for _, score in interactions], dtype=np.float64)
+
+        # Products published after training have no factors and are skipped
+        rows = np.minimum(np.searchsorted(state.product_ids, keys), len(state.product_ids) - 1)
+        known = state.product_ids[rows] == keys
+        if not known.any():
+            return None, None
+        items, scores = rows[known].astype(np.int32), scores[known]
+
+        vector = fold_in(state.item_factors, state.item_gramian, items, scores,
+                         state.meta.get('regularization', 0.01))
+        caching.set_fold_in(user_id, version, vector, items)
+        return vector, items
+
     def get_content_based_recommendations(self, product_id, n=10):
         """
         Get content-based recommendations similar to a product.
@@ -301,34 +452,49 @@ class AIRecommendationService:
             List of recommended product IDs
         """
         try:
-            if not self.tfidf_vectorizer:
+            state = self.state
+            if not state.has_content:
                 return []
 
             # Find the index of the product
-            product_idx = np.where(self.content_product_ids == product_id)[0]
-            if len(product_idx) == 0:
+            product_idx = state.content_index(product_id)
+            if product_idx is None:
                 return []
 
-            product_idx = product_idx[0]
-
-            # Get the product's feature vector
-            product_vector = self.content_features[product_idx]
-
-            # Calculate similarity with all products
-            similarities = cosine_similarity(product_vector, self.content_features).flatten()
-
-            # Get top similar products (excluding the product itself)
-            similar_indices = similarities.argsort()[::-1][1:n+1]
+            neighbors = state.content_neighbors
+            if neighbors is not None and n <= neighbors.shape[1]:
+                # Precomputed at training time, most similar first
+                similar_indices = neighbors[product_idx][:n]
+                similar_indices = similar_indices[similar_indices >= 0]
+            else:
+                # Older models without a neighbor table, or more than K wanted
+                similar_indices = self._similar_content(state, product_idx, n)
 
             # Convert to product IDs
-            similar_products = [self.content_product_ids[idx] for idx in similar_indices]
+            similar_products = [uuid.UUID(state.content_product_ids[idx]) for idx in similar_indices]
 
             return similar_products
         except Exception as e:
             logger.error(f"Error getting content-based recommendations: {e}")
             return []
 
-    def get_hybrid_recommendations(self, user_id, user_viewed_products=None, n=10):
+    @staticmethod
+    def _similar_content(state, product_idx, n):
+        from sklearn.metrics.pairwise import cosine_similarity
+
+        # Calculate similarity with all products
+        similarities = cosine_similarity(state.content_features[product_idx], state.content_features).flatten()
+
+        # Exclude the product itself, which need not sort first when other
+        # products tie with it
+        similarities[product_idx] = -np.inf
+        n = min(n, len(similarities) - 1)
+        if n <= 0:
+            return []
+        top = np.argpartition(-similarities, n - 1)[:n]
+        return top[np.argsort(-similarities[top], kind='stable')]
+
+    def get_hybrid_recommendations(self, user_id, user_viewed_products=None, n=10, cf_recommendations=None):
         """
         Get hybrid recommendations combining collaborative and content-based filtering.
 
@@ -336,13 +502,16 @@ class AIRecommendationService:
             user_id: The user ID
             user_viewed_products: List of products the user has viewed
             n: Number of recommendations to return
+            cf_recommendations: The user's top `n` collaborative recommendations,
+                when already computed (batch precomputation)
 
         Returns:
             List of recommended product IDs
         """
         try:
             # Get collaborative filtering recommendations
-            cf_recommendations = self.get_collaborative_recommendations(user_id, n=n)
+            if cf_recommendations is None:
+                cf_recommendations = self.get_collaborative_recommendations(user_id, n=n)
 
             # If user has viewed products, get content-based recommendations
             cb_recommendations = []
@@ -371,7 +540,7 @@ class AIRecommendationService:
             logger.error(f"Error getting hybrid recommendations: {e}")
             return []
 
-    def get_personalized_recommendations(self, user_id, user_data=None, n=20):
+    def get_personalized_recommendations(self, user_id, user_data=None, n=20, cf_recommendations=None):
         """
         Get comprehensive personalized recommendations for a user.
 
@@ -379,6 +548,7 @@ class AIRecommendationService:
             user_id: The user ID
             user_data: Dict with user data including viewed_products, liked_products, etc.
             n: Number of recommendations to return
+            cf_recommendations: See get_hybrid_recommendations
 
         Returns:
             Dict with different types of recommendations
@@ -388,7 +558,8 @@ class AIRecommendationService:
             viewed_products = user_data.get('viewed_products', [])
 
             # Get hybrid recommendations
-            hybrid_recs = self.get_hybrid_recommendations(user_id, viewed_products, n=n)
+            hybrid_recs = self.get_hybrid_recommendations(user_id, viewed_products, n=n,
+                                                          cf_recommendations=cf_recommendations)
 
             # Split recommendations into categories
             preferred = hybrid_recs[:10]
@@ -412,5 +583,125 @@ class AIRecommendationService:
             return {'preferred': [], 'liked': []}
 
 
-# Create a singleton instance
-recommendation_service = AIRecommendationService()
+def sorted_codes(values):
+    """
+    Returns (sorted distinct values, position of every value in them).
+    Same result as np.unique(values, return_inverse=True), but the values
+    are hashed once and only the distinct ones are sorted.
+    """
+    import pandas as pd
+
+    codes, uniques = pd.factorize(values)
+    uniques, remap = np.unique(np.asarray(uniques), return_inverse=True)
+    return uniques, remap[codes]
+
+
+def build_interaction_matrix(interactions):
+    """
+    Build the CSR user-item matrix from a DataFrame with columns
+    [user_id, product_id, score] without any per-row Python work.
+    Returns (sorted user ids, sorted product keys, matrix); an id's row or
+    column is its position in the sorted array.
+    """
+    import pandas as pd
+    from scipy.sparse import csr_matrix
+
+    unique_users, user_indices = sorted_codes(interactions['user_id'].to_numpy(dtype=np.int64))
+
+    products = interactions['product_id']
+    if isinstance(products.dtype, pd.CategoricalDtype):
+        codes, uniques = products.cat.codes.to_numpy(), products.cat.categories
+    else:
+        codes, uniques = pd.factorize(products)
+    # Only the distinct products go through product_key()
+    keys = np.array([product_key(p) for p in uniques], dtype='U32')
+    unique_products, remap = np.unique(keys, return_inverse=True)
+    product_indices = remap[codes]
+
+    matrix = csr_matrix(
+        (interactions['score'].to_numpy(dtype=np.float32), (user_indices, product_indices)),
+        shape=(len(unique_users), len(unique_products))
+    )
+    return unique_users, unique_products, matrix
+
+
+def product_content(products_data):
+    """The text a product's content features are computed from."""
+    return products_data.apply(
+        lambda row: f"{row['name']} {row['description']} {row['category']} {row['brand']} {row.get('specifications', '')}",
+        axis=1
+    )
+
+
+def content_digests(texts):
+    """Short hash of every product text, to tell edited products apart."""
+    return np.array([hashlib.blake2b(text.encode(), digest_size=16).hexdigest() for text in texts], dtype='U32')
+
+
+def fold_in(item_factors, item_gramian, items, confidence, regularization):
+    """
+    Latent vector of a user who interacted with the item rows `items`,
+    with the item factors held fixed: the same least-squares step ALS
+    takes for every user during training (implicit-feedback ALS, where a
+    score is the confidence of a positive preference).
+
+        (YtY + Yu^T (Cu - I) Yu + regularization * I) x = Yu^T Cu 1
+    """
+    factors = np.asarray(item_factors[items], dtype=np.float64)
+    confidence = np.asarray(confidence, dtype=np.float64)
+    a = item_gramian + (factors.T * (confidence - 1)) @ factors + regularization * np.eye(len(item_gramian))
+    return np.linalg.solve(a, factors.T @ confidence).astype(np.float32)
+
+
+def load_sentiment_analyzer():
+    """Import NLTK and build the VADER analyzer, fetching its lexicon if missing."""
+    try:
+        import nltk
+        from nltk.sentiment.vader import SentimentIntensityAnalyzer
+    except ImportError:
+        logger.warning("NLTK not available. Sentiment analysis will be disabled.")
+        return None
+    try:
+        nltk.data.find('sentiment/vader_lexicon.zip')
+    except LookupError:
+        try:
+            nltk.download('vader_lexicon', quiet=True)
+        except Exception as e:
+            logger.warning(f"Could not download NLTK resources: {e}")
+            return None
+    try:
+        return SentimentIntensityAnalyzer()
+    except Exception as e:
+        logger.warning(f"Could not initialize SentimentIntensityAnalyzer: {e}")
+        return None
+
+
+# The singleton is created on first use, not when the module is imported
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_recommendation_service():
+    """The process-wide service; the published models are loaded on the first call."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = AIRecommendationService()
+    return _service
+
+
+def warm_up():
+    """
+    Create the service and load the published models ahead of the first
+    request (RECOMMENDER_WARMUP, or call it from a server post-fork hook).
+    Returns True if a published model was loaded.
+    """
+    return get_recommendation_service().is_ready
+
+
+def __getattr__(name):
+    # `from .ai_services import recommendation_service` keeps working
+    if name == 'recommendation_service':
+        return get_recommendation_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
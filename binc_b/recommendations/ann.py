@@ -0,0 +1,111 @@
+"""
+Approximate top-N search over the ALS item factors.
+
+Exact collaborative recommendations score the user vector against every
+item factor, so their cost grows with the catalog. The inverted file (IVF)
+index built here clusters the item factors with k-means at training time
+and stores the items grouped by cluster. A query scores the user vector
+against the cluster centroids, then exactly scores only the items of the
+`probes` best clusters. More probes give better recall at higher cost;
+probing every cluster is the exact search.
+
+The index is three arrays saved with the model bundle:
+    centroids  float32 (lists x factors)
+    offsets    int64   (lists + 1): items of list i are items[offsets[i]:offsets[i + 1]]
+    items      int32   (products): item rows grouped by list
+"""
+import numpy as np
+from django.conf import settings
+
+DEFAULTS = {
+    'ENABLED': True,        # False: always score every item exactly
+    'MIN_ITEMS': 20000,     # smaller catalogs are scored exactly, which is fast enough
+    'LISTS': None,          # clusters; None means about sqrt(products)
+    'PROBES': 8,            # clusters searched per query
+}
+
+# Upper bound on the dense distance block held in memory (items x lists)
+BLOCK_ELEMENTS = 1 << 24
+
+
+def ann_setting(name):
+    return getattr(settings, 'RECOMMENDER_ANN', {}).get(name, DEFAULTS[name])
+
+
+def default_lists(n_items):
+    """About sqrt(n) lists, the usual IVF trade-off."""
+    return max(1, int(round(np.sqrt(n_items))))
+
+
+def _nearest_centroid(vectors, centroids, block_elements=BLOCK_ELEMENTS):
+    assignment = np.empty(len(vectors), dtype=np.int32)
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    step = max(1, block_elements // max(len(centroids), 1))
+    for start in range(0, len(vectors), step):
+        block = vectors[start:start + step]
+        # |v - c|^2 without the |v|^2 term, which is the same for every c
+        distances = centroid_norms - 2 * block @ centroids.T
+        assignment[start:start + step] = distances.argmin(axis=1)
+    return assignment
+
+
+def kmeans(vectors, n_lists, iterations=10, seed=0):
+    """Lloyd's k-means. Returns (centroids, assignment of every vector)."""
+    rng = np.random.default_rng(seed)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = _nearest_centroid(vectors, centroids)
+        counts = np.bincount(assignment, minlength=n_lists)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # Restart empty lists on random vectors
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+    return centroids, _nearest_centroid(vectors, centroids)
+
+
+def build_ivf(item_factors, n_lists=None, iterations=10, seed=0):
+    """Returns (centroids, offsets, items) for the item factor matrix."""
+    item_factors = np.asarray(item_factors, dtype=np.float32)
+    n_lists = min(n_lists or default_lists(len(item_factors)), len(item_factors))
+    centroids, assignment = kmeans(item_factors, n_lists, iterations=iterations, seed=seed)
+    items = np.argsort(assignment, kind='stable').astype(np.int32)
+    offsets = np.zeros(n_lists + 1, dtype=np.int64)
+    np.cumsum(np.bincount(assignment, minlength=n_lists), out=offsets[1:])
+    return centroids, offsets, items
+
+
+def top_n(scores, n):
+    """Positions of the `n` largest scores, best first."""
+    n = min(n, len(scores))
+    if n <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, n - 1)[:n]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+def exact_search(item_factors, query, n, exclude=None):
+    """Top `n` item rows by inner product with `query`."""
+    scores = item_factors @ query
+    if exclude is not None and len(exclude):
+        scores[exclude] = -np.inf
+        n = min(n, len(scores) - len(np.unique(exclude)))
+    return top_n(scores, n)
+
+
+def ivf_search(item_factors, centroids, offsets, items, query, n, probes, exclude=None):
+    """
+    Top `n` item rows among the `probes` lists whose centroids score best
+    against `query`. May return fewer than `n` when the probed lists hold
+    too few candidates.
+    """
+    lists = top_n(centroids @ query, probes)
+    candidates = np.concatenate([items[offsets[i]:offsets[i + 1]] for i in lists])
+    if exclude is not None and len(exclude):
+        candidates = candidates[~np.isin(candidates, exclude)]
+    scores = item_factors[candidates] @ query
+    return candidates[top_n(scores, n)]
@@ -1,6 +1,17 @@
+import threading
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class RecommendationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recommendations'
+
+    def ready(self):
+        # The recommendation service is normally created on the first request
+        # that needs it. With RECOMMENDER_WARMUP it is loaded in the background
+        # at startup instead, so that first request does not pay for it.
+        if getattr(settings, 'RECOMMENDER_WARMUP', False):
+            from .ai_services import warm_up
+            threading.Thread(target=warm_up, name='recommender-warmup', daemon=True).start()
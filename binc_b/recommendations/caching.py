@@ -0,0 +1,105 @@
+"""
+Caches of the recommendation service and views.
+
+Fold-in vectors: a user who is not part of the trained model gets a
+latent vector computed on the fly from their interactions
+(AIRecommendationService.user_vector). The vector is cached for
+RECOMMENDER_FOLD_IN_TTL seconds.
+
+Responses: the personalized part of a recommendation response is cached
+per user and view, so a repeat page load touches neither the models nor
+the product tables. RECOMMENDER_RESPONSE_TTL bounds how stale product
+details in it can get.
+
+Both are tagged with user_version(): the loaded model version plus the
+user's behavior version, a CacheVersion row that forget_users() bumps when
+the user records behavior. The row lives in the database, so a bump made
+by the worker that handled the behavior is seen by every other worker, and
+entries computed from the older history are ignored everywhere even though
+the default cache is per process.
+
+Shared lists: the non-personalized `new` and `popular` lists are cached
+once for all users for RECOMMENDER_SHARED_LISTS_TTL seconds.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from products.models import CacheVersion
+
+FOLD_IN_KEY = 'recommendations:fold-in:{user_id}'
+DEFAULT_FOLD_IN_TTL = 300
+
+RESPONSE_KEY = 'recommendations:response:{view}:{user_id}'
+RESPONSE_VIEWS = ('recommendations', 'hybrid')
+DEFAULT_RESPONSE_TTL = 600
+
+SHARED_LIST_KEY = 'recommendations:shared:{name}'
+DEFAULT_SHARED_LISTS_TTL = 60
+
+USER_VERSION_KEY = 'recommendations:user:{user_id}'
+
+
+def user_version_key(user_id):
+    return USER_VERSION_KEY.format(user_id=user_id)
+
+
+def user_version(user_id, model_version):
+    """
+    Version of a user's cached entries. Read it before computing an entry
+    and store the entry under it, so behavior recorded meanwhile wins.
+    """
+    return model_version, CacheVersion.current(user_version_key(user_id))
+
+
+def fold_in_key(user_id):
+    return FOLD_IN_KEY.format(user_id=user_id)
+
+
+def get_fold_in(user_id, version):
+    """Cached (vector, item rows) of a user for user_version() `version`, or None."""
+    cached = cache.get(fold_in_key(user_id))
+    if cached is None or cached[0] != version:
+        return None
+    return cached[1:]
+
+
+def set_fold_in(user_id, version, vector, items):
+    ttl = getattr(settings, 'RECOMMENDER_FOLD_IN_TTL', DEFAULT_FOLD_IN_TTL)
+    cache.set(fold_in_key(user_id), (version, vector, items), ttl)
+
+
+def response_key(view, user_id):
+    return RESPONSE_KEY.format(view=view, user_id=user_id)
+
+
+def get_response(view, user_id, version):
+    """Cached response data of `view` for a user, if computed at user_version() `version`."""
+    cached = cache.get(response_key(view, user_id))
+    if cached is None or cached[0] != version:
+        return None
+    return cached[1]
+
+
+def set_response(view, user_id, version, data):
+    ttl = getattr(settings, 'RECOMMENDER_RESPONSE_TTL', DEFAULT_RESPONSE_TTL)
+    cache.set(response_key(view, user_id), (version, data), ttl)
+
+
+def shared_list(name, build):
+    """The cached list `name`, built by calling `build` when missing."""
+    ttl = getattr(settings, 'RECOMMENDER_SHARED_LISTS_TTL', DEFAULT_SHARED_LISTS_TTL)
+    return cache.get_or_set(SHARED_LIST_KEY.format(name=name), build, ttl)
+
+
+def forget_users(user_ids):
+    """Invalidate what is cached for users whose behavior changed, in every process."""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    CacheVersion.bump_many(user_version_key(user_id) for user_id in user_ids)
+    # Entries of this process are unreachable now; free them right away
+    keys = []
+    for user_id in user_ids:
+        keys.append(fold_in_key(user_id))
+        keys.extend(response_key(view, user_id) for view in RESPONSE_VIEWS)
+    cache.delete_many(keys)
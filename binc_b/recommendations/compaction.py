@@ -0,0 +1,76 @@
+"""
+Roll old raw behavior events into daily aggregates.
+
+UserBehaviorLog only needs recent raw events (recommendation queries look
+at a user's latest few dozen actions). Events older than the retention
+window are counted per (user, product, action, day) into UserBehaviorDaily
+and deleted from the raw table, one day at a time so each transaction and
+its memory use stay bounded. Re-running over a day that was already
+compacted adds to the existing counts, so late events are never lost.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from .models import UserBehaviorDaily, UserBehaviorLog
+
+
+def day_bounds(day):
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(day, time.min), tz)
+    return start, start + timedelta(days=1)
+
+
+def compact_day(day):
+    """Aggregate and delete the raw events of one day. Returns (events, aggregates)."""
+    start, end = day_bounds(day)
+    raw = UserBehaviorLog.objects.filter(timestamp__gte=start, timestamp__lt=end)
+    rows = list(raw.values('user_id', 'product_id', 'action').annotate(count=Count('id')).order_by())
+    if not rows:
+        return 0, 0
+
+    with transaction.atomic():
+        existing = {
+            (agg.user_id, agg.product_id, agg.action): agg
+            for agg in UserBehaviorDaily.objects.select_for_update().filter(day=day)
+        }
+        to_create = []
+        to_update = []
+        for row in rows:
+            key = (row['user_id'], row['product_id'], row['action'])
+            agg = existing.get(key)
+            if agg is None:
+                to_create.append(UserBehaviorDaily(
+                    user_id=row['user_id'], product_id=row['product_id'],
+                    action=row['action'], day=day, count=row['count']
+                ))
+            else:
+                agg.count += row['count']
+                to_update.append(agg)
+        UserBehaviorDaily.objects.bulk_create(to_create, batch_size=1000)
+        UserBehaviorDaily.objects.bulk_update(to_update, ['count'], batch_size=1000)
+        deleted, _ = raw.delete()
+    return deleted, len(rows)
+
+
+def compact_behavior_logs(retention_days=30, now=None):
+    """
+    Compact every full day older than `retention_days`. Returns
+    (events compacted, aggregate rows written).
+    """
+    now = now or timezone.now()
+    cutoff = timezone.localtime(now).date() - timedelta(days=retention_days)
+    oldest = UserBehaviorLog.objects.aggregate(oldest=Min('timestamp'))['oldest']
+    if oldest is None:
+        return 0, 0
+
+    events = aggregates = 0
+    day = timezone.localtime(oldest).date()
+    while day < cutoff:
+        compacted, written = compact_day(day)
+        events += compacted
+        aggregates += written
+        day += timedelta(days=1)
+    return events, aggregates
@@ -0,0 +1,271 @@
+"""
+Buffered ingestion of user behavior events.
+
+UserBehaviorView only validates an event and puts it on a bounded
+in-process queue. A background thread drains the queue and writes each
+batch with a handful of statements: one bulk insert into UserBehaviorLog
+and one bulk upsert of ProductRecommendation scores. View and like counts
+go to the sharded counters in core.counters once the batch is committed.
+A batch that fails to write is retried with backoff and, if it still
+fails, put back on the queue for the next flush. When the queue is full,
+submit() waits briefly and then reports failure so the view can shed load
+with 503 instead of growing memory. The queue is flushed when the process
+exits.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import Counter, namedtuple
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from core.counters import counters
+
+from . import caching
+
+logger = logging.getLogger(__name__)
+
+# log_only events are recorded in UserBehaviorLog without touching counters
+# or recommendation scores (Product.log_behavior)
+BehaviorEvent = namedtuple('BehaviorEvent', ['user_id', 'product_id', 'action', 'log_only'],
+                           defaults=(False,))
+
+DEFAULTS = {
+    'ASYNC': True,
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 1.0,      # seconds between flushes of a partial batch
+    'MAX_QUEUE_SIZE': 10000,
+    'ENQUEUE_TIMEOUT': 0.05,    # seconds submit() waits on a full queue
+    'RETRIES': 3,               # further attempts at writing a failed batch
+    'RETRY_BACKOFF': 0.05,      # seconds before the first retry, doubled after each
+}
+
+# Recommendation score given by the latest action on a product
+ACTION_SCORES = {
+    'view': 1.0,
+    'like': 3.0,
+    'purchase': 5.0,
+}
+
+# Product counter bumped by each action
+ACTION_COUNTERS = {
+    'view': 'views',
+    'like': 'likes',
+}
+
+
+def ingestion_setting(name):
+    return getattr(settings, 'BEHAVIOR_INGESTION', {}).get(name, DEFAULTS[name])
+
+
+def count_events(model, counter_deltas):
+    for field, deltas in counter_deltas.items():
+        for product_id, delta in deltas.items():
+            counters.incr(model, product_id, field, delta)
+
+
+def write_events(events):
+    """Persist a batch of events. Events for missing products are dropped."""
+    from core.models import Product
+    from .models import ProductRecommendation, UserBehaviorLog, UserRecommendationSet
+
+    if not events:
+        return 0
+    existing = set(Product.objects.filter(
+        pk__in={event.product_id for event in events}
+    ).values_list('pk', flat=True))
+    events = [event for event in events if event.product_id in existing]
+    if not events:
+        return 0
+
+    counter_deltas = {}
+    latest = {}
+    for event in events:
+        if event.log_only:
+            continue
+        field = ACTION_COUNTERS.get(event.action)
+        if field:
+            counter_deltas.setdefault(field, Counter())[event.product_id] += 1
+        latest[(event.user_id, event.product_id)] = event
+    # Users who acted through UserBehaviorView; log_only detail-page views
+    # alone do not invalidate what was computed for a user
+    acted = {user_id for user_id, _ in latest}
+
+    with transaction.atomic():
+        # Timestamps are taken at write time, at most one flush interval late
+        UserBehaviorLog.objects.bulk_create([
+            UserBehaviorLog(user_id=event.user_id, product_id=event.product_id, action=event.action)
+            for event in events
+        ])
+
+        # Counters are folded into the database by the counter flusher; the
+        # deltas only count once the events they stand for are committed
+        transaction.on_commit(lambda: count_events(Product, counter_deltas))
+
+        # Equivalent of update_or_create per (user, product), done in bulk
+        recommendations = {
+            (rec.user_id, rec.product_id): rec
+            for rec in ProductRecommendation.objects.filter(
+                user_id__in={user_id for user_id, _ in latest},
+                product_id__in={product_id for _, product_id in latest},
+            )
+        }
+        to_create = []
+        to_update = []
+        for key, event in latest.items():
+            score = ACTION_SCORES.get(event.action, 1.0)
+            rec = recommendations.get(key)
+            if rec is None:
+                to_create.append(ProductRecommendation(
+                    user_id=event.user_id, product_id=event.product_id,
+                    score=score, recommendation_type='preferred'
+                ))
+            else:
+                rec.score = score
+                rec.recommendation_type = 'preferred'
+                to_update.append(rec)
+        ProductRecommendation.objects.bulk_create(to_create)
+        ProductRecommendation.objects.bulk_update(to_update, ['score', 'recommendation_type'])
+
+        # Stored recommendations were computed from the older history
+        if acted:
+            UserRecommendationSet.objects.filter(user_id__in=acted, stale=False).update(stale=True)
+
+    # Vectors and responses computed from the old history are stale now
+    caching.forget_users(acted)
+    return len(events)
+
+
+class BehaviorIngestor:
+
+    def __init__(self, writer=write_events):
+        self._writer = writer
+        self._queue = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._exit_hook = False
+
+    @property
+    def queue(self):
+        if self._queue is None:
+            with self._lock:
+                if self._queue is None:
+                    self._queue = queue.Queue(maxsize=ingestion_setting('MAX_QUEUE_SIZE'))
+        return self._queue
+
+    def pending(self):
+        return self.queue.qsize()
+
+    def submit(self, user_id, product_id, action, log_only=False):
+        """
+        Queue one event. Returns False when the queue stayed full for the
+        whole enqueue timeout, in which case the event was not accepted.
+        """
+        event = BehaviorEvent(user_id, product_id, action, log_only)
+        try:
+            self.queue.put(event, timeout=ingestion_setting('ENQUEUE_TIMEOUT'))
+        except queue.Full:
+            logger.warning("Behavior queue is full; rejecting event")
+            return False
+        if ingestion_setting('ASYNC'):
+            self.start()
+        else:
+            self.flush()
+        return True
+
+    def _drain(self, limit):
+        events = []
+        while len(events) < limit:
+            try:
+                events.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+    def flush(self):
+        """Write every queued event now. Returns the number of events written."""
+        written = 0
+        batch_size = ingestion_setting('BATCH_SIZE')
+        with self._flush_lock:
+            while True:
+                events = self._drain(batch_size)
+                if not events:
+                    break
+                count = self._write(events)
+                if count is None:
+                    # Keep the events for the next flush rather than lose them
+                    self._requeue(events)
+                    break
+                written += count
+        return written
+
+    def _write(self, events):
+        """Write one batch, retrying with backoff. Returns None if every attempt failed."""
+        retries = ingestion_setting('RETRIES')
+        delay = ingestion_setting('RETRY_BACKOFF')
+        for attempt in range(retries + 1):
+            try:
+                return self._writer(events)
+            except Exception as e:
+                logger.warning(f"Error writing {len(events)} behavior events (attempt {attempt + 1}): {e}")
+                if attempt < retries:
+                    time.sleep(delay * 2 ** attempt)
+        return None
+
+    def _requeue(self, events):
+        for index, event in enumerate(events):
+            try:
+                self.queue.put_nowait(event)
+            except queue.Full:
+                logger.error(f"Behavior queue is full; dropping {len(events) - index} unwritten events")
+                return
+
+    # ------------------------------------------------------------------
+    #   Background worker
+    # ------------------------------------------------------------------
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='behavior-ingestor', daemon=True)
+            self._thread.start()
+            if not self._exit_hook:
+                atexit.register(self.stop)
+                self._exit_hook = True
+
+    def _run(self):
+        interval = ingestion_setting('FLUSH_INTERVAL')
+        batch_size = ingestion_setting('BATCH_SIZE')
+        deadline = time.monotonic() + interval
+        while not self._stopping.is_set():
+            # Wake up early once a full batch is waiting
+            if self.pending() < batch_size and time.monotonic() < deadline:
+                self._stopping.wait(min(0.05, interval))
+                continue
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+            deadline = time.monotonic() + interval
+
+    def stop(self, timeout=5.0):
+        """Stop the worker and write whatever is still queued."""
+        self._stopping.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        self._thread = None
+        self.flush()
+        # The last batch may have left counter deltas behind
+        counters.flush()
+
+
+behavior_ingestor = BehaviorIngestor()
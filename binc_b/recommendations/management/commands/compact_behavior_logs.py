@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recommendations.compaction import compact_behavior_logs
+
+
+class Command(BaseCommand):
+    help = 'Rolls behavior events older than the retention window into daily aggregates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30,
+                            help='Number of days of raw events to keep (default: 30)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        events, aggregates = compact_behavior_logs(retention_days=options['days'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Compacted {events} behavior events into {aggregates} daily rows in {elapsed:.2f}s.'
+        ))
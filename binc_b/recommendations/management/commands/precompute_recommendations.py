@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recommendations.ai_services import MODEL_DIR
+from recommendations.precompute import BLOCK_SIZE, precompute_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Precomputes the personalized recommendations of recently active users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model-dir', default=MODEL_DIR,
+                            help='Directory holding the published model versions')
+        parser.add_argument('--days', type=int, default=30,
+                            help='Users with behavior in this many days are precomputed (default: 30)')
+        parser.add_argument('--block-size', type=int, default=BLOCK_SIZE,
+                            help=f'Users read and stored per block (default: {BLOCK_SIZE})')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        users = precompute_recommendations(model_dir=options['model_dir'], days=options['days'],
+                                           block_size=options['block_size'])
+        elapsed = time.perf_counter() - started
+        if users is None:
+            self.stdout.write(self.style.WARNING('No published models; nothing was precomputed.'))
+            return
+        self.stdout.write(self.style.SUCCESS(f'Precomputed recommendations of {users} users in {elapsed:.2f}s.'))
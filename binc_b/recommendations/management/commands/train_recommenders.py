@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recommendations.ai_services import MODEL_DIR
+from recommendations.training import train_recommenders, update_content_index
+
+
+class Command(BaseCommand):
+    help = 'Trains the recommendation models and publishes them as a new version'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model-dir', default=MODEL_DIR,
+                            help='Directory holding the published model versions')
+        parser.add_argument('--keep', type=int, default=3,
+                            help='Number of versions to keep on disk (default: 3)')
+        parser.add_argument('--content-only', action='store_true',
+                            help='Only update the content model of the published version for new, '
+                                 'edited and deleted products, without refitting')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['content_only']:
+            version = update_content_index(model_dir=options['model_dir'], keep=options['keep'])
+        else:
+            version = train_recommenders(model_dir=options['model_dir'], keep=options['keep'])
+        elapsed = time.perf_counter() - started
+        if version is None:
+            reason = 'Nothing to update' if options['content_only'] else 'Nothing to train on'
+            self.stdout.write(self.style.WARNING(f'{reason}; no version was published.'))
+            return
+        self.stdout.write(self.style.SUCCESS(f'Published version {version} in {elapsed:.2f}s.'))
@@ -0,0 +1,52 @@
+# Generated by Django 5.2 on 2026-10-18 13:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_productspecification_numeric_value'),
+        ('recommendations', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserBehaviorDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('view', 'View'), ('like', 'Like'), ('purchase', 'Purchase')], max_length=50)),
+                ('day', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='userbehaviorlog',
+            index=models.Index(fields=['user', 'action', '-timestamp', 'product'], name='behavior_user_action_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userbehaviorlog',
+            index=models.Index(fields=['timestamp'], name='behavior_timestamp_idx'),
+        ),
+        migrations.AddField(
+            model_name='userbehaviordaily',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='behavior_daily', to='core.product'),
+        ),
+        migrations.AddField(
+            model_name='userbehaviordaily',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='behavior_daily', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='userbehaviordaily',
+            index=models.Index(fields=['user', 'action', '-day'], name='behavior_daily_user_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='userbehaviordaily',
+            constraint=models.UniqueConstraint(fields=('user', 'product', 'action', 'day'), name='behavior_daily_unique'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0002_userbehaviordaily_behavior_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserRecommendationSet',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='recommendation_set', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('model_version', models.CharField(max_length=64)),
+                ('preferred', models.JSONField(default=list, help_text='Product ids, best first.')),
+                ('liked', models.JSONField(default=list, help_text='Product ids, best first.')),
+                ('stale', models.BooleanField(default=False)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
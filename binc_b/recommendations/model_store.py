@@ -0,0 +1,260 @@
+"""
+Versioned storage of trained recommendation models.
+
+Every training run writes its artifacts into a fresh directory under
+`<model dir>/versions/` and then publishes it by atomically replacing the
+`CURRENT` pointer file, so a reader either sees the previous complete
+version or the new complete version, never a half-written one. Request
+handlers only ever load the published version.
+
+A version is a bundle: dense arrays (factor matrices, id maps) as `.npy`
+files, sparse CSR matrices as their three component arrays, and a JSON
+manifest. Every array is opened with mmap, so loading takes milliseconds
+whatever the model size and all worker processes share one copy of the
+pages through the OS page cache. Objects that are not arrays (the fitted
+TF-IDF vectorizer) are pickled.
+"""
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import uuid
+
+import numpy as np
+from django.utils import timezone
+
+POINTER_FILE = 'CURRENT'
+VERSIONS_DIR = 'versions'
+MANIFEST_FILE = 'manifest.json'
+BUNDLE_FORMAT = 2
+SPARSE_PARTS = ('data', 'indices', 'indptr')
+
+
+def versions_dir(model_dir):
+    return os.path.join(model_dir, VERSIONS_DIR)
+
+
+def version_path(model_dir, version):
+    return os.path.join(versions_dir(model_dir), version)
+
+
+def new_version():
+    """Version names sort by creation time."""
+    return f"{timezone.now():%Y%m%dT%H%M%S.%f}-{uuid.uuid4().hex[:6]}"
+
+
+def staging_dir(model_dir):
+    """Create a private directory to write a new version into."""
+    os.makedirs(versions_dir(model_dir), exist_ok=True)
+    return tempfile.mkdtemp(prefix='.staging-', dir=versions_dir(model_dir))
+
+
+def current_version(model_dir):
+    """Name of the published version, or None if nothing was published."""
+    try:
+        with open(os.path.join(model_dir, POINTER_FILE)) as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None
+    if version and os.path.isdir(version_path(model_dir, version)):
+        return version
+    return None
+
+
+def pointer_mtime(model_dir):
+    try:
+        return os.stat(os.path.join(model_dir, POINTER_FILE)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def publish(model_dir, staging, version=None):
+    """Move a fully written staging directory into place and make it current."""
+    version = version or new_version()
+    os.rename(staging, version_path(model_dir, version))
+
+    fd, tmp_path = tempfile.mkstemp(dir=model_dir, prefix='.pointer-')
+    with os.fdopen(fd, 'w') as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(model_dir, POINTER_FILE))
+    return version
+
+
+def prune(model_dir, keep=3):
+    """Delete all but the `keep` newest versions; the current one is always kept."""
+    current = current_version(model_dir)
+    root = versions_dir(model_dir)
+    if not os.path.isdir(root):
+        return []
+    versions = sorted(name for name in os.listdir(root) if not name.startswith('.'))
+    removed = []
+    for version in versions[:-keep] if keep else versions:
+        if version != current:
+            shutil.rmtree(os.path.join(root, version), ignore_errors=True)
+            removed.append(version)
+    return removed
+
+
+#----------------------------------------------------------------
+#                       Model bundles
+#----------------------------------------------------------------
+def save_bundle(directory, arrays=None, sparse=None, objects=None, meta=None):
+    """
+    Write a bundle into `directory`.
+
+    arrays:  {name: ndarray}, saved as <name>.npy
+    sparse:  {name: CSR matrix}, saved as <name>.<part>.npy
+    objects: {name: picklable object}, saved as <name>.pkl
+    meta:    JSON-serialisable metadata stored in the manifest
+    """
+    manifest = {'format': BUNDLE_FORMAT, 'arrays': [], 'sparse': {}, 'objects': [], 'meta': meta or {}}
+    for name, array in (arrays or {}).items():
+        np.save(os.path.join(directory, f'{name}.npy'), np.ascontiguousarray(array), allow_pickle=False)
+        manifest['arrays'].append(name)
+    for name, matrix in (sparse or {}).items():
+        matrix = matrix.tocsr()
+        for part in SPARSE_PARTS:
+            np.save(os.path.join(directory, f'{name}.{part}.npy'), getattr(matrix, part), allow_pickle=False)
+        manifest['sparse'][name] = list(matrix.shape)
+    for name, obj in (objects or {}).items():
+        with open(os.path.join(directory, f'{name}.pkl'), 'wb') as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        manifest['objects'].append(name)
+    with open(os.path.join(directory, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f)
+
+
+def load_bundle(directory, mmap=True):
+    """
+    Open a bundle written by save_bundle(). Returns (entries, meta) where
+    entries maps every name to its array, CSR matrix or object. Arrays are
+    read-only memory maps unless `mmap` is False.
+    """
+    from scipy.sparse import csr_matrix
+
+    with open(os.path.join(directory, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != BUNDLE_FORMAT:
+        raise ValueError(f"Unsupported model bundle format: {manifest.get('format')}")
+
+    mmap_mode = 'r' if mmap else None
+    entries = {}
+    for name in manifest['arrays']:
+        entries[name] = np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode)
+    for name, shape in manifest['sparse'].items():
+        data, indices, indptr = (
+            np.load(os.path.join(directory, f'{name}.{part}.npy'), mmap_mode=mmap_mode)
+            for part in SPARSE_PARTS
+        )
+        # The constructor keeps the mapped arrays as they are (no copy)
+        entries[name] = csr_matrix((data, indices, indptr), shape=tuple(shape), copy=False)
+    for name in manifest['objects']:
+        with open(os.path.join(directory, f'{name}.pkl'), 'rb') as f:
+            entries[name] = pickle.load(f)
+    return entries, manifest['meta']
+
+
+def product_key(product_id):
+    """Products are keyed by their UUID hex string in every id array."""
+    return uuid.UUID(str(product_id)).hex
+
+
+def lookup(sorted_ids, key):
+    """Position of `key` in a sorted id array, or None."""
+    if sorted_ids is None or len(sorted_ids) == 0:
+        return None
+    pos = int(np.searchsorted(sorted_ids, key))
+    if pos < len(sorted_ids) and sorted_ids[pos] == key:
+        return pos
+    return None
+
+
+class ModelState:
+    """
+    Everything one model version serves from. A state is never modified
+    once the service has swapped it in; requests take a reference to the
+    current state and keep a consistent view of it even while a newer
+    version replaces it, and its memory maps are released when the last
+    reference goes away.
+    """
+    FIELDS = (
+        # Collaborative filtering: sorted id arrays double as id -> index maps
+        'user_ids',             # int64, sorted
+        'product_ids',          # product UUID hex strings, sorted
+        'user_factors',         # float32 (users x factors)
+        'item_factors',         # float32 (products x factors)
+        'user_item_matrix',     # CSR (users x products)
+        'item_gramian',         # float64 (factors x factors): item_factors.T @ item_factors
+        'ann_centroids',        # IVF index over item_factors (see ann.py)
+        'ann_offsets',
+        'ann_items',
+        # Content-based filtering
+        'content_product_ids',  # product UUID hex strings, sorted
+        'content_features',     # CSR TF-IDF rows, in content_product_ids order
+        'content_digests',      # hash of the text each row was computed from
+        'content_neighbors',    # int32 (products x K): most similar rows first, -1 = none
+        'content_neighbor_scores',  # float32 (products x K): their cosine similarities
+        'tfidf_vectorizer',
+    )
+    SPARSE = ('user_item_matrix', 'content_features')
+    OBJECTS = ('tfidf_vectorizer',)
+
+    def __init__(self, version=None, meta=None, **fields):
+        unknown = set(fields) - set(self.FIELDS)
+        if unknown:
+            raise TypeError(f"Unknown model state fields: {', '.join(sorted(unknown))}")
+        self.version = version
+        self.meta = meta or {}
+        for name in self.FIELDS:
+            setattr(self, name, fields.get(name))
+
+    def replace(self, **changes):
+        fields = {name: getattr(self, name) for name in self.FIELDS}
+        fields.update(changes)
+        version = fields.pop('version', self.version)
+        meta = fields.pop('meta', self.meta)
+        return ModelState(version=version, meta=meta, **fields)
+
+    @property
+    def has_collaborative(self):
+        return self.item_factors is not None
+
+    @property
+    def has_ann(self):
+        return self.ann_items is not None
+
+    @property
+    def has_content(self):
+        return self.tfidf_vectorizer is not None
+
+    def user_index(self, user_id):
+        return lookup(self.user_ids, user_id)
+
+    def product_index(self, product_id):
+        return lookup(self.product_ids, product_key(product_id))
+
+    def content_index(self, product_id):
+        return lookup(self.content_product_ids, product_key(product_id))
+
+    def save(self, directory):
+        arrays, sparse, objects = {}, {}, {}
+        for name in self.FIELDS:
+            value = getattr(self, name)
+            if value is None:
+                continue
+            if name in self.SPARSE:
+                sparse[name] = value
+            elif name in self.OBJECTS:
+                objects[name] = value
+            else:
+                arrays[name] = value
+        save_bundle(directory, arrays=arrays, sparse=sparse, objects=objects, meta=self.meta)
+
+    @classmethod
+    def load(cls, directory, version=None):
+        entries, meta = load_bundle(directory)
+        return cls(version=version, meta=meta,
+                   **{name: value for name, value in entries.items() if name in cls.FIELDS})
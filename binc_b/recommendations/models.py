@@ -56,14 +56,144 @@ class ProductRecommendation(models.Model):
 #                   User Behavior Log
 # -------------------------------------------------------------------------------------------------------
 class UserBehaviorLog(models.Model):
+    """
+    Raw behavior events of the last few weeks. Older events are rolled up
+    into UserBehaviorDaily by the compact_behavior_logs command, which keeps
+    this table small.
+    """
+    ACTION_CHOICES = [('view', 'View'), ('like', 'Like'), ('purchase', 'Purchase')]
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='behavior_logs')
     product = models.ForeignKey(
         'core.Product',  # Use string reference to avoid circular import
         on_delete=models.CASCADE,
         related_name='behavior_logs'
     )
-    action = models.CharField(max_length=50, choices=[('view', 'View'), ('like', 'Like'), ('purchase', 'Purchase')])
+    action = models.CharField(max_length=50, choices=ACTION_CHOICES)
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # "Latest products a user viewed/liked": product_id is included so
+            # the query is answered from the index alone
+            models.Index(fields=['user', 'action', '-timestamp', 'product'], name='behavior_user_action_ts_idx'),
+            # Range scans of the compaction job
+            models.Index(fields=['timestamp'], name='behavior_timestamp_idx'),
+        ]
+
     def __str__(self):
-        return f"{self.user.username} - {self.action} - {self.product.name}"
\ No newline at end of file
+        return f"{self.user.username} - {self.action} - {self.product.name}"
+
+    @classmethod
+    def recent_product_ids(cls, user, action, limit):
+        """
+        Ids of the products `user` most recently acted on, newest first. Falls
+        back to the daily aggregates when the raw log has fewer than `limit`.
+        """
+        product_ids = list(cls.objects.filter(
+            user=user, action=action
+        ).order_by('-timestamp').values_list('product_id', flat=True)[:limit])
+        if len(product_ids) < limit:
+            older = UserBehaviorDaily.objects.filter(
+                user=user, action=action
+            ).exclude(product_id__in=product_ids).order_by('-day', '-count')
+            product_ids += list(older.values_list('product_id', flat=True)[:limit - len(product_ids)])
+        return product_ids
+
+    @classmethod
+    def recent_product_ids_by_user(cls, user_ids, action, limit):
+        """
+        recent_product_ids() for many users with two queries, as
+        {user_id: product ids}. Meant for batch jobs over the recent log.
+        """
+        result = {user_id: [] for user_id in user_ids}
+        rows = cls.objects.filter(user_id__in=user_ids, action=action).order_by('user_id', '-timestamp')
+        for user_id, product_id in rows.values_list('user_id', 'product_id'):
+            if len(result[user_id]) < limit:
+                result[user_id].append(product_id)
+
+        short = [user_id for user_id, product_ids in result.items() if len(product_ids) < limit]
+        older = UserBehaviorDaily.objects.filter(user_id__in=short, action=action).order_by('user_id', '-day', '-count')
+        for user_id, product_id in older.values_list('user_id', 'product_id'):
+            product_ids = result[user_id]
+            if len(product_ids) < limit and product_id not in product_ids:
+                product_ids.append(product_id)
+        return result
+
+
+# -------------------------------------------------------------------------------------------------
+#                   User Behavior Daily
+# -------------------------------------------------------------------------------------------------------
+class UserBehaviorDaily(models.Model):
+    """Per-user, per-product, per-action event counts for one day."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='behavior_daily')
+    product = models.ForeignKey(
+        'core.Product',
+        on_delete=models.CASCADE,
+        related_name='behavior_daily'
+    )
+    action = models.CharField(max_length=50, choices=UserBehaviorLog.ACTION_CHOICES)
+    day = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product', 'action', 'day'], name='behavior_daily_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'action', '-day'], name='behavior_daily_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.action} - {self.product_id} - {self.day}: {self.count}"
+
+
+# -------------------------------------------------------------------------------------------------
+#                   User Recommendation Set
+# -------------------------------------------------------------------------------------------------------
+class UserRecommendationSet(models.Model):
+    """
+    The personalized `preferred` and `liked` product lists of one user,
+    computed by the precompute_recommendations job (or on demand by
+    RecommendationView) against one model version. A set is served while
+    it was computed by the current model and the user has not acted since
+    (the behavior ingestion marks it stale).
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='recommendation_set'
+    )
+    model_version = models.CharField(max_length=64)
+    preferred = models.JSONField(default=list, help_text="Product ids, best first.")
+    liked = models.JSONField(default=list, help_text="Product ids, best first.")
+    stale = models.BooleanField(default=False)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Recommendations for {self.user_id} ({self.model_version})"
+
+    @classmethod
+    def fresh(cls, user, version):
+        """The user's set if it is still valid for model `version`, else None."""
+        return cls.objects.filter(user=user, model_version=version, stale=False).first()
+
+    @classmethod
+    def store(cls, results, version):
+        """
+        Upsert {user_id: {'preferred': [...], 'liked': [...]}} computed by
+        model `version`.
+        """
+        cls.objects.bulk_create(
+            [
+                cls(user_id=user_id, model_version=version, stale=False,
+                    preferred=[str(pk) for pk in lists.get('preferred', [])],
+                    liked=[str(pk) for pk in lists.get('liked', [])])
+                for user_id, lists in results.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=['model_version', 'preferred', 'liked', 'stale', 'computed_at'],
+            batch_size=1000,
+        )
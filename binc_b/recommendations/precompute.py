@@ -0,0 +1,117 @@
+"""
+Batch precomputation of personalized recommendations.
+
+precompute_recommendations() computes the `preferred` and `liked` lists
+RecommendationView serves for every user active in the last days, and
+stores them in UserRecommendationSet. Collaborative scores are computed a
+block of users at a time as one (users x factors) @ (factors x products)
+float32 product reduced with argpartition, the block sized so the dense
+scores stay under BLOCK_ELEMENTS. The content-based parts are lookups in
+the precomputed neighbor table, and behavior history is read with two
+queries per block. It runs from `manage.py precompute_recommendations`
+after every training; requests only recompute users whose stored set is
+missing or stale.
+"""
+import logging
+import uuid
+from datetime import timedelta
+
+import numpy as np
+from django.utils import timezone
+
+from .ai_services import AIRecommendationService, MODEL_DIR
+from .models import UserBehaviorLog, UserRecommendationSet
+
+logger = logging.getLogger(__name__)
+
+# Users stored per UserRecommendationSet.store() call
+BLOCK_SIZE = 1024
+# Upper bound on the dense score block held in memory (users x products)
+BLOCK_ELEMENTS = 1 << 24
+# Length of the collaborative list behind get_personalized_recommendations(n=20)
+RECOMMENDATIONS = 20
+
+
+def active_user_ids(days):
+    since = timezone.now() - timedelta(days=days)
+    users = UserBehaviorLog.objects.filter(timestamp__gte=since).values_list('user_id', flat=True)
+    return sorted(set(users.order_by()))
+
+
+def _block_top_n(state, user_rows, item_factors_t, n):
+    scores = state.user_factors[user_rows].astype(np.float32, copy=False) @ item_factors_t
+    seen = state.user_item_matrix[user_rows].tocoo()
+    scores[seen.row, seen.col] = -np.inf
+
+    top = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+    rows = np.arange(len(user_rows))[:, None]
+    top = top[rows, np.argsort(-scores[rows, top], axis=1, kind='stable')]
+    return np.where(np.isfinite(scores[rows, top]), top, -1)
+
+
+def collaborative_top_n(state, user_rows, n, block_elements=BLOCK_ELEMENTS):
+    """
+    Top `n` product rows for each of `user_rows`, best first, excluding the
+    products each user already has. Rows with fewer candidates end in -1.
+    Users are scored in row blocks of at most `block_elements` scores.
+    """
+    item_factors = np.asarray(state.item_factors, dtype=np.float32)
+    n_items = item_factors.shape[0]
+    n = min(n, n_items)
+    if n <= 0:
+        return np.empty((len(user_rows), 0), dtype=np.int64)
+
+    top = np.empty((len(user_rows), n), dtype=np.int64)
+    step = max(1, block_elements // max(n_items, 1))
+    for start in range(0, len(user_rows), step):
+        top[start:start + step] = _block_top_n(state, user_rows[start:start + step], item_factors.T, n)
+    return top
+
+
+def precompute_block(service, user_ids):
+    """{user_id: personalized lists} for one block of users."""
+    state = service.state
+    viewed = UserBehaviorLog.recent_product_ids_by_user(user_ids, 'view', 20)
+    liked = UserBehaviorLog.recent_product_ids_by_user(user_ids, 'like', 10)
+
+    collaborative = {}
+    if state.has_collaborative:
+        rows = {user_id: state.user_index(user_id) for user_id in user_ids}
+        trained = [user_id for user_id in user_ids if rows[user_id] is not None]
+        if trained:
+            top = collaborative_top_n(state, np.array([rows[user_id] for user_id in trained]), RECOMMENDATIONS)
+            for user_id, product_rows in zip(trained, top):
+                collaborative[user_id] = [uuid.UUID(state.product_ids[row]) for row in product_rows if row >= 0]
+
+    results = {}
+    for user_id in user_ids:
+        # Users missing from the model go through the fold-in path
+        results[user_id] = service.get_personalized_recommendations(
+            user_id,
+            {'viewed_products': viewed[user_id], 'liked_products': liked[user_id]},
+            n=RECOMMENDATIONS,
+            cf_recommendations=collaborative.get(user_id),
+        )
+    return results
+
+
+def precompute_recommendations(model_dir=MODEL_DIR, days=30, block_size=BLOCK_SIZE):
+    """
+    Compute and store the recommendations of every user active in the last
+    `days`. Returns the number of users stored, or None when no model is
+    published.
+    """
+    service = AIRecommendationService(model_dir=model_dir)
+    if not service.is_ready:
+        logger.warning("No published recommendation models; nothing precomputed")
+        return None
+
+    user_ids = active_user_ids(days)
+    for start in range(0, len(user_ids), block_size):
+        block = user_ids[start:start + block_size]
+        UserRecommendationSet.store(precompute_block(service, block), service.version)
+
+    # Sets of users no longer active were computed by an older model
+    UserRecommendationSet.objects.exclude(model_version=service.version).delete()
+    logger.info(f"Precomputed recommendations of {len(user_ids)} users with models version {service.version}")
+    return len(user_ids)
@@ -0,0 +1,129 @@
+"""
+Precomputed item-item similarity for content-based recommendations.
+
+Product similarity is the cosine between TF-IDF rows. Rather than scoring a
+product against the whole catalog on every request, training keeps the K
+most similar products of every product in two dense (products x K) arrays:
+neighbor row indices (int32, -1 where a product has fewer than K neighbors)
+and their similarities (float32), best first. Serving a product's
+neighbors is then a row lookup.
+
+The table is built by multiplying the feature matrix with its transpose a
+block of rows at a time, so memory stays bounded by the block size, and
+each block is reduced to its top K with argpartition rather than a full
+sort. When some products change, update_neighbors() only recomputes the
+rows that have to change.
+"""
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.preprocessing import normalize
+
+DEFAULT_NEIGHBORS = 50
+# Upper bound on the dense similarity block held in memory (rows x products)
+BLOCK_ELEMENTS = 1 << 24
+
+
+def _block_rows(n_products, block_elements):
+    return max(1, block_elements // max(n_products, 1))
+
+
+def _top_k(similarities, k):
+    """Top `k` columns of every row of a dense block, best first."""
+    rows = np.arange(similarities.shape[0])[:, None]
+    if k < similarities.shape[1]:
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    else:
+        top = np.tile(np.arange(similarities.shape[1]), (similarities.shape[0], 1))
+    order = np.argsort(-similarities[rows, top], axis=1, kind='stable')
+    top = top[rows, order]
+    return top, similarities[rows, top]
+
+
+def _pad(indices, scores, k):
+    """Widen to `k` columns and mark missing neighbors with -1."""
+    missing = ~np.isfinite(scores)
+    indices = np.where(missing, -1, indices).astype(np.int32)
+    scores = np.where(missing, 0.0, scores).astype(np.float32)
+    if indices.shape[1] < k:
+        extra = k - indices.shape[1]
+        indices = np.pad(indices, ((0, 0), (0, extra)), constant_values=-1)
+        scores = np.pad(scores, ((0, 0), (0, extra)))
+    return indices, scores
+
+
+def _block_neighbors(features, features_t, rows, k):
+    """Neighbors of the products at `rows` among all products."""
+    similarities = (features[rows] @ features_t).toarray()
+    similarities[np.arange(len(rows)), rows] = -np.inf  # a product is not its own neighbor
+    return _pad(*_top_k(similarities, min(k, similarities.shape[1])), k)
+
+
+def build_neighbors(features, k=DEFAULT_NEIGHBORS, block_elements=BLOCK_ELEMENTS):
+    """
+    Top-`k` cosine neighbors of every row of `features`.
+    Returns (indices, scores), both shaped (rows x k).
+    """
+    features = normalize(csr_matrix(features, dtype=np.float32))
+    features_t = features.T.tocsr()
+    n_products = features.shape[0]
+    indices = np.full((n_products, k), -1, dtype=np.int32)
+    scores = np.zeros((n_products, k), dtype=np.float32)
+    step = _block_rows(n_products, block_elements)
+    for start in range(0, n_products, step):
+        rows = np.arange(start, min(start + step, n_products))
+        indices[rows], scores[rows] = _block_neighbors(features, features_t, rows, k)
+    return indices, scores
+
+
+def update_neighbors(features, indices, scores, changed, stale=(), block_elements=BLOCK_ELEMENTS):
+    """
+    Update a neighbor table after the feature rows `changed` were replaced
+    or appended. `indices`/`scores` describe the previous rows; rows beyond
+    them are new products. Returns the new (indices, scores).
+
+    Changed rows, rows that listed a changed product as a neighbor (its
+    similarity may have dropped) and the `stale` rows (e.g. ones that lost
+    a neighbor to a deleted product) are recomputed against the whole
+    catalog. For every other row only the changed products are
+    candidates, merged into the existing list.
+    """
+    features = normalize(csr_matrix(features, dtype=np.float32))
+    n_products, k = features.shape[0], indices.shape[1]
+    changed = np.unique(np.asarray(changed, dtype=np.int64))
+    stale = np.asarray(stale, dtype=np.int64)
+    if n_products > len(indices):
+        extra = n_products - len(indices)
+        indices = np.vstack([indices, np.full((extra, k), -1, dtype=np.int32)])
+        scores = np.vstack([scores, np.zeros((extra, k), dtype=np.float32)])
+        changed = np.union1d(changed, np.arange(n_products - extra, n_products))
+    else:
+        indices, scores = indices.copy(), scores.copy()
+    if len(changed) == 0 and len(stale) == 0:
+        return indices, scores
+
+    outdated = np.isin(indices, changed).any(axis=1)
+    outdated[stale] = True
+    outdated[changed] = True
+    recompute = np.flatnonzero(outdated)
+    features_t = features.T.tocsr()
+    step = _block_rows(n_products, block_elements)
+    for start in range(0, len(recompute), step):
+        rows = recompute[start:start + step]
+        indices[rows], scores[rows] = _block_neighbors(features, features_t, rows, k)
+
+    # Every other row: could a changed product now enter its top K?
+    rest = np.flatnonzero(~outdated)
+    if len(rest) and len(changed):
+        changed_features = features[changed]
+        step = _block_rows(k + len(changed), block_elements)
+        for start in range(0, len(rest), step):
+            rows = rest[start:start + step]
+            candidates = (changed_features @ features_t[:, rows]).T.toarray()  # rows x changed
+            merged_indices = np.hstack([indices[rows], np.broadcast_to(changed, candidates.shape)])
+            merged_scores = np.hstack([
+                np.where(indices[rows] >= 0, scores[rows], -np.inf),
+                candidates,
+            ])
+            top, top_scores = _top_k(merged_scores, k)
+            indices[rows], scores[rows] = _pad(merged_indices[np.arange(len(rows))[:, None], top], top_scores, k)
+    return indices, scores
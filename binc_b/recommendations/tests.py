@@ -1,6 +1,40 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework.test import APIClient
-from core.models import User, Product
+from scipy.sparse import random as sparse_random, vstack
+from sklearn.metrics.pairwise import cosine_similarity
+
+from core.counters import counters
+from core.models import User, Owner, Shop, Category, Product
+from products.models import CacheVersion
+
+from . import ai_services, ann, caching, model_store
+from .ai_services import AIRecommendationService, build_interaction_matrix, fold_in, product_key
+from .ann import build_ivf, exact_search, ivf_search
+from .compaction import compact_behavior_logs
+from .ingestion import BehaviorEvent, BehaviorIngestor, behavior_ingestor, write_events
+from .models import ProductRecommendation, UserBehaviorDaily, UserBehaviorLog, UserRecommendationSet
+from .precompute import collaborative_top_n, precompute_recommendations
+from .similarity import build_neighbors, update_neighbors
+from .training import load_interactions, train_recommenders, update_content_index
+
 
 class RecommendationTests(TestCase):
     def setUp(self):
@@ -27,3 +61,570 @@ class RecommendationTests(TestCase):
         self.assertIsInstance(response.data['liked'], list)
         self.assertIsInstance(response.data['new'], list)
         self.assertIsInstance(response.data['popular'], list)
+
+
+def create_product(name, **kwargs):
+    owner_user = User.objects.create_user(username=f'owner-{name}', password='pass', user_type='owner')
+    owner = Owner.objects.create(user=owner_user, email=f'{owner_user.username}@example.com', password='pass')
+    shop = Shop.objects.create(name=f'{name} shop', owner=owner, address='Riyadh',
+                               logo='shop_logos/logo.png', url='https://example.com')
+    category, _ = Category.objects.get_or_create(name='Phones')
+    kwargs.setdefault('price', 100)
+    kwargs.setdefault('rating', 0)
+    return Product.objects.create(name=name, shop=shop, category=category, **kwargs)
+
+
+@override_settings(BEHAVIOR_INGESTION={'ASYNC': False}, COUNTERS={'ASYNC': False})
+class UserBehaviorIngestionTest(TestCase):
+    url = '/api/recommendations/track-behavior/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='shopper', password='pass')
+        self.client.force_authenticate(user=self.user)
+        self.product = create_product('Phone')
+
+    def track(self, action, product_id=None):
+        return self.client.post(self.url, {
+            'product_id': str(product_id or self.product.id), 'action': action
+        }, format='json')
+
+    def test_events_are_accepted_and_written(self):
+        # Counter deltas are applied when the batch commits
+        with self.captureOnCommitCallbacks(execute=True):
+            for action in ('view', 'view', 'like'):
+                self.assertEqual(self.track(action).status_code, 202)
+
+        # Counts are pending until the counters are flushed
+        self.product.refresh_from_db()
+        self.assertEqual(counters.value(self.product, 'views'), 2)
+        counters.flush()
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.views, self.product.likes), (2, 1))
+        self.assertEqual(UserBehaviorLog.objects.filter(user=self.user).count(), 3)
+        recommendation = ProductRecommendation.objects.get(user=self.user, product=self.product)
+        self.assertEqual(recommendation.score, 3.0)
+
+    def test_invalid_events(self):
+        self.assertEqual(self.track('share').status_code, 400)
+        self.assertEqual(self.track('view', 'not-a-uuid').status_code, 404)
+        # Unknown products are dropped when the batch is written
+        self.assertEqual(self.track('view', uuid.uuid4()).status_code, 202)
+        self.assertFalse(UserBehaviorLog.objects.exists())
+
+    def test_batch_write_cost_does_not_grow_with_events(self):
+        products = [create_product(f'Phone {i}') for i in range(20)]
+        users = [User.objects.create_user(username=f'user{i}', password='pass') for i in range(5)]
+
+        def batch(n):
+            return [BehaviorEvent(users[i % 5].id, products[i % 20].id, ('view', 'like', 'purchase')[i % 3])
+                    for i in range(n)]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            write_events(batch(6))
+            # Both batches update some recommendations and create others
+            with CaptureQueriesContext(connection) as few:
+                write_events(batch(12))
+            with CaptureQueriesContext(connection) as many:
+                write_events(batch(120))
+        self.assertEqual(len(few), len(many))
+        counters.flush()
+        self.assertEqual(Product.objects.get(pk=products[0].pk).views, 4)
+
+
+class BehaviorIngestorTest(TestCase):
+    def test_full_queue_applies_backpressure(self):
+        ingestor = BehaviorIngestor(writer=len)
+        with override_settings(BEHAVIOR_INGESTION={'MAX_QUEUE_SIZE': 2, 'ENQUEUE_TIMEOUT': 0.01}):
+            ingestor.queue.put_nowait(None)
+            ingestor.queue.put_nowait(None)
+            self.assertFalse(ingestor.submit(1, 'product', 'view'))
+            self.assertEqual(ingestor.flush(), 2)
+
+    def test_worker_flushes_batches_and_on_stop(self):
+        written = []
+        ingestor = BehaviorIngestor(writer=lambda events: written.extend(events) or len(events))
+        config = {'ASYNC': True, 'BATCH_SIZE': 3, 'FLUSH_INTERVAL': 60}
+        with override_settings(BEHAVIOR_INGESTION=config):
+            for i in range(3):
+                self.assertTrue(ingestor.submit(i, 'product', 'view'))
+            # A full batch wakes the worker before the flush interval
+            for _ in range(100):
+                if len(written) == 3:
+                    break
+                time.sleep(0.02)
+            self.assertEqual(len(written), 3)
+
+            ingestor.submit(4, 'product', 'like')
+            ingestor.stop()
+        self.assertEqual([event.user_id for event in written], [0, 1, 2, 4])
+
+    def test_failed_batches_are_retried_then_kept(self):
+        failures = [2]
+
+        def flaky(events):
+            if failures[0]:
+                failures[0] -= 1
+                raise RuntimeError('database is locked')
+            return len(events)
+
+        config = {'ASYNC': False, 'RETRIES': 2, 'RETRY_BACKOFF': 0}
+        with override_settings(BEHAVIOR_INGESTION=config), \
+                self.assertLogs('recommendations.ingestion', 'WARNING'):
+            ingestor = BehaviorIngestor(writer=flaky)
+            self.assertTrue(ingestor.submit(1, 'product', 'view'))
+            self.assertEqual(ingestor.pending(), 0)
+
+            # Every attempt fails: the events wait on the queue for the next flush
+            failures[0] = 10
+            ingestor.queue.put_nowait(None)
+            ingestor.queue.put_nowait(None)
+            self.assertEqual(ingestor.flush(), 0)
+            self.assertEqual(ingestor.pending(), 2)
+            failures[0] = 0
+            self.assertEqual(ingestor.flush(), 2)
+
+    def test_rolled_back_batch_leaves_counters_alone(self):
+        user = User.objects.create_user(username='shopper', password='pass')
+        product = create_product('Phone')
+
+        with self.captureOnCommitCallbacks(execute=True), \
+                mock.patch('recommendations.models.ProductRecommendation.objects.bulk_update',
+                           side_effect=RuntimeError('database is locked')):
+            with self.assertRaises(RuntimeError):
+                write_events([BehaviorEvent(user.id, product.id, 'view')])
+        self.assertEqual(counters.pending(Product, product.pk), {})
+
+
+class BehaviorLogCompactionTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='shopper', password='pass')
+        self.products = [create_product(f'Phone {i}') for i in range(3)]
+        self.now = timezone.now()
+
+        def log(product, action, days_ago):
+            entry = UserBehaviorLog.objects.create(user=self.user, product=product, action=action)
+            UserBehaviorLog.objects.filter(pk=entry.pk).update(timestamp=self.now - timedelta(days=days_ago))
+
+        for _ in range(3):
+            log(self.products[0], 'view', 40)
+        log(self.products[1], 'view', 40)
+        log(self.products[1], 'like', 35)
+        log(self.products[2], 'view', 1)
+
+    def test_old_events_roll_into_daily_aggregates(self):
+        self.assertEqual(compact_behavior_logs(30, now=self.now), (5, 3))
+        self.assertEqual(UserBehaviorLog.objects.count(), 1)
+        counts = dict(((row.product_id, row.action), row.count) for row in UserBehaviorDaily.objects.all())
+        self.assertEqual(counts, {
+            (self.products[0].id, 'view'): 3,
+            (self.products[1].id, 'view'): 1,
+            (self.products[1].id, 'like'): 1,
+        })
+
+        # A late event for a compacted day is added to the existing count
+        late = UserBehaviorLog.objects.create(user=self.user, product=self.products[0], action='view')
+        UserBehaviorLog.objects.filter(pk=late.pk).update(timestamp=self.now - timedelta(days=40))
+        compact_behavior_logs(30, now=self.now)
+        self.assertEqual(UserBehaviorDaily.objects.get(product=self.products[0]).count, 4)
+
+    def test_recent_products_fall_back_to_aggregates(self):
+        compact_behavior_logs(30, now=self.now)
+        self.assertEqual(UserBehaviorLog.recent_product_ids(self.user, 'view', 20),
+                         [self.products[2].id, self.products[0].id, self.products[1].id])
+        self.assertEqual(UserBehaviorLog.recent_product_ids(self.user, 'view', 1), [self.products[2].id])
+        self.assertEqual(UserBehaviorLog.recent_product_ids(self.user, 'like', 10), [self.products[1].id])
+
+
+class RecommenderModelTestCase(TestCase):
+    """Four users with overlapping interactions and a temporary model directory."""
+
+    def setUp(self):
+        self.model_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.model_dir, ignore_errors=True)
+
+        users = [User.objects.create_user(username=f'user{i}', password='pass') for i in range(4)]
+        products = [create_product(f'Phone {i}', description=f'Smartphone model {i} with camera')
+                    for i in range(5)]
+        for i, user in enumerate(users):
+            for product in products[i:i + 3]:
+                ProductRecommendation.objects.create(user=user, product=product, score=1.0 + i)
+
+
+class TrainRecommendersTest(RecommenderModelTestCase):
+    def test_training_publishes_a_loadable_version(self):
+        version = train_recommenders(model_dir=self.model_dir)
+        self.assertEqual(model_store.current_version(self.model_dir), version)
+        self.assertTrue(os.path.exists(os.path.join(model_store.version_path(self.model_dir, version), 'manifest.json')))
+        # No staging directory is left behind
+        self.assertEqual(os.listdir(model_store.versions_dir(self.model_dir)), [version])
+
+        service = AIRecommendationService(model_dir=self.model_dir)
+        self.assertTrue(service.is_ready)
+        self.assertEqual(service.version, version)
+
+    def test_interactions_stream_into_the_matrix(self):
+        interactions = load_interactions(chunk_size=2)
+        self.assertEqual(len(interactions), ProductRecommendation.objects.count())
+        self.assertEqual(str(interactions['product_id'].dtype), 'category')
+
+        user_ids, product_ids, matrix = build_interaction_matrix(interactions)
+        self.assertEqual(list(product_ids), sorted(product_ids))
+        self.assertEqual(matrix.shape, (4, 5))
+        for rec in ProductRecommendation.objects.all():
+            row = list(user_ids).index(rec.user_id)
+            column = list(product_ids).index(product_key(rec.product_id))
+            self.assertEqual(matrix[row, column], rec.score)
+
+    def test_old_versions_are_pruned(self):
+        versions = [train_recommenders(model_dir=self.model_dir, keep=2) for _ in range(3)]
+        self.assertEqual(sorted(os.listdir(model_store.versions_dir(self.model_dir))), versions[1:])
+        self.assertEqual(model_store.current_version(self.model_dir), versions[-1])
+
+    def test_handlers_never_train(self):
+        service = AIRecommendationService(model_dir=self.model_dir)
+        self.assertFalse(service.is_ready)
+        client = APIClient()
+        client.force_authenticate(user=User.objects.get(username='user0'))
+        with mock.patch('recommendations.views.get_recommendation_service', return_value=service), \
+                mock.patch.object(service, 'train_collaborative_filtering') as train_cf, \
+                mock.patch.object(service, 'train_content_based_filtering') as train_cb:
+            response = client.get('/api/recommendations/')
+            hybrid = client.get('/api/recommendations/hybrid/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data), {'preferred', 'liked', 'new', 'popular'})
+        self.assertEqual(hybrid.status_code, 200)
+        train_cf.assert_not_called()
+        train_cb.assert_not_called()
+
+
+class ModelBundleTest(RecommenderModelTestCase):
+    def test_published_bundle_restores_the_full_state(self):
+        train_recommenders(model_dir=self.model_dir)
+        service = AIRecommendationService(model_dir=self.model_dir)
+        self.assertIsInstance(service.item_factors, np.memmap)
+        self.assertEqual(service.user_item_matrix.shape, (4, 5))
+
+        user = User.objects.get(username='user0')
+        seen = set(ProductRecommendation.objects.filter(user=user).values_list('product_id', flat=True))
+        recommended = service.get_collaborative_recommendations(user.id, n=10)
+        self.assertEqual(len(recommended), 2)
+        self.assertFalse(seen & set(recommended))
+
+        self.assertEqual(service.content_neighbors.shape[0], 5)
+        product = Product.objects.get(name='Phone 0')
+        similar = service.get_content_based_recommendations(product.id, n=2)
+        self.assertEqual(len(similar), 2)
+        self.assertNotIn(product.id, similar)
+
+
+class ApproximateCollaborativeSearchTest(RecommenderModelTestCase):
+    ANN = {'ENABLED': True, 'MIN_ITEMS': 0, 'LISTS': 6, 'PROBES': 1}
+
+    def setUp(self):
+        super().setUp()
+        # Enough products for several IVF lists, so probing one of them is
+        # an actual approximation
+        rng = np.random.default_rng(0)
+        products = [create_product(f'Tablet {i}', description=f'Tablet model {i}') for i in range(60)]
+        users = list(User.objects.all())
+        for user in users:
+            for product in rng.choice(products, 8, replace=False):
+                ProductRecommendation.objects.create(user=user, product=product, score=float(rng.integers(1, 6)))
+
+    def test_probed_lists_are_searched(self):
+        with override_settings(RECOMMENDER_ANN=self.ANN):
+            train_recommenders(model_dir=self.model_dir)
+            service = AIRecommendationService(model_dir=self.model_dir)
+            state = service.state
+            user = User.objects.get(username='user0')
+            query, liked = service.user_vector(state, user.id)
+            expected = ann.ivf_search(state.item_factors, state.ann_centroids, state.ann_offsets,
+                                      state.ann_items, query, 3, probes=1, exclude=liked)
+            self.assertEqual(len(expected), 3)
+            self.assertEqual(len(state.ann_offsets) - 1, 6)
+
+            with mock.patch.object(ann, 'exact_search', wraps=ann.exact_search) as exact_search:
+                approximate = service.get_collaborative_recommendations(user.id, n=3)
+            exact_search.assert_not_called()
+            self.assertEqual(approximate, [uuid.UUID(state.product_ids[row]) for row in expected])
+
+            # Probing every list is the exact search
+            with override_settings(RECOMMENDER_ANN={**self.ANN, 'PROBES': 6}):
+                self.assertEqual(service.get_collaborative_recommendations(user.id, n=10),
+                                 service.get_collaborative_recommendations(user.id, n=10, exact=True))
+
+
+class ContentIndexUpdateTest(RecommenderModelTestCase):
+    def test_content_index_follows_catalog_changes(self):
+        first = train_recommenders(model_dir=self.model_dir)
+        self.assertIsNone(update_content_index(model_dir=self.model_dir))
+
+        newcomer = create_product('Phone 9', description='Smartphone model 0 with camera')
+        Product.objects.filter(name='Phone 1').update(description='Tablet with keyboard')
+        Product.objects.filter(name='Phone 4').delete()
+        version = update_content_index(model_dir=self.model_dir)
+        self.assertNotEqual(version, first)
+
+        service = AIRecommendationService(model_dir=self.model_dir)
+        state = service.state
+        self.assertEqual(service.version, version)
+        self.assertEqual(list(state.content_product_ids),
+                         sorted(product_key(pk) for pk in Product.objects.values_list('id', flat=True)))
+        # The neighbor table matches a full rebuild over the updated rows
+        neighbors, scores = build_neighbors(state.content_features, k=state.content_neighbors.shape[1])
+        np.testing.assert_allclose(state.content_neighbor_scores, scores, atol=1e-6)
+        np.testing.assert_array_equal(np.sort(state.content_neighbors, axis=1), np.sort(neighbors, axis=1))
+        self.assertEqual(len(service.get_content_based_recommendations(newcomer.id, n=3)), 3)
+
+
+class FoldInTest(RecommenderModelTestCase):
+    @override_settings(BEHAVIOR_INGESTION={'ASYNC': False}, COUNTERS={'ASYNC': False})
+    def test_users_missing_from_the_model_are_folded_in(self):
+        train_recommenders(model_dir=self.model_dir)
+        service = AIRecommendationService(model_dir=self.model_dir)
+        state = service.state
+        self.addCleanup(cache.clear)
+
+        # Folding in a trained user against the final item factors lands
+        # close to the factors training gave them
+        matrix = state.user_item_matrix
+        row = matrix.getrow(0)
+        vector = fold_in(state.item_factors, state.item_gramian, row.indices, row.data,
+                         state.meta['regularization'])
+        trained = state.user_factors[0]
+        self.assertGreater(vector @ trained / np.linalg.norm(vector) / np.linalg.norm(trained), 0.9)
+
+        newcomer = User.objects.create_user(username='newcomer', password='pass')
+        self.assertEqual(service.get_collaborative_recommendations(newcomer.id), [])
+        phone = Product.objects.get(name='Phone 0')
+        behavior_ingestor.submit(newcomer.id, phone.id, 'like')
+        recommended = service.get_collaborative_recommendations(newcomer.id, n=3)
+        self.assertEqual(len(recommended), 3)
+        self.assertNotIn(phone.id, recommended)
+
+        # Served from the cache until the user's interactions change; only
+        # the user's version row is read
+        with self.assertNumQueries(1):
+            self.assertEqual(service.get_collaborative_recommendations(newcomer.id, n=3), recommended)
+        behavior_ingestor.submit(newcomer.id, Product.objects.get(name='Phone 4').id, 'purchase')
+        self.assertEqual(len(service.get_collaborative_recommendations(newcomer.id, n=3)), 3)
+        self.assertEqual(len(service.user_vector(state, newcomer.id)[1]), 2)
+
+
+class PrecomputedRecommendationsTest(RecommenderModelTestCase):
+    @override_settings(BEHAVIOR_INGESTION={'ASYNC': False}, COUNTERS={'ASYNC': False})
+    def test_precomputed_recommendations_are_served_until_stale(self):
+        users = list(User.objects.filter(username__startswith='user').order_by('username'))
+        phones = list(Product.objects.order_by('name'))
+        for user, phone in zip(users, phones):
+            UserBehaviorLog.objects.create(user=user, product=phone, action='view')
+        train_recommenders(model_dir=self.model_dir)
+        self.assertEqual(precompute_recommendations(model_dir=self.model_dir, block_size=3), 4)
+
+        service = AIRecommendationService(model_dir=self.model_dir)
+        for user, phone in zip(users, phones):
+            stored = UserRecommendationSet.objects.get(user=user)
+            self.assertEqual(stored.model_version, service.version)
+            expected = service.get_personalized_recommendations(user.id, {'viewed_products': [phone.id]})
+            self.assertEqual(stored.preferred, [str(pk) for pk in expected['preferred']])
+            self.assertEqual(stored.liked, [str(pk) for pk in expected['liked']])
+
+        client = APIClient()
+        client.force_authenticate(user=users[0])
+        with mock.patch('recommendations.views.get_recommendation_service', return_value=service), \
+                mock.patch.object(service, 'get_personalized_recommendations',
+                                  wraps=service.get_personalized_recommendations) as personalize:
+            self.assertEqual(client.get('/api/recommendations/').status_code, 200)
+            personalize.assert_not_called()
+
+            # New behavior makes the stored set stale; the next request recomputes it
+            behavior_ingestor.submit(users[0].id, phones[3].id, 'like')
+            self.assertTrue(UserRecommendationSet.objects.get(user=users[0]).stale)
+            self.assertEqual(client.get('/api/recommendations/').status_code, 200)
+            personalize.assert_called_once()
+        self.assertFalse(UserRecommendationSet.objects.get(user=users[0]).stale)
+
+
+    def test_detail_page_views_keep_the_stored_set(self):
+        user = User.objects.get(username='user0')
+        phone = Product.objects.get(name='Phone 4')
+        UserRecommendationSet.store({user.id: {'preferred': [phone.id]}}, 'v1')
+        version = caching.user_version(user.id, 'v1')
+
+        write_events([BehaviorEvent(user.id, phone.id, 'view', log_only=True)])
+        self.assertFalse(UserRecommendationSet.objects.get(user=user).stale)
+        self.assertEqual(caching.user_version(user.id, 'v1'), version)
+
+        write_events([BehaviorEvent(user.id, phone.id, 'like')])
+        self.assertTrue(UserRecommendationSet.objects.get(user=user).stale)
+        self.assertNotEqual(caching.user_version(user.id, 'v1'), version)
+
+class CollaborativeTopNTest(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.state = SimpleNamespace(
+            user_factors=rng.normal(size=(30, 8)),
+            item_factors=rng.normal(size=(50, 8)),
+            user_item_matrix=sparse_random(30, 50, density=0.1, format='csr', random_state=1),
+        )
+
+    def test_blocks_match_a_single_product(self):
+        rows = np.arange(30)
+        whole = collaborative_top_n(self.state, rows, 10)
+        np.testing.assert_array_equal(collaborative_top_n(self.state, rows, 10, block_elements=120), whole)
+
+        seen = self.state.user_item_matrix.tocoo()
+        self.assertFalse(np.isin(seen.col[seen.row == 0], whole[0]).any())
+
+
+class RecommendationResponseCacheTest(RecommenderModelTestCase):
+    @override_settings(BEHAVIOR_INGESTION={'ASYNC': False}, COUNTERS={'ASYNC': False})
+    def test_responses_are_cached_until_the_user_acts(self):
+        train_recommenders(model_dir=self.model_dir)
+        service = AIRecommendationService(model_dir=self.model_dir)
+        cache.clear()
+        self.addCleanup(cache.clear)
+        first, second = (APIClient(), APIClient())
+        first.force_authenticate(user=User.objects.get(username='user0'))
+        second_user = User.objects.get(username='user1')
+        second.force_authenticate(user=second_user)
+
+        with mock.patch('recommendations.views.get_recommendation_service', return_value=service):
+            response = first.get('/api/recommendations/')
+            hybrid = first.get('/api/recommendations/hybrid/')
+            # Repeat loads only read the user's version row, and never the models
+            with self.assertNumQueries(2), \
+                    mock.patch.object(service, 'get_hybrid_recommendations') as hybrid_model:
+                self.assertEqual(first.get('/api/recommendations/').data, response.data)
+                self.assertEqual(first.get('/api/recommendations/hybrid/').data, hybrid.data)
+            hybrid_model.assert_not_called()
+
+            # Another user's first load reuses the shared new/popular lists
+            with mock.patch('recommendations.views.popular_products_data') as popular:
+                self.assertEqual(second.get('/api/recommendations/').data['popular'], response.data['popular'])
+            popular.assert_not_called()
+
+            # Recording behavior drops only that user's cached responses
+            phone = Product.objects.get(name='Phone 4')
+            self.assertEqual(first.post('/api/recommendations/track-behavior/',
+                                        {'product_id': str(phone.id), 'action': 'like'}).status_code, 202)
+            with mock.patch.object(service, 'get_hybrid_recommendations', return_value=[]) as hybrid_model:
+                self.assertEqual(first.get('/api/recommendations/hybrid/').data, [])
+                with self.assertNumQueries(1):
+                    second.get('/api/recommendations/')
+            hybrid_model.assert_called_once()
+
+            # Behavior recorded through another worker only bumps the shared
+            # version row; this process's cached entry is ignored all the same
+            CacheVersion.bump(caching.user_version_key(second_user.id))
+            with mock.patch.object(service, 'get_hybrid_recommendations', return_value=[]) as hybrid_model:
+                second.get('/api/recommendations/hybrid/')
+                second.get('/api/recommendations/hybrid/')
+            hybrid_model.assert_called_once()
+
+
+class ModelHotSwapTest(RecommenderModelTestCase):
+    @override_settings(RECOMMENDER_REFRESH_INTERVAL=0)
+    def test_new_version_is_hot_swapped(self):
+        first = train_recommenders(model_dir=self.model_dir, keep=1)
+        service = AIRecommendationService(model_dir=self.model_dir)
+        old_state = service.state
+
+        newcomer = User.objects.create_user(username='newcomer', password='pass')
+        ProductRecommendation.objects.create(user=newcomer, product=Product.objects.get(name='Phone 0'), score=2.0)
+        self.assertIsNone(service.state.user_index(newcomer.id))
+
+        second = train_recommenders(model_dir=self.model_dir, keep=1)
+        self.assertTrue(service.refresh())
+        self.assertEqual(service.version, second)
+        self.assertIsNotNone(service.state.user_index(newcomer.id))
+
+        # A request still holding the old state keeps reading it, even though
+        # the old version was pruned from disk
+        self.assertEqual(old_state.version, first)
+        self.assertEqual(len(old_state.user_ids), 4)
+        self.assertEqual(old_state.item_factors.shape[0], 5)
+
+
+class LazyRecommendationServiceTest(TestCase):
+    def test_url_conf_does_not_load_ai_dependencies(self):
+        code = (
+            "import django, json, sys; django.setup();"
+            "import binc_b.urls;"
+            "print(json.dumps(sorted(m for m in ('numpy', 'pandas', 'scipy', 'sklearn', 'implicit', 'nltk',"
+            " 'recommendations.ai_services') if m in sys.modules)))"
+        )
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'binc_b.settings', 'RECOMMENDER_WARMUP': ''}
+        result = subprocess.run([sys.executable, '-c', code], cwd=settings.BASE_DIR, env=env,
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(json.loads(result.stdout.strip().splitlines()[-1]), [])
+
+    def test_service_is_created_once_on_first_use(self):
+        with mock.patch.object(ai_services, '_service', None), \
+                mock.patch.object(ai_services, 'AIRecommendationService') as service_class:
+            service_class.assert_not_called()
+            first = ai_services.get_recommendation_service()
+            self.assertIs(ai_services.recommendation_service, first)
+        service_class.assert_called_once_with()
+
+
+class ContentNeighborsTest(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.features = sparse_random(60, 40, density=0.2, format='csr', random_state=rng, dtype=np.float32)
+
+    def exact(self, features, k):
+        similarities = cosine_similarity(features)
+        np.fill_diagonal(similarities, -np.inf)
+        return np.sort(similarities, axis=1)[:, ::-1][:, :k]
+
+    def test_blocked_top_k_matches_brute_force(self):
+        indices, scores = build_neighbors(self.features, k=5, block_elements=100)
+        self.assertEqual(indices.shape, (60, 5))
+        np.testing.assert_allclose(scores, self.exact(self.features, 5), atol=1e-5)
+        self.assertFalse((indices == np.arange(60)[:, None]).any())
+
+    def test_short_catalog_is_padded(self):
+        indices, _ = build_neighbors(self.features[:3], k=5)
+        self.assertEqual(indices.shape, (3, 5))
+        self.assertTrue((indices[:, 2:] == -1).all())
+
+    def test_incremental_update_matches_rebuild(self):
+        indices, scores = build_neighbors(self.features, k=5)
+        features = self.features.tolil()
+        features[[3, 17]] = sparse_random(2, 40, density=0.3, random_state=1, dtype=np.float32).toarray()
+        new_rows = sparse_random(4, 40, density=0.3, format='csr', random_state=2, dtype=np.float32)
+        features = vstack([features.tocsr(), new_rows]).tocsr()
+
+        updated_indices, updated_scores = update_neighbors(features, indices, scores, [3, 17], block_elements=100)
+        self.assertEqual(updated_indices.shape, (64, 5))
+        np.testing.assert_allclose(updated_scores, self.exact(features, 5), atol=1e-5)
+
+
+class ItemFactorIndexTest(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        centers = rng.normal(size=(20, 16))
+        self.items = (centers[rng.integers(0, 20, 2000)] + 0.3 * rng.normal(size=(2000, 16))).astype(np.float32)
+        self.queries = rng.normal(size=(50, 16)).astype(np.float32)
+
+    def test_index_groups_every_item_once(self):
+        centroids, offsets, items = build_ivf(self.items, n_lists=30)
+        self.assertEqual(centroids.shape, (30, 16))
+        self.assertEqual(offsets[-1], 2000)
+        self.assertEqual(sorted(items), list(range(2000)))
+
+    def test_search_recall(self):
+        index = build_ivf(self.items, n_lists=30)
+        exclude = np.arange(0, 2000, 7)
+        hits = 0
+        for query in self.queries:
+            expected = exact_search(self.items, query, 10, exclude=exclude)
+            found = ivf_search(self.items, *index, query, 10, probes=8, exclude=exclude)
+            self.assertFalse(np.isin(found, exclude).any())
+            hits += len(np.intersect1d(expected, found))
+            # Probing every list is exact
+            np.testing.assert_array_equal(ivf_search(self.items, *index, query, 10, probes=30, exclude=exclude),
+                                          expected)
+        self.assertGreater(hits / (10 * len(self.queries)), 0.9)
@@ -0,0 +1,134 @@
+"""
+Offline training of the recommendation models.
+
+train_recommenders() reads the interaction and product tables, trains the
+collaborative and content-based models on a fresh service instance, writes
+the artifacts to a staging directory and publishes them as a new version.
+It runs from `manage.py train_recommenders` (cron or any job scheduler),
+never inside a request.
+
+update_content_index() is the cheap variant to run between full trainings:
+it takes the published version, brings its content model up to date with
+new, edited and deleted products and publishes the result.
+"""
+import logging
+import shutil
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from . import model_store
+from .ai_services import AIRecommendationService, MODEL_DIR
+from .model_store import ModelState
+
+logger = logging.getLogger(__name__)
+
+# Interaction rows fetched from the database per round trip
+INTERACTION_CHUNK_SIZE = 100000
+
+
+def load_interactions(chunk_size=INTERACTION_CHUNK_SIZE):
+    """
+    Stream every (user_id, product_id, score) row into a DataFrame, one
+    chunk at a time. Rows are never all held as Python objects: each chunk
+    is packed into typed arrays, and product ids become a categorical
+    column so every distinct UUID is stored once.
+    """
+    from .models import ProductRecommendation
+
+    rows = ProductRecommendation.objects.order_by().values_list(
+        'user_id', 'product_id', 'score'
+    ).iterator(chunk_size=chunk_size)
+
+    users, product_codes, scores = [], [], []
+    categories = {}
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        chunk_users, chunk_products, chunk_scores = zip(*chunk)
+        users.append(np.fromiter(chunk_users, dtype=np.int64, count=len(chunk)))
+        scores.append(np.fromiter(chunk_scores, dtype=np.float32, count=len(chunk)))
+        # Codes are local to the chunk; map its distinct products to global codes
+        codes, uniques = pd.factorize(np.array(chunk_products, dtype=object))
+        remap = np.array([categories.setdefault(p, len(categories)) for p in uniques], dtype=np.int32)
+        product_codes.append(remap[codes])
+
+    def joined(parts, dtype):
+        return np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+
+    return pd.DataFrame({
+        'user_id': joined(users, np.int64),
+        'product_id': pd.Categorical.from_codes(joined(product_codes, np.int32), categories=list(categories)),
+        'score': joined(scores, np.float32),
+    })
+
+
+def load_products():
+    from core.models import Product
+
+    products = Product.objects.values('id', 'name', 'description', 'category__name', 'brand__name')
+    products_df = pd.DataFrame(list(products),
+                               columns=['id', 'name', 'description', 'category__name', 'brand__name'])
+    products_df.rename(columns={'category__name': 'category', 'brand__name': 'brand'}, inplace=True)
+    return products_df
+
+
+def train_recommenders(model_dir=MODEL_DIR, keep=3):
+    """
+    Train every model and publish the result. Returns the published version
+    name, or None when there was nothing to train on.
+    """
+    service = AIRecommendationService(model_dir=model_dir, autoload=False)
+
+    interactions = load_interactions()
+    products = load_products()
+    trained = False
+    if not interactions.empty:
+        trained |= bool(service.train_collaborative_filtering(interactions))
+    if not products.empty:
+        trained |= bool(service.train_content_based_filtering(products))
+    if not trained:
+        logger.warning("No recommendation model was trained; nothing published")
+        return None
+
+    return publish_service(service, model_dir, keep)
+
+
+def update_content_index(model_dir=MODEL_DIR, keep=3):
+    """
+    Update the content model of the published version for catalog changes
+    and publish the result. Returns the new version name, or None when
+    nothing changed or there is no content model to update (run a full
+    training then).
+    """
+    current = model_store.current_version(model_dir)
+    if current is None:
+        logger.warning("No published recommendation models to update")
+        return None
+    service = AIRecommendationService(model_dir=model_dir, autoload=False)
+    service.state = ModelState.load(model_store.version_path(model_dir, current), current)
+
+    products = load_products()
+    if products.empty:
+        return None
+    updated = service.update_content_based_filtering(products)
+    if not updated:
+        if updated is None:
+            logger.warning("The published models cannot be updated incrementally; run a full training")
+        return None
+    return publish_service(service, model_dir, keep)
+
+
+def publish_service(service, model_dir, keep):
+    staging = model_store.staging_dir(model_dir)
+    try:
+        service.save_models(staging)
+        version = model_store.publish(model_dir, staging)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    model_store.prune(model_dir, keep=keep)
+    logger.info(f"Published recommendation models version {version}")
+    return version
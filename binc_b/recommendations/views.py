@@ -1,3 +1,5 @@
+import uuid
+
 from django.utils.timezone import now
 from datetime import timedelta
 from rest_framework.views import APIView
@@ -7,15 +9,45 @@ from rest_framework.permissions import IsAuthenticated
 from core.models import Product, User
 from reviews.models import Review
 from .serializers import ProductSerializer
-from .models import ProductRecommendation, UserBehaviorLog
+from .models import ProductRecommendation, UserBehaviorLog, UserRecommendationSet
+from .ingestion import behavior_ingestor, ACTION_SCORES
+from . import caching
 
-# AI services
-from .ai_services import recommendation_service
-import pandas as pd
 import logging
 
 # Configure logging
 logger = logging.getLogger(__name__)
+
+
+def new_products_data():
+    # New products (last 30 days)
+    new_products = Product.objects.filter(created_at__gte=now() - timedelta(days=30))[:10]
+    return ProductSerializer(new_products, many=True).data
+
+
+def popular_products_data():
+    # Most popular products (based on views)
+    return ProductSerializer(Product.objects.order_by('-views')[:10], many=True).data
+
+
+def shared_lists():
+    """
+    The `new` and `popular` lists are the same for every user; they come
+    from the shared cache, rebuilt at most every RECOMMENDER_SHARED_LISTS_TTL
+    seconds.
+    """
+    return {
+        "new": caching.shared_list('new', new_products_data),
+        "popular": caching.shared_list('popular', popular_products_data),
+    }
+
+
+def get_recommendation_service():
+    # AI services are imported on the first recommendation request, so workers
+    # serving only catalog traffic never load numpy, scipy or the models
+    from . import ai_services
+    return ai_services.get_recommendation_service()
+
 # -----------------------------------------------------------------------
 #                          Recommendation View
 # -----------------------------------------------------------------------
@@ -25,100 +57,75 @@ class RecommendationView(APIView):
     def get(self, request):
         user = request.user
         try:
-            # Get user behavior data
-            viewed_products = list(UserBehaviorLog.objects.filter(
-                user=user, action='view'
-            ).values_list('product_id', flat=True).order_by('-timestamp')[:20])
-
-            liked_products = list(UserBehaviorLog.objects.filter(
-                user=user, action='like'
-            ).values_list('product_id', flat=True).order_by('-timestamp')[:10])
-
-            # Prepare user data for recommendations
-            user_data = {
-                'viewed_products': viewed_products,
-                'liked_products': liked_products
-            }
-
-            # Ensure models are trained
-            self._ensure_models_trained()
-
-            # Get AI-powered personalized recommendations
-            ai_recommendations = recommendation_service.get_personalized_recommendations(
-                user.id, user_data, n=20
-            )
-
-            # Fetch preferred products from AI recommendations
-            preferred_product_ids = ai_recommendations.get('preferred', [])
-            preferred_products = Product.objects.filter(id__in=preferred_product_ids)
-
-            # Fetch liked products from AI recommendations
-            liked_product_ids = ai_recommendations.get('liked', [])
-            liked_products = Product.objects.filter(id__in=liked_product_ids)
-
-            # If AI recommendations are insufficient, fall back to basic recommendations
-            if len(preferred_products) < 5:
-                # Fallback: Preferred products based on previous interactions
-                fallback_preferred = Product.objects.filter(
-                    reviews__user=user
-                ).distinct()[:10]
-                preferred_products = list(preferred_products) + list(fallback_preferred)
-
-            if len(liked_products) < 5:
-                # Fallback: Liked products
-                fallback_liked = Product.objects.filter(
-                    likes__gt=0, reviews__user=user
-                ).distinct()[:10]
-                liked_products = list(liked_products) + list(fallback_liked)
-
-            # New products (last 30 days)
-            new_products = Product.objects.filter(
-                created_at__gte=now() - timedelta(days=30)
-            )[:10]
-
-            # Most popular products (based on views)
-            popular_products = Product.objects.order_by('-views')[:10]
-
-            # Serialize each category
-            preferred_serializer = ProductSerializer(preferred_products, many=True)
-            liked_serializer = ProductSerializer(liked_products, many=True)
-            new_serializer = ProductSerializer(new_products, many=True)
-            popular_serializer = ProductSerializer(popular_products, many=True)
+            # Models are trained offline; until one is published, serve the basic lists
+            recommendation_service = get_recommendation_service()
+            if not recommendation_service.refresh():
+                return self._get_basic_recommendations(user)
+
+            # Repeat loads are served from the cache until the user acts again
+            # or a new model version is loaded
+            version = caching.user_version(user.id, recommendation_service.version)
+            personal = caching.get_response('recommendations', user.id, version)
+            if personal is None:
+                personal = self._personal_lists(recommendation_service, user)
+                caching.set_response('recommendations', user.id, version, personal)
 
             # Return categorized recommendations
-            return Response({
-                "preferred": preferred_serializer.data,
-                "liked": liked_serializer.data,
-                "new": new_serializer.data,
-                "popular": popular_serializer.data
-            })
+            return Response({**personal, **shared_lists()})
         except Exception as e:
             logger.error(f"Error in recommendations: {e}")
             # Fallback to basic recommendations if AI fails
             return self._get_basic_recommendations(user)
 
-    def _ensure_models_trained(self):
-        """Ensure that recommendation models are trained."""
-        try:
-            # Check if we need to train the collaborative filtering model
-            if not hasattr(recommendation_service, 'als_model') or recommendation_service.als_model is None:
-                # Get all user-product interactions
-                interactions = ProductRecommendation.objects.all().values('user_id', 'product_id', 'score')
-                if interactions.exists():
-                    df = pd.DataFrame(list(interactions))
-                    recommendation_service.train_collaborative_filtering(df)
-
-            # Check if we need to train the content-based filtering model
-            if not hasattr(recommendation_service, 'tfidf_vectorizer') or recommendation_service.tfidf_vectorizer is None:
-                # Get all products with their descriptions
-                products = Product.objects.all().values('id', 'name', 'description', 'category__name', 'brand__name')
-                if products.exists():
-                    # Prepare data for content-based filtering
-                    products_df = pd.DataFrame(list(products))
-                    products_df.rename(columns={'category__name': 'category', 'brand__name': 'brand'}, inplace=True)
-                    recommendation_service.train_content_based_filtering(products_df)
-        except Exception as e:
-            logger.error(f"Error ensuring models are trained: {e}")
+    def _personal_lists(self, recommendation_service, user):
+        # Lists precomputed by the batch job, recomputed when missing or stale
+        stored = UserRecommendationSet.fresh(user, recommendation_service.version)
+        if stored is not None:
+            ai_recommendations = {'preferred': stored.preferred, 'liked': stored.liked}
+        else:
+            ai_recommendations = self._compute_recommendations(recommendation_service, user)
+
+        # Fetch preferred products from AI recommendations
+        preferred_product_ids = ai_recommendations.get('preferred', [])
+        preferred_products = Product.objects.filter(id__in=preferred_product_ids)
+
+        # Fetch liked products from AI recommendations
+        liked_product_ids = ai_recommendations.get('liked', [])
+        liked_products = Product.objects.filter(id__in=liked_product_ids)
+
+        # If AI recommendations are insufficient, fall back to basic recommendations
+        if len(preferred_products) < 5:
+            # Fallback: Preferred products based on previous interactions
+            fallback_preferred = Product.objects.filter(
+                reviews__user=user
+            ).distinct()[:10]
+            preferred_products = list(preferred_products) + list(fallback_preferred)
+
+        if len(liked_products) < 5:
+            # Fallback: Liked products
+            fallback_liked = Product.objects.filter(
+                likes__gt=0, reviews__user=user
+            ).distinct()[:10]
+            liked_products = list(liked_products) + list(fallback_liked)
+
+        return {
+            "preferred": ProductSerializer(preferred_products, many=True).data,
+            "liked": ProductSerializer(liked_products, many=True).data,
+        }
+
+    def _compute_recommendations(self, recommendation_service, user):
+        # Get user behavior data
+        user_data = {
+            'viewed_products': UserBehaviorLog.recent_product_ids(user, 'view', 20),
+            'liked_products': UserBehaviorLog.recent_product_ids(user, 'like', 10)
+        }
+
+        # Get AI-powered personalized recommendations
+        ai_recommendations = recommendation_service.get_personalized_recommendations(
+            user.id, user_data, n=20
+        )
+        UserRecommendationSet.store({user.id: ai_recommendations}, recommendation_service.version)
+        return ai_recommendations
 
     def _get_basic_recommendations(self, user):
         """Get basic recommendations without AI."""
@@ -132,26 +139,15 @@ class RecommendationView(APIView):
             likes__gt=0, reviews__user=user
         ).distinct()[:10]
 
-        # New products (last 30 days)
-        new_products = Product.objects.filter(
-            created_at__gte=now() - timedelta(days=30)
-        )[:10]
-
-        # Most popular products
-        popular_products = Product.objects.order_by('-views')[:10]
-
         # Serialize each category
         preferred_serializer = ProductSerializer(preferred_products, many=True)
         liked_serializer = ProductSerializer(liked_products, many=True)
-        new_serializer = ProductSerializer(new_products, many=True)
-        popular_serializer = ProductSerializer(popular_products, many=True)
 
         # Return categorized recommendations
         return Response({
             "preferred": preferred_serializer.data,
             "liked": liked_serializer.data,
-            "new": new_serializer.data,
-            "popular": popular_serializer.data
+            **shared_lists()
         })
 
 # -----------------------------------------------------------------------
@@ -171,54 +167,31 @@ class UserBehaviorView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        try:
-            # Get the product
-            product = Product.objects.get(id=product_id)
-
-            # Log the behavior
-            UserBehaviorLog.objects.create(
-                user=user,
-                product=product,
-                action=action
-            )
-
-            # Update product metrics
-            if action == 'view':
-                product.views = product.views + 1
-                product.save(update_fields=['views'])
-            elif action == 'like':
-                product.likes = product.likes + 1
-                product.save(update_fields=['likes'])
-
-            # Update recommendation score
-            score_mapping = {
-                'view': 1.0,
-                'like': 3.0,
-                'purchase': 5.0
-            }
-
-            # Create or update recommendation
-            recommendation, created = ProductRecommendation.objects.update_or_create(
-                user=user,
-                product=product,
-                defaults={
-                    'score': score_mapping.get(action, 1.0),
-                    'recommendation_type': 'preferred'
-                }
+        if action not in ACTION_SCORES:
+            return Response(
+                {"error": "Invalid action"},
+                status=status.HTTP_400_BAD_REQUEST
             )
-
-            return Response({"success": True}, status=status.HTTP_201_CREATED)
-        except Product.DoesNotExist:
+        try:
+            product_id = uuid.UUID(str(product_id))
+        except ValueError:
             return Response(
                 {"error": "Product not found"},
                 status=status.HTTP_404_NOT_FOUND
             )
-        except Exception as e:
-            logger.error(f"Error logging user behavior: {e}")
-            return Response(
-                {"error": "An error occurred while logging behavior"},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+
+        # Queue the event; the ingestion worker writes it in a batch
+        if not behavior_ingestor.submit(user.id, product_id, action):
+            response = Response(
+                {"error": "Too many events, please retry later"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
             )
+            response['Retry-After'] = '1'
+            return response
+
+        # The user's cached recommendations no longer reflect their history
+        caching.forget_users([user.id])
+        return Response({"success": True}, status=status.HTTP_202_ACCEPTED)
 
 # -----------------------------------------------------------------------
 #                 Hybrid Recommendation View
@@ -229,23 +202,18 @@ class HybridRecommendationView(APIView):
     def get(self, request):
         user = request.user
         try:
-            # Get user behavior data
-            viewed_products = list(UserBehaviorLog.objects.filter(
-                user=user, action='view'
-            ).values_list('product_id', flat=True).order_by('-timestamp')[:20])
-
-            liked_products = list(UserBehaviorLog.objects.filter(
-                user=user, action='like'
-            ).values_list('product_id', flat=True).order_by('-timestamp')[:10])
+            # Models are trained offline; until one is published, serve popular products
+            recommendation_service = get_recommendation_service()
+            if not recommendation_service.refresh():
+                return self._popular_products()
 
-            # Prepare user data for recommendations
-            user_data = {
-                'viewed_products': viewed_products,
-                'liked_products': liked_products
-            }
+            version = caching.user_version(user.id, recommendation_service.version)
+            cached = caching.get_response('hybrid', user.id, version)
+            if cached is not None:
+                return Response(cached)
 
-            # Train models if needed
-            self._ensure_models_trained()
+            # Get user behavior data
+            viewed_products = UserBehaviorLog.recent_product_ids(user, 'view', 20)
 
             # Get hybrid recommendations
             recommended_product_ids = recommendation_service.get_hybrid_recommendations(
@@ -259,36 +227,15 @@ class HybridRecommendationView(APIView):
             self._log_recommendation_event(user, recommended_products)
 
             serializer = ProductSerializer(recommended_products, many=True)
+            caching.set_response('hybrid', user.id, version, serializer.data)
             return Response(serializer.data)
         except Exception as e:
             logger.error(f"Error in hybrid recommendations: {e}")
             # Fallback to popular products
-            popular_products = Product.objects.order_by('-views')[:10]
-            serializer = ProductSerializer(popular_products, many=True)
-            return Response(serializer.data)
+            return self._popular_products()
 
-    def _ensure_models_trained(self):
-        """Ensure that recommendation models are trained."""
-        try:
-            # Check if we need to train the collaborative filtering model
-            if not hasattr(recommendation_service, 'als_model') or recommendation_service.als_model is None:
-                # Get all user-product interactions
-                interactions = ProductRecommendation.objects.all().values('user_id', 'product_id', 'score')
-                if interactions.exists():
-                    df = pd.DataFrame(list(interactions))
-                    recommendation_service.train_collaborative_filtering(df)
-
-            # Check if we need to train the content-based filtering model
-            if not hasattr(recommendation_service, 'tfidf_vectorizer') or recommendation_service.tfidf_vectorizer is None:
-                # Get all products with their descriptions
-                products = Product.objects.all().values('id', 'name', 'description', 'category__name', 'brand__name')
-                if products.exists():
-                    # Prepare data for content-based filtering
-                    products_df = pd.DataFrame(list(products))
-                    products_df.rename(columns={'category__name': 'category', 'brand__name': 'brand'}, inplace=True)
-                    recommendation_service.train_content_based_filtering(products_df)
-        except Exception as e:
-            logger.error(f"Error ensuring models are trained: {e}")
+    def _popular_products(self):
+        return Response(caching.shared_list('popular', popular_products_data))
 
     def _log_recommendation_event(self, user, recommended_products):
         """Log recommendation events for future analysis."""
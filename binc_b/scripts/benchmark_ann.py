@@ -0,0 +1,73 @@
+"""
+Recall and latency of the IVF item-factor index against exact scoring.
+
+Item factors are synthetic, drawn around cluster centers the way trained
+ALS factors group similar products. Each query is scored exactly and with
+the index at several probe counts; recall@N is the share of the exact top
+N that the index returns.
+
+    python scripts/benchmark_ann.py --items 200000 --factors 100
+"""
+import argparse
+import os
+import sys
+import time
+
+import django
+
+
+def setup_django_environment():
+    """Set up the Django environment."""
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'binc_b.settings')
+    django.setup()
+
+
+def synthetic_factors(items, factors, clusters, seed=0):
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, factors))
+    item_factors = centers[rng.integers(0, clusters, items)] + 0.5 * rng.normal(size=(items, factors))
+    # Users look like the items they interacted with
+    queries = item_factors[rng.integers(0, items, 200)] + 0.5 * rng.normal(size=(200, factors))
+    return item_factors.astype(np.float32), queries.astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--items', type=int, default=200000)
+    parser.add_argument('--factors', type=int, default=100)
+    parser.add_argument('--clusters', type=int, default=500, help="Clusters in the synthetic data")
+    parser.add_argument('--lists', type=int, default=None, help="IVF lists (default: about sqrt(items))")
+    parser.add_argument('--probes', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('-n', type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django_environment()
+    import numpy as np
+    from recommendations.ann import build_ivf, exact_search, ivf_search
+
+    item_factors, queries = synthetic_factors(args.items, args.factors, args.clusters)
+    start = time.perf_counter()
+    index = build_ivf(item_factors, n_lists=args.lists)
+    print(f"{args.items:,} items x {args.factors} factors, {len(index[0])} lists, "
+          f"built in {time.perf_counter() - start:.1f}s")
+
+    def run(search):
+        results = []
+        start = time.perf_counter()
+        for query in queries:
+            results.append(search(query))
+        return results, (time.perf_counter() - start) / len(queries) * 1000
+
+    expected, exact_ms = run(lambda q: exact_search(item_factors, q, args.n))
+    print(f"{'exact':>10}  recall@{args.n} 1.000  {exact_ms:7.3f} ms/query")
+    for probes in args.probes:
+        found, ms = run(lambda q: ivf_search(item_factors, *index, q, args.n, probes))
+        recall = np.mean([len(np.intersect1d(e, f)) / args.n for e, f in zip(expected, found)])
+        print(f"{probes:>4} probes  recall@{args.n} {recall:.3f}  {ms:7.3f} ms/query  ({exact_ms / ms:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Time the preparation of the ALS training matrix from interaction rows.
+
+Generates synthetic interactions shaped like ProductRecommendation rows
+(integer user ids, UUID product ids, float scores) and compares
+build_interaction_matrix() with the former per-row id mapping.
+
+    python scripts/benchmark_training_prep.py --sizes 1000000 10000000
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+
+import django
+
+
+def setup_django_environment():
+    """Set up the Django environment."""
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'binc_b.settings')
+    django.setup()
+
+
+def synthetic_interactions(size, products, seed=0):
+    """Interactions as load_interactions() returns them."""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    catalog = [uuid.UUID(int=int(i)) for i in rng.integers(1, 2 ** 63, products)]
+    return pd.DataFrame({
+        'user_id': rng.integers(1, max(size // 20, 2), size, dtype=np.int64),
+        'product_id': pd.Categorical.from_codes(rng.integers(0, products, size, dtype=np.int32), categories=catalog),
+        'score': rng.choice(np.array([1.0, 3.0, 5.0], dtype=np.float32), size),
+    })
+
+
+def per_row_prep(interactions):
+    """The id mapping train_collaborative_filtering used to do."""
+    import numpy as np
+    from scipy.sparse import csr_matrix
+    from recommendations.model_store import product_key
+
+    user_ids = interactions['user_id'].values.astype(np.int64)
+    product_ids = np.array([product_key(p) for p in interactions['product_id'].values], dtype='U32')
+    unique_users, user_indices = np.unique(user_ids, return_inverse=True)
+    unique_products, product_indices = np.unique(product_ids, return_inverse=True)
+    return csr_matrix((interactions['score'].values.astype(np.float32), (user_indices, product_indices)),
+                      shape=(len(unique_users), len(unique_products)))
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000000, 10000000])
+    parser.add_argument('--products', type=int, default=50000)
+    parser.add_argument('--skip-baseline', action='store_true', help="Do not time the per-row mapping")
+    args = parser.parse_args()
+
+    setup_django_environment()
+    from recommendations.ai_services import build_interaction_matrix
+
+    for size in args.sizes:
+        interactions = synthetic_interactions(size, args.products)
+        seconds, (_, _, matrix) = timed(build_interaction_matrix, interactions)
+        line = f"{size:>11,} interactions  {matrix.shape[0]:>9,} users  vectorized {seconds:7.2f}s"
+        if not args.skip_baseline:
+            baseline, expected = timed(per_row_prep, interactions)
+            assert (matrix != expected).nnz == 0
+            line += f"  per-row {baseline:7.2f}s  ({baseline / seconds:.1f}x)"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()